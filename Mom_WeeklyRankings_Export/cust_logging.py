@@ -1,53 +1,222 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
 from pathlib import Path
-import time
 
+# where the logs go: MOM_LOG_DIR, or assests/ next to the package
+LOG_DIR = Path(
+    os.environ.get("MOM_LOG_DIR", Path(__file__).resolve().parents[1] / "assests")
+)
+LOG_FILE = "logg.jsonl"
+TOURNEY_FILE = "tournament_results.jsonl"
 
-def log_print(error=None, success=None, **kwargs):
+# a log file is rotated to .1 (.1 to .2, ...) once it passes MAX_BYTES
+MAX_BYTES = int(os.environ.get("MOM_LOG_MAX_BYTES", 10 * 1024 * 1024))
+BACKUPS = int(os.environ.get("MOM_LOG_BACKUPS", 5))
+
+# most records written by one write + flush
+BATCH_RECORDS = 500
+
+# one writer per log file in this process, see _writer
+_WRITERS = {}
+_WRITERS_PID = None
+_WRITERS_LOCK = threading.Lock()
+
+
+def _jsonable(value):
+    """
+    json.dumps default: numpy scalars as numbers, anything else as text
     """
-    some info here
+    if hasattr(value, "item"):
+        try:
+            return value.item()
+        except (TypeError, ValueError):
+            pass
+    return str(value)
+
+
+class JsonLinesWriter(object):
+    """
+    Append JSON-lines records to path from a background thread.
+
+    write() only queues the record. The thread takes whatever is queued,
+    serialises it and writes it with one flush, keeping a single open
+    handle, and rotates the file by size.
     """
-    items = ""
-    with open(
-        "/home/cuddebtj/Documents/Python/MoM-WeeklyRankings-Export/assests/logg.txt",
-        "a",
-    ) as file:
-        if error:
-            if kwargs:
-                for k, v in kwargs.items():
-                    items += f"\t\t{list(kwargs.keys()).index(k)})\t {k}: {v}\n"
-            error_str = f"********************************************************************************\nERROR:\n\t{error}\n{items}\tTimestamp: {time.ctime(time.time())}\n"
-            file.write(error_str)
 
+    def __init__(self, path, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.__file = None
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(
+            target=self.__run, name=f"log-{self.path.name}", daemon=True
+        )
+        self.__thread.start()
+
+    def write(self, record):
+        self.__queue.put(record)
+
+    def flush(self):
+        """
+        Block until every queued record is written
+        """
+        self.__queue.join()
+
+    def close(self):
+        self.__queue.put(None)
+        self.__thread.join()
+
+    def __run(self):
+        while True:
+            batch = [self.__queue.get()]
+            while len(batch) < BATCH_RECORDS:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not None]
+            try:
+                if records:
+                    self.__write(records)
+            except Exception as e:
+                # logging must not take the pipeline down with it
+                sys.stderr.write(f"{self.path}: {e}\n")
+            finally:
+                for _ in batch:
+                    self.__queue.task_done()
+
+            if len(records) < len(batch):
+                if self.__file is not None:
+                    self.__file.close()
+                    self.__file = None
+                return
+
+    def __write(self, records):
+        if self.__file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.__file = open(self.path, "a", encoding="utf-8")
+
+        size = os.fstat(self.__file.fileno()).st_size
+        lines = []
+        for record in records:
+            line = json.dumps(record, default=_jsonable) + "\n"
+            if size and size + len(line) > self.max_bytes:
+                self.__file.write("".join(lines))
+                self.__rotate()
+                size, lines = 0, []
+            lines.append(line)
+            size += len(line)
+
+        self.__file.write("".join(lines))
+        self.__file.flush()
+
+    def __rotate(self):
+        self.__file.close()
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
         else:
-            if kwargs:
-                for k, v in kwargs.items():
-                    items += f"\t\t{list(kwargs.keys()).index(k)})\t {k}: {v}\n"
-            success_str = f"--------------------------------------------------------------------------------\nSuccessful:\n\t{success}\n{items}\tTimestamp: {time.ctime(time.time())}\n"
-            file.write(success_str)
+            os.remove(self.path)
+        self.__file = open(self.path, "a", encoding="utf-8")
 
 
-def log_print_tourney(bracket=None, round_=None, final=None, **kwargs):
+def _writer(file_name):
     """
-    some text here
-    """
-    items = ""
-    with open(
-        "/home/cuddebtj/Documents/Python/MoM-WeeklyRankings-Export/assests/tournament_results.txt",
-        "a",
-    ) as file:
-        if bracket:
-            for key, val in final.items():
-                items += f"\t{key}: -> {val}\n"
-            if kwargs:
-                for k, v in kwargs.items():
-                    items += f"\t\t{list(kwargs.keys()).index(k)})\t {k}: {v}\n"
-            final_str = (
-                f"***************Results for {bracket}*******************\n{items}"
+    The writer of file_name in this process. A forked child does not get
+    the parent's threads, so it starts its own writers.
+    """
+    global _WRITERS_PID
+    with _WRITERS_LOCK:
+        if _WRITERS_PID != os.getpid():
+            _WRITERS.clear()
+            _WRITERS_PID = os.getpid()
+        if file_name not in _WRITERS:
+            _WRITERS[file_name] = JsonLinesWriter(
+                Path(LOG_DIR) / file_name, MAX_BYTES, BACKUPS
             )
-            file.write(final_str)
+        return _WRITERS[file_name]
 
-        else:
-            if kwargs:
-                items += f"\t{kwargs['right_comp']}\t\t\tvs.\t\t\t{kwargs['left_comp']}\n\t---------------------------------------------------\n\t{kwargs['right_score']}\t\t\t\t\t\t\t\t{kwargs['left_score']}\n"
-            round_str = f"-------------------------------------------------------\n{round_}:\n{items}"
-            file.write(round_str)
+
+def configure(log_dir=None, max_bytes=None, backups=None):
+    """
+    Change where and how the logs are written, for records logged from now on
+    """
+    global LOG_DIR, MAX_BYTES, BACKUPS
+    close_logs()
+    if log_dir is not None:
+        LOG_DIR = Path(log_dir)
+    if max_bytes is not None:
+        MAX_BYTES = int(max_bytes)
+    if backups is not None:
+        BACKUPS = int(backups)
+
+
+def flush_logs():
+    """
+    Block until every record logged so far is on disk
+    """
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values()) if _WRITERS_PID == os.getpid() else []
+    for writer in writers:
+        writer.flush()
+
+
+def close_logs():
+    """
+    Write out what is queued and close the log files
+    """
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values()) if _WRITERS_PID == os.getpid() else []
+        _WRITERS.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_logs)
+
+
+def _now():
+    return datetime.now().isoformat(timespec="milliseconds")
+
+
+def log_print(error=None, success=None, **kwargs):
+    """
+    Log a success or an error with any context as keyword arguments,
+    one JSON line in LOG_DIR / LOG_FILE
+    """
+    if error:
+        record = {
+            "time": _now(),
+            "level": "ERROR",
+            "message": str(error),
+            "error_type": type(error).__name__,
+        }
+    else:
+        record = {"time": _now(), "level": "SUCCESS", "message": success}
+    record["pid"] = os.getpid()
+    record["fields"] = kwargs
+    _writer(LOG_FILE).write(record)
+
+
+def log_print_tourney(bracket=None, round_=None, final=None, **kwargs):
+    """
+    Log a bracket's final places (bracket, final) or one match of a round
+    (round_, right_comp, right_score, left_comp, left_score),
+    one JSON line in LOG_DIR / TOURNEY_FILE
+    """
+    if bracket:
+        record = {"time": _now(), "bracket": bracket, "final": final}
+    else:
+        record = {"time": _now(), "round": round_}
+    record["fields"] = kwargs
+    _writer(TOURNEY_FILE).write(record)
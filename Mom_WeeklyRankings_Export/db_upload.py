@@ -1,24 +1,399 @@
 import psycopg2
+import queue
+import struct
+import threading
+import time
 import yaml
+import numpy as np
 import pandas as pd
-from io import StringIO
+from io import BytesIO, RawIOBase, StringIO
+from itertools import chain
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 
 from Mom_WeeklyRankings_Export.cust_logging import log_print
+from Mom_WeeklyRankings_Export.metrics import METRICS, timed
+
+# one pool per database url and one credentials dict per file, kept for the run
+_POOLS = {}
+_CREDENTIALS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _quote_ident(name):
+    """
+    Quote a column name for postgres, e.g. "team_standings.rank" or "Cur. Wk Rk"
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class _IterStream(RawIOBase):
+    """
+    Read-only file object over a generator of bytes so copy_expert can
+    stream a COPY payload without it ever being built in memory
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b""
+        self.bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        self.bytes += size
+        return size
+
+
+def _count_out(table, rows, size):
+    METRICS.count("db_rows", rows, direction="out", table=table)
+    METRICS.count("db_bytes", size, direction="out", table=table)
+
+
+def _csv_chunks(df, chunk_rows):
+    """
+    Yield df as CSV bytes, chunk_rows rows at a time, header first
+    """
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start : start + chunk_rows].to_csv(
+            index=False, header=(start == 0)
+        ).encode("utf-8")
+
+
+_NULL = struct.pack(">i", -1)
+_PG_EPOCH_DAY = np.datetime64("2000-01-01", "D")
+_PG_EPOCH_US = np.datetime64("2000-01-01", "us")
+
+
+def _fixed_fields(values, nulls, fmt):
+    """
+    Length-prefixed binary fields for a fixed width column
+    """
+    width = np.dtype(fmt).itemsize
+    records = np.empty(len(values), dtype=[("len", ">i4"), ("val", fmt)])
+    records["len"] = width
+    records["val"] = values
+    buf = records.tobytes()
+    size = 4 + width
+    fields = [buf[i : i + size] for i in range(0, len(buf), size)]
+    for i in np.flatnonzero(nulls):
+        fields[i] = _NULL
+    return fields
+
+
+def _number_fields(fmt, as_int):
+    def encode(col):
+        values = pd.to_numeric(col)
+        nulls = values.isna().to_numpy()
+        values = values.fillna(0).to_numpy()
+        return _fixed_fields(values.astype("int64") if as_int else values, nulls, fmt)
+
+    return encode
+
+
+def _bool_fields(col):
+    nulls = col.isna().to_numpy()
+    return _fixed_fields(col.fillna(False).astype(bool).to_numpy(), nulls, "?")
+
+
+def _date_fields(col):
+    values = pd.to_datetime(col)
+    nulls = values.isna().to_numpy()
+    days = values.to_numpy(dtype="datetime64[D]") - _PG_EPOCH_DAY
+    return _fixed_fields(np.where(nulls, 0, days.astype("int64")), nulls, ">i4")
+
+
+def _timestamp_fields(col):
+    values = pd.to_datetime(col)
+    nulls = values.isna().to_numpy()
+    micros = values.to_numpy(dtype="datetime64[us]") - _PG_EPOCH_US
+    return _fixed_fields(np.where(nulls, 0, micros.astype("int64")), nulls, ">i8")
+
+
+def _text_fields(col):
+    nulls = col.isna().to_numpy()
+    fields = []
+    for value, null in zip(col.astype(str).to_numpy(), nulls):
+        if null:
+            fields.append(_NULL)
+        else:
+            value = value.encode("utf-8")
+            fields.append(struct.pack(">i", len(value)) + value)
+    return fields
+
+
+# postgres column type -> binary COPY encoder for a pandas column
+_BINARY_ENCODERS = {
+    "smallint": _number_fields(">i2", True),
+    "integer": _number_fields(">i4", True),
+    "bigint": _number_fields(">i8", True),
+    "real": _number_fields(">f4", False),
+    "double precision": _number_fields(">f8", False),
+    "boolean": _bool_fields,
+    "date": _date_fields,
+    "timestamp without time zone": _timestamp_fields,
+    "text": _text_fields,
+    "character varying": _text_fields,
+    "character": _text_fields,
+}
+
+
+def _binary_chunks(df, pg_types, chunk_rows):
+    """
+    Yield df in postgres binary COPY format, encoded column by column
+    from the frame's arrays, chunk_rows rows at a time
+    """
+    yield b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+    row_header = struct.pack(">h", len(df.columns))
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start : start + chunk_rows]
+        fields = [
+            _BINARY_ENCODERS[pg_type](chunk[col])
+            for col, pg_type in zip(chunk.columns, pg_types)
+        ]
+        yield b"".join(chain.from_iterable((row_header, *row) for row in zip(*fields)))
+    yield struct.pack(">h", -1)
+
+
+class _ChunkSink(object):
+    """
+    File object that copy_expert writes a CSV COPY TO STDOUT into.
+    Data is cut at record boundaries into pieces of about chunk_bytes
+    and handed to a bounded queue, so the writer blocks while the
+    reader is still parsing earlier pieces.
+    """
+
+    def __init__(self, chunks, stop, chunk_bytes):
+        self._chunks = chunks
+        self._stop = stop
+        self._chunk_bytes = chunk_bytes
+        self._buffer = bytearray()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("Stream closed by reader")
+
+    def _cut(self):
+        # last newline outside a quoted field: an even number of quotes before it
+        end = self._buffer.rfind(b"\n")
+        while end != -1 and self._buffer.count(b'"', 0, end) % 2:
+            end = self._buffer.rfind(b"\n", 0, end)
+        return end + 1
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._buffer += data
+        if len(self._buffer) >= self._chunk_bytes:
+            end = self._cut()
+            if end:
+                self._put(bytes(self._buffer[:end]))
+                del self._buffer[:end]
+
+    def close(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer = bytearray()
+
+
+def _column_types(cursor, table):
+    """
+    Column name -> postgres type name for table
+    """
+    cursor.execute(
+        "SELECT attname, atttypid::regtype::text FROM pg_attribute \
+WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped",
+        (table,),
+    )
+    return dict(cursor.fetchall())
+
+
+class ConnectionPool(object):
+    """
+    Pool of SSL connections to the database that lives for one pipeline run.
+    Connections are health checked when they are borrowed and the pool is
+    rebuilt when the database cannot be reached. When all maxconn
+    connections are borrowed, getconn waits for one to be given back.
+
+    db_url = heroku database url
+    idle_check = seconds a connection can sit idle before it is pinged
+    wait = seconds getconn waits for a free connection before PoolError
+    """
+
+    def __init__(
+        self, db_url, minconn=1, maxconn=8, idle_check=30, retries=3, wait=300
+    ):
+        self.db_url = db_url
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_check = idle_check
+        self.retries = retries
+        self.wait = wait
+        self._pool = None
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._free = threading.BoundedSemaphore(maxconn)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None or self._pool.closed:
+                self._pool = ThreadedConnectionPool(
+                    self.minconn, self.maxconn, self.db_url, sslmode="require"
+                )
+            return self._pool
+
+    def _reset(self):
+        with self._lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+            self._pool = None
+            self._last_used.clear()
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.idle_check:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        Borrow a healthy connection, waiting for a free one and
+        reconnecting if needed
+        """
+        if not self._free.acquire(timeout=self.wait):
+            raise PoolError(
+                f"no free connection of {self.maxconn} after {self.wait} sec"
+            )
+        try:
+            return self._borrow()
+        except Exception:
+            self._free.release()
+            raise
+
+    def _borrow(self):
+        error = None
+        for attempt in range(self.retries):
+            try:
+                pool = self._get_pool()
+                conn = pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                pool.putconn(conn, close=True)
+                self._last_used.pop(id(conn), None)
+            except (psycopg2.OperationalError, PoolError) as e:
+                error = e
+                log_print(
+                    error=e,
+                    module_="db_psql_model.py",
+                    func="ConnectionPool.getconn",
+                    attempt=attempt + 1,
+                )
+                # an exhausted pool only needs a connection given back,
+                # an unreachable database needs a new pool
+                if isinstance(e, psycopg2.OperationalError):
+                    self._reset()
+                time.sleep(2**attempt)
+
+        raise error or psycopg2.OperationalError("No healthy database connection")
+
+    def putconn(self, conn):
+        """
+        Return a connection to the pool, dropping it if it is broken
+        """
+        try:
+            pool = self._pool
+            if pool is None or pool.closed:
+                conn.close()
+                return
+            if conn.closed:
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn)
+        finally:
+            self._free.release()
+
+    def closeall(self):
+        self._reset()
+
+
+def get_pool(db_url):
+    """
+    Pool for db_url, created on first use
+    """
+    with _POOLS_LOCK:
+        if db_url not in _POOLS:
+            _POOLS[db_url] = ConnectionPool(db_url)
+        return _POOLS[db_url]
+
+
+def close_pools():
+    """
+    Close every pool, call once at the end of a pipeline run
+    """
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.closeall()
+        _POOLS.clear()
+        _CREDENTIALS.clear()
+
+
+def load_credentials(credential_file):
+    """
+    Read the private yaml file once per run
+    """
+    key = str(credential_file)
+    if key not in _CREDENTIALS:
+        with open(credential_file) as file:
+            _CREDENTIALS[key] = yaml.load(file, Loader=yaml.SafeLoader)
+    return _CREDENTIALS[key]
 
 
 class DatabaseCursor(object):
-    def __init__(self, credential_file):
+
+    # how DataFrames are written with COPY:
+    # "csv" whole frame as CSV text in memory, "csv_stream" CSV in chunks
+    # from a generator, "binary" postgres binary format from the column arrays
+    COPY_FORMAT = "csv"
+    CHUNK_ROWS = 10000
+
+    def __init__(self, credential_file, copy_format=None):
         """
-        Import database credentials
+        Import database credentials and borrow connections from the run's pool
 
         credential_file = path to private yaml file
+        copy_format = "csv", "csv_stream" or "binary", defaults to COPY_FORMAT
         kwargs = {option_schema: "raw"}
         """
+        self.copy_format = copy_format or self.COPY_FORMAT
+        self.chunk_rows = self.CHUNK_ROWS
         try:
-            with open(credential_file) as file:
-                self.credentials = yaml.load(file, Loader=yaml.SafeLoader)
+            self.credentials = load_credentials(credential_file)
 
             self.db_url = self.credentials["heroku_db_url"]
+            self.pool = get_pool(self.db_url)
 
         except Exception as e:
             log_print(
@@ -34,10 +409,7 @@ class DatabaseCursor(object):
         """
 
         try:
-            self.conn = psycopg2.connect(
-                self.db_url,
-                sslmode="require",
-            )
+            self.conn = self.pool.getconn()
             self.cur = self.conn.cursor()
 
             return self.cur
@@ -52,21 +424,75 @@ class DatabaseCursor(object):
 
     def __exit__(self, exc_result):
         """
-        Close connection and cursor
+        Close cursor and give the connection back to the pool,
+        uncommitted work is rolled back by the pool
 
         exc_results = bool
         """
 
-        if exc_result == True:
-            self.conn.commit()
+        try:
+            if exc_result == True:
+                self.conn.commit()
+        finally:
+            self.cur.close()
+            self.pool.putconn(self.conn)
 
-        self.cur.close()
-        self.conn.close()
+    def _copy_in(self, cursor, df, table, target=None):
+        """
+        COPY df into target (default table) with the cursor's copy_format,
+        binary falls back to csv_stream when table has a column type
+        without a binary encoder
+
+        Returns the COPY statement
+        """
+        target = target or table
+        columns = ", ".join(_quote_ident(col) for col in df.columns)
 
+        if self.copy_format == "binary":
+            types = _column_types(cursor, table)
+            pg_types = [types.get(col) for col in df.columns]
+            unsupported = [
+                col
+                for col, pg_type in zip(df.columns, pg_types)
+                if pg_type not in _BINARY_ENCODERS
+            ]
+            if not unsupported:
+                copy_sql = f"COPY {target} ({columns}) FROM STDIN WITH (FORMAT BINARY);"
+                stream = _IterStream(_binary_chunks(df, pg_types, self.chunk_rows))
+                cursor.copy_expert(copy_sql, stream, size=65536)
+                _count_out(table, len(df), stream.bytes)
+                return copy_sql
+
+            log_print(
+                error="No binary encoder, falling back to csv_stream",
+                module_="db_psql_model.py",
+                func="_copy_in",
+                table=table,
+                columns=unsupported,
+            )
+
+        copy_sql = (
+            f"COPY {target} ({columns}) FROM STDIN WITH (FORMAT CSV, HEADER TRUE);"
+        )
+        if self.copy_format == "csv":
+            buffer = StringIO()
+            df.to_csv(buffer, index=False)
+            size = buffer.tell()
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+        else:
+            stream = _IterStream(_csv_chunks(df, self.chunk_rows))
+            cursor.copy_expert(copy_sql, stream, size=65536)
+            size = stream.bytes
+        _count_out(table, len(df), size)
+        return copy_sql
+
+    @timed("db.copy_to_psql")
     def copy_to_psql(self, df, table):
         """
         Copy table to postgres from a pandas dataframe
-        in memory using StringIO
+        in memory using StringIO, or streamed in chunks when
+        copy_format is "csv_stream" or "binary"
         https://naysan.ca/2020/05/09/pandas-to-postgresql-using-psycopg2-bulk-insert-performance-benchmark/
         https://stackoverflow.com/questions/23103962/how-to-write-dataframe-to-postgres-table
 
@@ -75,17 +501,25 @@ class DatabaseCursor(object):
         first_time = "NO"
         """
 
-        buffer = StringIO()
-        df.to_csv(buffer, index=False)
-        buffer.seek(0)
+        start = time.perf_counter()
+        copy_to = None
 
         try:
             cursor = self.__enter__()
-            copy_to = f"BEGIN; \
+            if self.copy_format == "csv":
+                buffer = StringIO()
+                df.to_csv(buffer, index=False)
+                size = buffer.tell()
+                buffer.seek(0)
+                copy_to = f"BEGIN; \
     DELETE FROM {table}; \
     COPY {table} FROM STDIN WITH (FORMAT CSV, HEADER TRUE); \
 END;"
-            cursor.copy_expert(copy_to, buffer)
+                cursor.copy_expert(copy_to, buffer)
+                _count_out(table, len(df), size)
+            else:
+                cursor.execute(f"DELETE FROM {table};")
+                copy_to = self._copy_in(cursor, df, table)
             self.__exit__(exc_result=True)
             log_print(
                 success="COPY EXPERT to MenOfMadison",
@@ -93,6 +527,9 @@ END;"
                 func="copy_table_to_postgres_new",
                 table=table,
                 query=copy_to,
+                copy_format=self.copy_format,
+                rows=len(df),
+                seconds=round(time.perf_counter() - start, 3),
             )
 
         except (Exception, psycopg2.DatabaseError) as e:
@@ -105,13 +542,174 @@ END;"
                 copy_query=copy_to,
             )
 
-    def copy_from_psql(self, query):
+    @timed("db.upsert_to_psql")
+    def upsert_to_psql(self, df, table, key_columns, replace_columns=None):
+        """
+        Merge a pandas dataframe into a postgres table on its natural key.
+        Only the rows in df are sent: they are COPYed into a temporary
+        staging table and merged with INSERT ... ON CONFLICT, so the cost
+        scales with the rows written rather than the size of the table.
+        The table needs a unique index on key_columns, see create_key_index.
+
+        table = "raw.weekly_team_pts"
+        df = pd.DataFrame()
+        key_columns = ["game_id", "week", "team_key"]
+        replace_columns = ["game_id", "week"], the stored rows of every
+        (game_id, week) in df are deleted first in the same transaction,
+        so rows df no longer has do not linger
+
+        Raises after logging when the merge fails, nothing is committed then.
+        """
+
+        columns = ", ".join(_quote_ident(col) for col in df.columns)
+        keys = ", ".join(_quote_ident(col) for col in key_columns)
+        updates = ", ".join(
+            f"{_quote_ident(col)} = EXCLUDED.{_quote_ident(col)}"
+            for col in df.columns
+            if col not in key_columns
+        )
+        conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        stage = f"stage_{table.replace('.', '_')}"
+
+        delete = None
+        if replace_columns:
+            replaced = ", ".join(_quote_ident(col) for col in replace_columns)
+            delete = f"DELETE FROM {table} WHERE ({replaced}) IN \
+(SELECT DISTINCT {replaced} FROM {stage});"
+
+        upsert = f"INSERT INTO {table} ({columns}) \
+SELECT {columns} FROM {stage} \
+ON CONFLICT ({keys}) {conflict};"
+
+        try:
+            cursor = self.__enter__()
+            cursor.execute(
+                f"CREATE TEMP TABLE {stage} (LIKE {table} INCLUDING DEFAULTS) \
+ON COMMIT DROP;"
+            )
+            self._copy_in(cursor, df, table, target=stage)
+            if delete:
+                cursor.execute(delete)
+            cursor.execute(upsert)
+            self.__exit__(exc_result=True)
+            log_print(
+                success="UPSERT to MenOfMadison",
+                module_="db_psql_model.py",
+                func="upsert_to_psql",
+                table=table,
+                rows=len(df),
+                query=upsert,
+                delete_query=delete,
+            )
+
+        except (Exception, psycopg2.DatabaseError) as e:
+            self.__exit__(exc_result=False)
+            log_print(
+                error=e,
+                module_="db_psql_model.py",
+                func="upsert_to_psql",
+                table=table,
+                upsert_query=upsert,
+                delete_query=delete,
+            )
+            raise
+
+    def create_table(self, table, columns, key_columns=None):
+        """
+        CREATE TABLE IF NOT EXISTS for the tables the pipeline adds itself
+
+        table = "prod.playoff_odds"
+        columns = {"game_id": "bigint", "Week": "bigint"}
+        key_columns = ["game_id", "Week"], made the primary key
+
+        Returns True when the table exists afterwards, False otherwise.
+        """
+
+        definition = ", ".join(
+            f"{_quote_ident(col)} {pg_type}" for col, pg_type in columns.items()
+        )
+        if key_columns:
+            keys = ", ".join(_quote_ident(col) for col in key_columns)
+            definition = f"{definition}, PRIMARY KEY ({keys})"
+        query = f"CREATE TABLE IF NOT EXISTS {table} ({definition});"
+
+        try:
+            cursor = self.__enter__()
+            cursor.execute(query)
+            self.__exit__(exc_result=True)
+            return True
+
+        except (Exception, psycopg2.DatabaseError) as e:
+            self.__exit__(exc_result=False)
+            log_print(
+                error=e,
+                module_="db_psql_model.py",
+                func="create_table",
+                table=table,
+                query=query,
+            )
+            return False
+
+    def create_key_index(self, table, key_columns):
+        """
+        Unique index on the natural key upsert_to_psql merges on, a one off
+        migration step (see utils.migrate). Fails while the table holds
+        rows with the same key; the duplicate keys are logged.
+
+        table = "raw.weekly_team_pts"
+        key_columns = ["game_id", "week", "team_key"]
+
+        Raises after logging when the index cannot be created.
+        """
+
+        keys = ", ".join(_quote_ident(col) for col in key_columns)
+        index = f"{table.split('.')[-1]}_natural_key"
+        query = f"CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {table} ({keys});"
+        duplicates = f"SELECT {keys}, count(*) FROM {table} \
+GROUP BY {keys} HAVING count(*) > 1 LIMIT 20;"
+
+        try:
+            cursor = self.__enter__()
+            cursor.execute(query)
+            self.__exit__(exc_result=True)
+            log_print(
+                success="Natural key index",
+                module_="db_psql_model.py",
+                func="create_key_index",
+                table=table,
+                query=query,
+            )
+
+        except (Exception, psycopg2.DatabaseError) as e:
+            self.__exit__(exc_result=False)
+            found = None
+            try:
+                cursor = self.__enter__()
+                cursor.execute(duplicates)
+                found = cursor.fetchall()
+                self.__exit__(exc_result=False)
+            except (Exception, psycopg2.DatabaseError):
+                self.__exit__(exc_result=False)
+            log_print(
+                error=e,
+                module_="db_psql_model.py",
+                func="create_key_index",
+                table=table,
+                query=query,
+                duplicate_keys=found,
+            )
+            raise
+
+    @timed("db.copy_from_psql")
+    def copy_from_psql(self, query, dtype=None, parse_dates=None):
         """
         Copy data from Postgresql Query into
         Pandas dataframe
         https://towardsdatascience.com/optimizing-pandas-read-sql-for-postgres-f31cd7f707ab
 
         query = "select * from raw.test"
+        dtype = {"week": "int64"}, passed to pd.read_csv
+        parse_dates = ["week_start"], passed to pd.read_csv
         """
         cursor = self.__enter__()
 
@@ -120,8 +718,11 @@ END;"
 
         try:
             cursor.copy_expert(sql_query, buffer)
+            size = buffer.tell()
             buffer.seek(0)
-            df = pd.read_csv(buffer)
+            df = pd.read_csv(buffer, dtype=dtype, parse_dates=parse_dates)
+            METRICS.count("db_rows", len(df), direction="in", op="copy_from_psql")
+            METRICS.count("db_bytes", size, direction="in", op="copy_from_psql")
             self.__exit__(exc_result=True)
             log_print(
                 success="COPY QUERY FROM MenOfMadison",
@@ -139,3 +740,89 @@ END;"
                 func="copy_from_psql",
                 query=sql_query,
             )
+
+    def copy_from_psql_chunks(
+        self, query, dtype=None, parse_dates=None, chunk_bytes=8 * 1024 * 1024
+    ):
+        """
+        Stream a Postgresql Query as an iterator of pandas dataframes.
+        COPY runs on a background thread and at most a couple of chunks of
+        about chunk_bytes are held at once, so memory does not grow with
+        the size of the result.
+
+        query = "select * from raw.matchups"
+        dtype = {"week": "int64"}, passed to pd.read_csv for every chunk
+        parse_dates = ["week_start"], passed to pd.read_csv for every chunk
+        """
+        sql_query = f"COPY ({query}) TO STDOUT WITH (FORMAT CSV, HEADER TRUE);"
+        chunks = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        done = object()
+        conn = self.pool.getconn()
+
+        def produce():
+            try:
+                sink = _ChunkSink(chunks, stop, chunk_bytes)
+                with conn.cursor() as cur:
+                    cur.copy_expert(sql_query, sink, size=65536)
+                sink.close()
+                conn.commit()
+                chunks.put(done)
+            except Exception as e:
+                conn.rollback()
+                chunks.put(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        header = None
+        rows = 0
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is done:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if header is None:
+                    end = chunk.index(b"\n") + 1
+                    header, chunk = chunk[:end], chunk[end:]
+                if not chunk:
+                    continue
+                df = pd.read_csv(
+                    BytesIO(header + chunk), dtype=dtype, parse_dates=parse_dates
+                )
+                rows += len(df)
+                METRICS.count(
+                    "db_rows", len(df), direction="in", op="copy_from_psql_chunks"
+                )
+                METRICS.count(
+                    "db_bytes", len(chunk), direction="in", op="copy_from_psql_chunks"
+                )
+                yield df
+
+            log_print(
+                success="COPY QUERY FROM MenOfMadison in chunks",
+                module_="db_psql_model.py",
+                func="copy_from_psql_chunks",
+                query=sql_query,
+                rows=rows,
+            )
+
+        except (Exception, psycopg2.DatabaseError) as e:
+            log_print(
+                error=e,
+                module_="db_psql_model.py",
+                func="copy_from_psql_chunks",
+                query=sql_query,
+            )
+            raise
+
+        finally:
+            stop.set()
+            while producer.is_alive():
+                try:
+                    chunks.get(timeout=0.5)
+                except queue.Empty:
+                    pass
+            self.pool.putconn(conn)
@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+# where export() writes by default: MOM_METRICS_DIR, or assests/metrics
+METRICS_DIR = Path(
+    os.environ.get(
+        "MOM_METRICS_DIR", Path(__file__).resolve().parents[1] / "assests" / "metrics"
+    )
+)
+
+PREFIX = "mom"
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _prom_labels(labels):
+    if not labels:
+        return ""
+    text = ",".join(
+        '{}="{}"'.format(
+            key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for key, value in labels
+    )
+    return "{" + text + "}"
+
+
+class Metrics(object):
+    """
+    Spans (timed sections) and counters of one pipeline run, safe to
+    record from any thread.
+
+    span("yahoo.metadata") adds to the count, total and slowest seconds of
+    that span, count("db_rows", len(df), direction="out") adds to a counter.
+    Labels are keyword arguments and every label combination is kept apart.
+    Listeners (see add_listener) are told when every span starts and ends.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__listeners = ()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything recorded, at the start of a run
+        """
+        with self.__lock:
+            self.__spans = {}
+            self.__counters = {}
+            self.__started = time.time()
+
+    def add_listener(self, listener):
+        """
+        listener.span_started(name, labels) and
+        listener.span_finished(name, labels) are called around every span
+        """
+        with self.__lock:
+            self.__listeners = self.__listeners + (listener,)
+
+    def remove_listener(self, listener):
+        with self.__lock:
+            self.__listeners = tuple(l for l in self.__listeners if l is not listener)
+
+    @contextmanager
+    def span(self, name, **labels):
+        listeners = self.__listeners
+        for listener in listeners:
+            listener.span_started(name, labels)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+            for listener in reversed(listeners):
+                listener.span_finished(name, labels)
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self.__lock:
+            span = self.__spans.setdefault(key, [0, 0.0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+            span[2] = max(span[2], seconds)
+
+    def count(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def summary(self):
+        """
+        Everything recorded so far as a JSON-ready dict
+        """
+        with self.__lock:
+            spans = sorted(self.__spans.items())
+            counters = sorted(self.__counters.items())
+            started = self.__started
+
+        return {
+            "started": started,
+            "seconds": time.time() - started,
+            "spans": [
+                {
+                    "span": name,
+                    "labels": dict(labels),
+                    "count": count,
+                    "seconds": round(total, 6),
+                    "max_seconds": round(slowest, 6),
+                }
+                for (name, labels), (count, total, slowest) in spans
+            ],
+            "counters": [
+                {"counter": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in counters
+            ],
+        }
+
+    def to_prometheus(self, job="pipeline"):
+        """
+        Everything recorded so far in the Prometheus text format,
+        for node_exporter's textfile collector
+        """
+        summary = self.summary()
+        job_label = (("job", job),)
+        lines = [
+            f"# HELP {PREFIX}_run_started_seconds Unix time the run started",
+            f"# TYPE {PREFIX}_run_started_seconds gauge",
+            f"{PREFIX}_run_started_seconds{_prom_labels(job_label)} "
+            f"{summary['started']:.3f}",
+            f"# HELP {PREFIX}_run_seconds Seconds from run start to export",
+            f"# TYPE {PREFIX}_run_seconds gauge",
+            f"{PREFIX}_run_seconds{_prom_labels(job_label)} {summary['seconds']:.6f}",
+            f"# HELP {PREFIX}_span_seconds Seconds spent in each pipeline span",
+            f"# TYPE {PREFIX}_span_seconds summary",
+        ]
+        for span in summary["spans"]:
+            labels = _prom_labels(
+                job_label + (("span", span["span"]),) + _labels(span["labels"])
+            )
+            lines.append(f"{PREFIX}_span_seconds_sum{labels} {span['seconds']:.6f}")
+            lines.append(f"{PREFIX}_span_seconds_count{labels} {span['count']}")
+
+        lines += [
+            f"# HELP {PREFIX}_span_max_seconds Slowest single pass of each span",
+            f"# TYPE {PREFIX}_span_max_seconds gauge",
+        ]
+        for span in summary["spans"]:
+            labels = _prom_labels(
+                job_label + (("span", span["span"]),) + _labels(span["labels"])
+            )
+            lines.append(f"{PREFIX}_span_max_seconds{labels} {span['max_seconds']:.6f}")
+
+        names = sorted({counter["counter"] for counter in summary["counters"]})
+        for name in names:
+            lines += [
+                f"# HELP {PREFIX}_{name}_total {name.replace('_', ' ')}",
+                f"# TYPE {PREFIX}_{name}_total counter",
+            ]
+            for counter in summary["counters"]:
+                if counter["counter"] == name:
+                    labels = _prom_labels(job_label + _labels(counter["labels"]))
+                    lines.append(f"{PREFIX}_{name}_total{labels} {counter['value']}")
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, metrics_dir=None, job="pipeline"):
+        """
+        Write the run to metrics_dir (METRICS_DIR by default):
+        <job>.prom, replaced every run for the textfile collector, and
+        <job>_<start time>.json kept per run for trending.
+        Returns both paths.
+        """
+        metrics_dir = Path(metrics_dir or METRICS_DIR)
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        summary = self.summary()
+
+        prom_file = metrics_dir / f"{job}.prom"
+        temp_file = metrics_dir / f".{job}.prom.{os.getpid()}"
+        with open(temp_file, "w") as file:
+            file.write(self.to_prometheus(job))
+        # the collector must never see a half written file
+        os.replace(temp_file, prom_file)
+
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(summary["started"]))
+        json_file = metrics_dir / f"{job}_{stamp}.json"
+        with open(json_file, "w") as file:
+            json.dump(dict(summary, job=job), file, indent=2)
+
+        return prom_file, json_file
+
+
+# the process' run, recorded into by the whole package
+METRICS = Metrics()
+
+
+def timed(name, **labels):
+    """
+    Decorator recording every call of the function as span name
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.span(name, **labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
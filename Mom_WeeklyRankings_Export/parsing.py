@@ -0,0 +1,57 @@
+import pandas as pd
+
+
+def flatten(record, prefix="", sep="."):
+    """
+    Flatten nested dicts the way pd.json_normalize names columns,
+    {"team_points": {"total": 1}} -> {"team_points.total": 1}.
+    Lists are kept as values.
+    """
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}{sep}", sep))
+        else:
+            flat[name] = value
+    return flat
+
+
+class RecordBuilder(object):
+    """
+    Collect parsed records as plain column lists and build the DataFrame
+    once at the end, instead of concatenating one-row frames in a loop.
+    Columns a record does not have are filled with None (NaN once built).
+    """
+
+    def __init__(self):
+        self._columns = {}
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def append(self, record):
+        for key, value in record.items():
+            column = self._columns.get(key)
+            if column is None:
+                column = self._columns[key] = [None] * self._rows
+            column.append(value)
+        self._rows += 1
+        for column in self._columns.values():
+            if len(column) < self._rows:
+                column.append(None)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def to_frame(self, columns=None):
+        """
+        One DataFrame from the collected columns,
+        columns = only these, in this order
+        """
+        data = self._columns
+        if columns is not None:
+            data = {col: data.get(col, [None] * self._rows) for col in columns}
+        return pd.DataFrame(data, index=pd.RangeIndex(self._rows))
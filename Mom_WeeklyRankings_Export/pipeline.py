@@ -0,0 +1,182 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from Mom_WeeklyRankings_Export.cust_logging import log_print
+from Mom_WeeklyRankings_Export.metrics import METRICS
+
+OK = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Stage(object):
+    """
+    One step of a Pipeline: func(*args, **kwargs) with the data it reads
+    (inputs) and writes (outputs), e.g. table names
+    """
+
+    def __init__(self, name, func, args=(), kwargs=None, inputs=(), outputs=()):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.inputs = set(inputs)
+        self.outputs = set(outputs)
+        self.depends_on = []
+
+
+class StageResult(object):
+    """
+    What happened to a stage: status OK, FAILED (error) or SKIPPED
+    (a stage it depends on did not finish), its return value and timing
+    """
+
+    def __init__(self, name, status, value=None, error=None, started=None, ended=None):
+        self.name = name
+        self.status = status
+        self.value = value
+        self.error = error
+        self.started = started
+        self.ended = ended
+
+    @property
+    def seconds(self):
+        if self.started is None:
+            return 0.0
+        return self.ended - self.started
+
+
+class Pipeline(object):
+    """
+    Stages run on a thread pool as soon as the stages they depend on
+    are done.
+
+    A stage depends on every earlier added stage that writes one of its
+    inputs, writes one of its outputs or reads one of its outputs, so
+    stages touching the same data keep the order they were added in and
+    everything else runs side by side. workers=1 runs the stages one by
+    one in add order on the calling thread.
+
+    A stage fails when its function raises; the package's stage functions
+    log their errors and raise them again for this. Stages depending on a
+    failed or skipped stage are skipped.
+    """
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.stages = []
+
+    def __contains__(self, name):
+        return any(stage.name == name for stage in self.stages)
+
+    def add(self, name, func, *args, inputs=(), outputs=(), **kwargs):
+        """
+        Add func(*args, **kwargs) as stage name, returns the Stage
+        """
+        if name in self:
+            raise ValueError(f"stage {name} was already added")
+
+        stage = Stage(name, func, args, kwargs, inputs, outputs)
+        stage.depends_on = [
+            earlier.name
+            for earlier in self.stages
+            if stage.inputs & earlier.outputs
+            or stage.outputs & earlier.outputs
+            or stage.outputs & earlier.inputs
+        ]
+        self.stages.append(stage)
+        return stage
+
+    def critical_path(self):
+        """
+        Names of the longest chain of dependent stages
+        """
+        longest = {}
+        for stage in self.stages:
+            chains = [longest[name] for name in stage.depends_on]
+            longest[stage.name] = max(chains, key=len, default=[]) + [stage.name]
+        return max(longest.values(), key=len, default=[])
+
+    def run(self):
+        """
+        Run every stage, returns {name: StageResult} in add order
+        """
+        start = time.time()
+        results = {}
+
+        if self.workers <= 1:
+            for stage in self.stages:
+                result = self.__skipped(stage, results) or self.__run_stage(stage)
+                results[stage.name] = result
+                self.__record(result)
+        else:
+            waiting = list(self.stages)
+            running = {}
+            with ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="stage"
+            ) as pool:
+                while waiting or running:
+                    for stage in list(waiting):
+                        if all(name in results for name in stage.depends_on):
+                            waiting.remove(stage)
+                            skipped = self.__skipped(stage, results)
+                            if skipped:
+                                results[stage.name] = skipped
+                                self.__record(skipped)
+                            else:
+                                running[pool.submit(self.__run_stage, stage)] = stage
+                    if not running:
+                        continue
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage = running.pop(future)
+                        results[stage.name] = future.result()
+                        self.__record(results[stage.name])
+
+        log_print(
+            success="Pipeline",
+            module_="pipeline.py",
+            func="run",
+            stages={name: result.status for name, result in results.items()},
+            critical_path=self.critical_path(),
+            workers=self.workers,
+            seconds=round(time.time() - start, 3),
+        )
+        return {stage.name: results[stage.name] for stage in self.stages}
+
+    def __skipped(self, stage, results):
+        """
+        A SKIPPED result if a stage it depends on did not finish, else None
+        """
+        blocked = [name for name in stage.depends_on if results[name].status != OK]
+        if blocked:
+            error = RuntimeError(f"waiting on {blocked}")
+            return StageResult(stage.name, SKIPPED, error=error)
+        return None
+
+    def __run_stage(self, stage):
+        started = time.time()
+        try:
+            value = stage.func(*stage.args, **stage.kwargs)
+            return StageResult(stage.name, OK, value, None, started, time.time())
+        except Exception as e:
+            return StageResult(stage.name, FAILED, None, e, started, time.time())
+
+    def __record(self, result):
+        METRICS.count("pipeline_stages", stage=result.name, status=result.status)
+        METRICS.observe("pipeline.stage", result.seconds, stage=result.name)
+        if result.status == OK:
+            log_print(
+                success="Pipeline stage",
+                module_="pipeline.py",
+                stage=result.name,
+                seconds=round(result.seconds, 3),
+            )
+        else:
+            log_print(
+                error=result.error,
+                module_="pipeline.py",
+                stage=result.name,
+                status=result.status,
+            )
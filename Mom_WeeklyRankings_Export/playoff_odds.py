@@ -0,0 +1,266 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from Mom_WeeklyRankings_Export.db_upload import DatabaseCursor
+from Mom_WeeklyRankings_Export.cust_logging import log_print
+from Mom_WeeklyRankings_Export.metrics import timed
+from Mom_WeeklyRankings_Export.ranking import load_rules
+from Mom_WeeklyRankings_Export.schema import coerce
+from Mom_WeeklyRankings_Export.tournament import Tournament
+from Mom_WeeklyRankings_Export.utils import RULES_FILE, data_upload
+
+# season total behind each Cur. Wk Rk rule column, more is better for all
+RANK_TOTALS = {
+    "2pt Ttl Rk": "2pt Ttl",
+    "Ttl Pts Rk": "Ttl Pts",
+    "Avg Pts Rk": "Ttl Pts",
+    "W/L Rk": "Win Ttl",
+    "Ttl Pts Win Rk": "Ttl Pts Win",
+}
+
+# a week's top scorers get a Wk Pts W/L point, as in reg_season
+POINTS_WINS = 5
+
+# weeks of results it takes for a team's own scoring to outweigh
+# its projections (mean) and the league's spread (sd)
+PRIOR_WEEKS = 3
+
+# trials per task sent to the process pool
+CHUNK_TRIALS = 10000
+
+
+def fit_scoring(results):
+    """
+    Normal scoring distribution of each team from its Wk Pts so far,
+    the mean shrunk towards its Wk Pro. Pts and the spread towards the
+    league's while there are only a few weeks
+
+    results = prod.reg_season_results rows of one season
+    Returns means, sds indexed by team_key
+    """
+    teams = results.groupby("team_key")
+    weeks = teams["Wk Pts"].count()
+    mean = (
+        weeks * teams["Wk Pts"].mean() + PRIOR_WEEKS * teams["Wk Pro. Pts"].mean()
+    ) / (weeks + PRIOR_WEEKS)
+
+    league_var = results["Wk Pts"].var()
+    team_var = teams["Wk Pts"].var().fillna(league_var)
+    sd = np.sqrt(
+        ((weeks - 1).clip(lower=0) * team_var + PRIOR_WEEKS * league_var)
+        / ((weeks - 1).clip(lower=0) + PRIOR_WEEKS)
+    )
+    return mean, sd
+
+
+def simulate_chunk(trials, seed, state):
+    """
+    Play out the rest of the regular season and the playoff bracket
+    trials times at once, every array is trials x teams.
+
+    Returns per team counts summed over the trials: playoff berths,
+    championships, seeds, Win Ttl and 2pt Ttl
+    """
+    rng = np.random.default_rng(seed)
+    mean, sd = state["mean"], state["sd"]
+    teams = len(mean)
+    totals = {
+        col: np.tile(values, (trials, 1)) for col, values in state["totals"].items()
+    }
+
+    points_wins = min(POINTS_WINS, teams)
+    for home, away in state["schedule"]:
+        scores = rng.normal(mean, sd, size=(trials, teams))
+        home_win = scores[:, home] > scores[:, away]
+        totals["Win Ttl"][:, home] += home_win
+        totals["Win Ttl"][:, away] += ~home_win
+        top = np.argpartition(-scores, points_wins - 1, axis=1)[:, :points_wins]
+        week_pts_win = np.zeros((trials, teams))
+        np.put_along_axis(week_pts_win, top, 1, axis=1)
+        totals["Ttl Pts Win"] += week_pts_win
+        totals["Ttl Pts"] += scores
+    totals["2pt Ttl"] = totals["Win Ttl"] + totals["Ttl Pts Win"]
+
+    # seed order: rule keys in turn, random among teams tied on all of them
+    keys = [rng.random((trials, teams))]
+    for col, ascending in reversed(state["rank_keys"]):
+        keys.append(
+            -totals[RANK_TOTALS[col]] if ascending else totals[RANK_TOTALS[col]]
+        )
+    order = np.lexsort(keys, axis=-1)
+    seed_of = np.empty((trials, teams), dtype=int)
+    np.put_along_axis(seed_of, order, np.arange(1, teams + 1)[None, :], axis=1)
+
+    playoff_seeds = order[:, : state["playoff_teams"]]
+    winners, losers = [], []
+
+    def team_at(source):
+        kind, i = source
+        if kind == "seed":
+            return playoff_seeds[:, i]
+        return winners[i] if kind == "winner" else losers[i]
+
+    matches, final = state["bracket"]
+    for left, right in matches:
+        left, right = team_at(left), team_at(right)
+        left_won = rng.normal(mean[left], sd[left]) > rng.normal(mean[right], sd[right])
+        winners.append(np.where(left_won, left, right))
+        losers.append(np.where(left_won, right, left))
+    champions = team_at(final[0])
+
+    return {
+        "playoff": np.bincount(playoff_seeds.ravel(), minlength=teams),
+        "champ": np.bincount(champions, minlength=teams),
+        "seed": seed_of.sum(axis=0),
+        "Win Ttl": totals["Win Ttl"].sum(axis=0),
+        "2pt Ttl": totals["2pt Ttl"].sum(axis=0),
+    }
+
+
+@timed("stage.playoff_odds_simulate")
+def simulate(state, trials=100000, workers=None, seed=None):
+    """
+    Run simulate_chunk over trials in CHUNK_TRIALS pieces on a process
+    pool (in this process for a single chunk or workers=1) and add up
+    the counts
+    """
+    chunks = [CHUNK_TRIALS] * (trials // CHUNK_TRIALS)
+    if trials % CHUNK_TRIALS:
+        chunks.append(trials % CHUNK_TRIALS)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+
+    if workers == 1:
+        results = map(simulate_chunk, chunks, seeds, [state] * len(chunks))
+        return _add_counts(results)
+
+    # spawned, a forked child would inherit the locks the logging, pool and
+    # pipeline threads hold at that moment
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_context("spawn")
+    ) as pool:
+        return _add_counts(
+            pool.map(simulate_chunk, chunks, seeds, [state] * len(chunks))
+        )
+
+
+def _add_counts(results):
+    counts = None
+    for result in results:
+        if counts is None:
+            counts = result
+        else:
+            counts = {col: counts[col] + result[col] for col in counts}
+    return counts
+
+
+@timed("stage.playoff_odds")
+def playoff_odds(
+    game_id,
+    private_file,
+    week=None,
+    trials=100000,
+    workers=None,
+    seed=None,
+    rules_file=None,
+):
+    """
+    Playoff and championship odds of every team from the standings after
+    week (latest stored week by default), written to prod.playoff_odds.
+    The remaining regular season weeks, paired in raw.schedule (see
+    league_season_data.schedule), and the playoff Tournament are simulated
+    trials times with each team's fitted scoring. Raises when raw.schedule
+    is missing any of those weeks.
+    """
+    try:
+        db_cursor = DatabaseCursor(private_file)
+        results = db_cursor.copy_from_psql(
+            f"SELECT * FROM prod.reg_season_results WHERE game_id = {str(game_id)}"
+        ).drop_duplicates()
+        settings = db_cursor.copy_from_psql(
+            f"SELECT DISTINCT playoff_start_week, num_playoff_teams \
+FROM prod.settings WHERE game_id = {str(game_id)}"
+        )
+        playoff_start_week = int(settings["playoff_start_week"].values[0])
+        num_playoff_teams = int(settings["num_playoff_teams"].values[0])
+
+        # playoff weeks have no standings of their own, use the final ones
+        week = int(min(week or np.inf, results["Week"].max()))
+        results = results[results["Week"] <= week]
+        standings = results[results["Week"] == week].sort_values("Cur. Wk Rk")
+        team_keys = list(standings["team_key"])
+        team_index = {team: i for i, team in enumerate(team_keys)}
+
+        schedule = db_cursor.copy_from_psql(
+            f"SELECT DISTINCT week, team_a_team_key, team_b_team_key \
+FROM raw.schedule WHERE game_id = {str(game_id)} \
+AND week > {str(week)} AND week < {str(playoff_start_week)}"
+        )
+        missing = sorted(
+            set(range(week + 1, playoff_start_week)) - set(schedule["week"])
+        )
+        if missing:
+            raise ValueError(
+                f"raw.schedule has no pairings for weeks {missing}, "
+                "run league_season_data.schedule first"
+            )
+        schedule = schedule[
+            schedule["team_a_team_key"].isin(team_index)
+            & schedule["team_b_team_key"].isin(team_index)
+        ]
+
+        mean, sd = fit_scoring(results)
+        rules = load_rules(rules_file or Path(private_file).parent / RULES_FILE)
+        era = [rule for rule in rules if int(game_id) >= rule["first_game_id"]][-1]
+
+        state = {
+            "mean": mean.reindex(team_keys).to_numpy(),
+            "sd": sd.reindex(team_keys).to_numpy(),
+            "totals": {
+                col: standings[col].to_numpy(dtype=float)
+                for col in ["Win Ttl", "Ttl Pts Win", "Ttl Pts"]
+            },
+            "schedule": [
+                (
+                    games["team_a_team_key"].map(team_index).to_numpy(),
+                    games["team_b_team_key"].map(team_index).to_numpy(),
+                )
+                for _, games in schedule.groupby("week")
+            ],
+            "rank_keys": [
+                (key["column"], key.get("ascending", True)) for key in era["keys"]
+            ],
+            "playoff_teams": num_playoff_teams,
+            "bracket": Tournament(list(range(num_playoff_teams))).get_structure(),
+        }
+
+        counts = simulate(state, trials=trials, workers=workers, seed=seed)
+
+        odds = standings[["game_id", "Week", "team_key", "Team", "Manager"]].copy()
+        odds["Playoff Pct"] = counts["playoff"] / trials
+        odds["Champ Pct"] = counts["champ"] / trials
+        odds["Avg Seed"] = counts["seed"] / trials
+        odds["Avg Win Ttl"] = counts["Win Ttl"] / trials
+        odds["Avg 2pt Ttl"] = counts["2pt Ttl"] / trials
+        odds["Trials"] = trials
+        odds = coerce(odds.sort_values("Avg Seed"), "prod.playoff_odds")
+
+        query = f'SELECT * FROM prod.playoff_odds \
+WHERE NOT (game_id = {str(game_id)} AND "Week" = {str(week)})'
+        data_upload(odds, "prod.playoff_odds", private_file, query, upsert=True)
+
+        return odds
+
+    except Exception as e:
+        log_print(
+            error=e,
+            module_="playoff_odds.py",
+            func="playoff_odds",
+            table="prod.playoff_odds",
+            game_id=game_id,
+            week=week,
+        )
+        raise
@@ -0,0 +1,234 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from Mom_WeeklyRankings_Export.metrics import METRICS
+
+# where profile_run writes by default: MOM_PROFILE_DIR, or assests/profiles
+PROFILE_DIR = Path(
+    os.environ.get(
+        "MOM_PROFILE_DIR", Path(__file__).resolve().parents[1] / "assests" / "profiles"
+    )
+)
+
+# rows of each hotspot table and allocation sites of each memory table
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+
+# frames kept per allocation by tracemalloc, deep enough to get from
+# pandas internals back to the package line that called them
+TRACE_FRAMES = 25
+
+PACKAGE_ROOT = str(Path(__file__).resolve().parents[1])
+
+# time outside every stage
+RUN_STAGE = "(pipeline)"
+
+
+def _snapshot():
+    # without tracemalloc's own bookkeeping and the stage start snapshot
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+
+
+def _allocation_sites(diff):
+    """
+    Growth of a snapshot comparison by the innermost package line
+    (utils.py:215 rather than pandas/core/...), largest first
+    """
+    sites = {}
+    for stat in diff:
+        frame = next(
+            (
+                frame
+                for frame in reversed(stat.traceback)
+                if frame.filename.startswith(PACKAGE_ROOT)
+            ),
+            stat.traceback[-1],
+        )
+        site = f"{frame.filename}:{frame.lineno}"
+        size, count = sites.get(site, (0, 0))
+        sites[site] = (size + stat.size_diff, count + stat.count_diff)
+    return sorted(sites.items(), key=lambda item: -item[1][0])
+
+
+def _file_name(stage):
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in stage)
+
+
+class _Stage(object):
+    """
+    Everything profiled for one stage name over all of its calls
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak = 0
+        self.peak_allocations = None
+
+
+class Profiler(object):
+    """
+    cProfile and tracemalloc per pipeline stage.
+
+    Every outermost METRICS span (yahoo.*, db.*, stage.*) started on the
+    profiling thread is a stage, with its own cProfile.Profile enabled only
+    while it runs, so nested and repeated calls add up under the stage.
+    Time outside every stage goes to RUN_STAGE.
+
+    For memory, the tracemalloc peak is reset when a stage starts. Its
+    largest peak over all calls is kept, with the allocation sites that
+    grew during that call, compared at the end of the call to its start.
+    Frames already freed by then (temporary frames) show in the peak
+    only. tracemalloc sees every thread, cProfile only the profiling one.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.__thread = None
+        self.__depth = 0
+        self.__active = None
+        self.__start = None
+        self.__start_snapshot = None
+        self.__started = None
+        self.__own_tracing = False
+
+    def __stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = _Stage()
+        return self.stages[name]
+
+    def start(self):
+        self.__thread = threading.get_ident()
+        self.__started = time.time()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self.__own_tracing = True
+        tracemalloc.reset_peak()
+        METRICS.add_listener(self)
+        self.__switch(RUN_STAGE)
+
+    def stop(self):
+        self.__active.profile.disable()
+        METRICS.remove_listener(self)
+        run = self.__stage(RUN_STAGE)
+        run.calls = 1
+        run.seconds = time.time() - self.__started
+        run.peak = max(run.peak, tracemalloc.get_traced_memory()[1])
+        if self.__own_tracing:
+            tracemalloc.stop()
+
+    def __switch(self, name):
+        if self.__active is not None:
+            self.__active.profile.disable()
+        self.__active = self.__stage(name)
+        self.__active.profile.enable()
+
+    def span_started(self, name, labels):
+        if threading.get_ident() != self.__thread:
+            return
+        self.__depth += 1
+        if self.__depth > 1:
+            return
+
+        self.__active.profile.disable()
+        self.__start_snapshot = _snapshot()
+        run_peak = tracemalloc.get_traced_memory()[1]
+        self.stages[RUN_STAGE].peak = max(self.stages[RUN_STAGE].peak, run_peak)
+        tracemalloc.reset_peak()
+        self.__start = time.perf_counter()
+        self.__switch(name)
+
+    def span_finished(self, name, labels):
+        if threading.get_ident() != self.__thread:
+            return
+        self.__depth -= 1
+        if self.__depth > 0:
+            return
+
+        stage = self.__active
+        stage.profile.disable()
+        stage.calls += 1
+        stage.seconds += time.perf_counter() - self.__start
+        peak = tracemalloc.get_traced_memory()[1]
+        if peak >= stage.peak:
+            stage.peak = peak
+            stage.peak_allocations = _allocation_sites(
+                _snapshot().compare_to(self.__start_snapshot, "traceback")
+            )[:TOP_ALLOCATIONS]
+        self.__start_snapshot = None
+        tracemalloc.reset_peak()
+        self.__switch(RUN_STAGE)
+
+    def write_report(self, report_dir):
+        """
+        Write per stage <stage>.prof (pstats, for snakeviz and the like) and
+        <stage>.txt (hotspots by cumulative and own time), memory.txt with
+        the peak allocations of every stage, and summary.json
+        """
+        report_dir = Path(report_dir)
+        report_dir.mkdir(parents=True, exist_ok=True)
+        summary = []
+        memory = []
+
+        for name, stage in sorted(
+            self.stages.items(), key=lambda item: -item[1].seconds
+        ):
+            file_name = _file_name(name)
+            stats_text = io.StringIO()
+            try:
+                stats = pstats.Stats(stage.profile, stream=stats_text)
+            except TypeError:
+                # a stage that never ran any Python code has no stats
+                continue
+            stats.dump_stats(report_dir / f"{file_name}.prof")
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            stats.sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+            with open(report_dir / f"{file_name}.txt", "w") as file:
+                file.write(f"{name}: {stage.calls} calls, {stage.seconds:.3f}s\n")
+                file.write(stats_text.getvalue())
+
+            summary.append(
+                {
+                    "stage": name,
+                    "calls": stage.calls,
+                    "seconds": round(stage.seconds, 6),
+                    "peak_bytes": stage.peak,
+                }
+            )
+            peak = stage.peak / 1024 / 1024
+            memory.append(f"{name}: peak {peak:.1f} MiB over {stage.calls} calls")
+            for site, (size, count) in stage.peak_allocations or []:
+                memory.append(f"\t{size / 1024:+.1f} KiB {count:+d} blocks\t{site}")
+
+        with open(report_dir / "memory.txt", "w") as file:
+            file.write("\n".join(memory) + "\n")
+        with open(report_dir / "summary.json", "w") as file:
+            json.dump({"started": self.__started, "stages": summary}, file, indent=2)
+
+        return report_dir
+
+
+def profile_run(func, *args, report_dir=None, **kwargs):
+    """
+    Run func(*args, **kwargs) under the Profiler and write its report to
+    report_dir, by default a new PROFILE_DIR / <start time> directory.
+    The report is written even if func raises.
+    """
+    report_dir = Path(report_dir or PROFILE_DIR / time.strftime("%Y%m%dT%H%M%S"))
+    profiler = Profiler()
+    profiler.start()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.stop()
+        profiler.write_report(report_dir)
@@ -0,0 +1,122 @@
+import numpy as np
+import yaml
+from pathlib import Path
+
+# Cur. Wk Rk tie-breaks used when no ranking_rules.yaml is found:
+# W/L then points before game_id 390 (2019), 2pt total then points after
+DEFAULT_RULES = [
+    {
+        "first_game_id": 0,
+        "keys": [
+            {"column": "W/L Rk", "ascending": True},
+            {"column": "Ttl Pts Rk", "ascending": True},
+        ],
+    },
+    {
+        "first_game_id": 390,
+        "keys": [
+            {"column": "2pt Ttl Rk", "ascending": True},
+            {"column": "Ttl Pts Rk", "ascending": True},
+        ],
+    },
+]
+
+
+def load_rules(rules_file=None):
+    """
+    Ranking eras from rules_file (ranking_rules.yaml), sorted by
+    first_game_id. DEFAULT_RULES if the file does not exist.
+    """
+    rules = DEFAULT_RULES
+    if rules_file is not None and Path(rules_file).exists():
+        with open(rules_file, "r") as file:
+            rules = yaml.load(file, Loader=yaml.SafeLoader)["eras"]
+    return sorted(rules, key=lambda era: era["first_game_id"])
+
+
+def rank_within(groups, keys, ascending, method="min"):
+    """
+    Rank rows inside each group by keys in order, without building
+    Python objects per row.
+
+    groups = list of 1-d arrays, rows with equal values share a group
+    keys = list of numeric 1-d arrays, first key decides first
+    ascending = one bool per key
+    method = "min" (1, 2, 2, 4) or "dense" (1, 2, 2, 3) for tied rows
+
+    Returns 1-based int ranks in the original row order.
+    """
+    sort_keys = [
+        np.asarray(k) if asc else -np.asarray(k) for k, asc in zip(keys, ascending)
+    ]
+    groups = [np.asarray(g) for g in groups]
+
+    # np.lexsort sorts by its last key first
+    order = np.lexsort(sort_keys[::-1] + groups[::-1])
+    rows = len(order)
+    if rows == 0:
+        return np.empty(0, dtype=int)
+
+    group_start = np.zeros(rows, dtype=bool)
+    group_start[0] = True
+    for g in groups:
+        g = g[order]
+        group_start[1:] |= g[1:] != g[:-1]
+
+    tie_start = group_start.copy()
+    for k in sort_keys:
+        k = k[order]
+        tie_start[1:] |= k[1:] != k[:-1]
+
+    position = np.arange(rows)
+    first_in_group = np.maximum.accumulate(np.where(group_start, position, 0))
+    if method == "min":
+        first_in_tie = np.maximum.accumulate(np.where(tie_start, position, 0))
+        sorted_ranks = first_in_tie - first_in_group + 1
+    elif method == "dense":
+        ties = np.cumsum(tie_start)
+        sorted_ranks = ties - ties[first_in_group] + 1
+    else:
+        raise ValueError(f"unknown rank method {method}")
+
+    ranks = np.empty(rows, dtype=int)
+    ranks[order] = sorted_ranks
+    return ranks
+
+
+def current_week_rank(df, rules, group_columns=("game_id", "Week"), method="min"):
+    """
+    Cur. Wk Rk of every row of df, which may hold many seasons: each row
+    is ranked within its group_columns by the keys of its game_id's era
+    """
+    game_ids = df["game_id"].to_numpy()
+    ranks = np.zeros(len(df), dtype=int)
+    bounds = [era["first_game_id"] for era in rules[1:]] + [np.inf]
+    for era, upper in zip(rules, bounds):
+        mask = (game_ids >= era["first_game_id"]) & (game_ids < upper)
+        if not mask.any():
+            continue
+        ranks[mask] = rank_within(
+            [df[col].to_numpy()[mask] for col in group_columns],
+            [df[key["column"]].to_numpy()[mask] for key in era["keys"]],
+            [key.get("ascending", True) for key in era["keys"]],
+            method=method,
+        )
+    return ranks
+
+
+def rank_keys(df, rules):
+    """
+    The sort keys of each row as text, "(2pt Ttl Rk, Ttl Pts Rk)",
+    written the way the tuples were stored in rk_tuple
+    """
+    text = None
+    for era in rules:
+        columns = [key["column"] for key in era["keys"]]
+        era_text = "(" + df[columns[0]].astype(str)
+        for col in columns[1:]:
+            era_text = era_text + ", " + df[col].astype(str)
+        era_text = era_text + ("," if len(columns) == 1 else "") + ")"
+        mask = df["game_id"] >= era["first_game_id"]
+        text = era_text if text is None else era_text.where(mask, text)
+    return text
@@ -0,0 +1,69 @@
+import multiprocessing
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    Token-bucket rate limiter shared by every thread that calls Yahoo.
+    Tokens refill at rate per second up to capacity, so short bursts
+    (one call per team) go out at once and long runs settle at rate.
+
+    rate = tokens added per second
+    capacity = largest burst allowed
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Block until tokens are available and take them
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket kept in shared memory so every worker process draws from
+    one budget. Create it in the parent and hand it to the workers through
+    the pool initializer (it can only be pickled while processes start).
+
+    context = multiprocessing context the worker pool uses
+    """
+
+    def __init__(self, rate, capacity, context=None):
+        self._state = (context or multiprocessing).Array("d", 2)
+        super().__init__(rate, capacity)
+        self._lock = self._state.get_lock()
+
+    @property
+    def _tokens(self):
+        return self._state[0]
+
+    @_tokens.setter
+    def _tokens(self, value):
+        self._state[0] = value
+
+    @property
+    def _updated(self):
+        return self._state[1]
+
+    @_updated.setter
+    def _updated(self, value):
+        self._state[1] = value
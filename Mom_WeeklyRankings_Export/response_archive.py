@@ -0,0 +1,78 @@
+import atexit
+import pickle
+import threading
+import time
+import zipfile
+from collections import defaultdict
+
+from Mom_WeeklyRankings_Export.response_cache import ResponseCache
+
+
+class ResponseArchive(object):
+    """
+    Zip archive of raw Yahoo responses for record/replay runs.
+
+    mode="record" appends every response served to the pipeline, in call
+    order, with repeated calls kept as separate entries.
+    mode="replay" serves them back in the same order with no network,
+    sleeping latency seconds per call to mimic Yahoo. A call repeated
+    more often than it was recorded gets the last recorded response.
+
+    path = archive file, e.g. assests/fixtures/2022-week-14.zip
+    """
+
+    def __init__(self, path, mode="replay", latency=0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown archive mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._calls = defaultdict(int)
+
+        if mode == "record":
+            self._zip = zipfile.ZipFile(
+                path, "a", compression=zipfile.ZIP_DEFLATED, compresslevel=9
+            )
+            for name in self._zip.namelist():
+                key, _ = name.split("/")
+                self._calls[key] += 1
+            atexit.register(self.close)
+        else:
+            self._zip = zipfile.ZipFile(path, "r")
+            self._entries = defaultdict(list)
+            for name in sorted(
+                self._zip.namelist(), key=lambda n: int(n.split("/")[1])
+            ):
+                self._entries[name.split("/")[0]].append(name)
+
+    def put(self, endpoint, args, response):
+        """
+        Record one response
+        """
+        key = ResponseCache.key(endpoint, args)
+        data = pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._zip.writestr(f"{key}/{self._calls[key]}", data)
+            self._calls[key] += 1
+
+    def get(self, endpoint, args):
+        """
+        Replay the next recorded response for endpoint and args
+        """
+        key = ResponseCache.key(endpoint, args)
+        with self._lock:
+            names = self._entries.get(key)
+            if not names:
+                raise LookupError(f"No recorded response for {endpoint}{args}")
+            name = names[min(self._calls[key], len(names) - 1)]
+            self._calls[key] += 1
+            data = self._zip.read(name)
+        if self.latency:
+            time.sleep(self.latency)
+        return pickle.loads(data)
+
+    def close(self):
+        with self._lock:
+            if self._zip.fp is not None:
+                self._zip.close()
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+
+class ResponseCache(object):
+    """
+    On-disk cache of Yahoo responses, content addressed by a hash of the
+    endpoint and its arguments.
+
+    Entries stored as final (past seasons, finished weeks) never expire,
+    other entries are served for ttl seconds, so the default ttl=0 only
+    ever serves data that cannot change.
+
+    cache_dir = folder for the cache files
+    ttl = seconds a non-final entry stays valid
+    """
+
+    def __init__(self, cache_dir, ttl=0):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+
+    @staticmethod
+    def key(endpoint, args):
+        """
+        sha256 of the endpoint name and its arguments
+        """
+        raw = repr((endpoint, tuple(str(arg) for arg in args)))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.pickle"
+
+    def get(self, endpoint, args):
+        """
+        Returns (True, response) on a hit and (False, None) on a miss
+        """
+        try:
+            with open(self._path(self.key(endpoint, args)), "rb") as file:
+                entry = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            return False, None
+
+        if entry["final"] or time.time() - entry["stored"] < self.ttl:
+            return True, entry["response"]
+        return False, None
+
+    def put(self, endpoint, args, response, final=False):
+        """
+        Store a response, written to a temp file of its own first so readers
+        never see half an entry, also when threads store the same key at once
+        """
+        path = self._path(self.key(endpoint, args))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "endpoint": endpoint,
+            "args": [str(arg) for arg in args],
+            "final": bool(final),
+            "stored": time.time(),
+            "response": response,
+        }
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+        ) as file:
+            try:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                file.close()
+                os.unlink(file.name)
+                raise
+        os.replace(file.name, path)
@@ -0,0 +1,155 @@
+import random
+import re
+import requests
+import time
+
+from Mom_WeeklyRankings_Export.cust_logging import log_print
+
+AUTH = "auth"
+NETWORK = "network"
+INVALID_WEEK = "invalid_week"
+OTHER = "other"
+
+# yfpy puts Yahoo's own error description in quotes after the request URL,
+# which has /scoreboard;week=N in it for every matchups call, so only the
+# description is searched for Yahoo's invalid week answer
+_YAHOO_DESCRIPTION = re.compile(r'failed with error: "(.*)"', re.DOTALL)
+_INVALID_WEEK = re.compile(r"invalid week|week \S+ is not (a )?valid", re.IGNORECASE)
+
+# OAuth problem codes yahoo_oauth and Yahoo answer with
+_AUTH_TEXT = ("token_expired", "token_rejected", "oauth_problem")
+
+# HTTP statuses worth retrying, 999 is Yahoo's rate limit answer
+_NETWORK_STATUS = (429, 500, 502, 503, 504, 999)
+_NETWORK_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    requests.ConnectionError,
+    requests.Timeout,
+)
+_NETWORK_TEXT = (
+    "Network is unreachable",
+    "timed out",
+    "Max retries exceeded",
+    "Temporary failure in name resolution",
+    "due to rate limiting",
+)
+
+
+class InvalidWeekError(Exception):
+    """
+    Yahoo has no data for the requested week, retrying will not help
+    """
+
+
+def _status(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def classify_error(error):
+    """
+    Sort an exception from a Yahoo call into auth, network, invalid_week or other,
+    by the HTTP status and exception type where there is one
+    """
+    text = str(error)
+    status = _status(error)
+    description = _YAHOO_DESCRIPTION.search(text)
+    if description and _INVALID_WEEK.search(description.group(1)):
+        return INVALID_WEEK
+    if status == 401 or any(s in text for s in _AUTH_TEXT):
+        return AUTH
+    if (
+        status in _NETWORK_STATUS
+        or isinstance(error, _NETWORK_ERRORS)
+        or any(s in text for s in _NETWORK_TEXT)
+    ):
+        return NETWORK
+    return OTHER
+
+
+class RetryPolicy(object):
+    """
+    Retry a call with exponential backoff and full jitter.
+
+    Only network errors are retried: they back off base_delay,
+    2 * base_delay, ... capped at max_delay, until max_attempts calls or
+    max_total seconds are used up, then the last error is raised.
+    An auth error re-authenticates and retries at once, one time; invalid
+    week errors are raised as InvalidWeekError and everything else is
+    raised straight away.
+    """
+
+    def __init__(self, base_delay=2, max_delay=120, max_attempts=8, max_total=900):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.max_total = max_total
+
+    def delay(self, attempt):
+        """
+        Sleep before retry number attempt (1 based)
+        """
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+    def call(self, func, *args, reauthenticate=None, **log_kwargs):
+        """
+        Return func(*args), retrying per the policy.
+        reauthenticate is called before retrying an auth error,
+        log_kwargs are added to the log line of every failed attempt.
+        """
+        start = time.monotonic()
+        attempt = 0
+        reauthenticated = False
+        while True:
+            try:
+                return func(*args)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == INVALID_WEEK:
+                    raise InvalidWeekError(str(e)) from e
+
+                attempt += 1
+                elapsed = time.monotonic() - start
+                if kind == AUTH and reauthenticate and not reauthenticated:
+                    reauthenticate()
+                    reauthenticated = True
+                    delay = 0
+                elif kind == NETWORK:
+                    delay = self.delay(attempt)
+                else:
+                    self.__give_up(
+                        e, kind, attempt, elapsed, "not retryable", log_kwargs
+                    )
+                    raise
+
+                if attempt >= self.max_attempts or elapsed + delay > self.max_total:
+                    self.__give_up(
+                        e, kind, attempt, elapsed, "retry budget used", log_kwargs
+                    )
+                    raise
+
+                log_print(
+                    error=e,
+                    module_="retry.py",
+                    func="RetryPolicy.call",
+                    error_type=kind,
+                    attempt=attempt,
+                    sleep=f"{delay:.1f} sec before retrying",
+                    **log_kwargs,
+                )
+                time.sleep(delay)
+
+    def __give_up(self, error, kind, attempts, elapsed, reason, log_kwargs):
+        log_print(
+            error=error,
+            module_="retry.py",
+            func="RetryPolicy.call",
+            error_type=kind,
+            attempts=attempts,
+            elapsed=round(elapsed, 1),
+            giving_up=reason,
+            **log_kwargs,
+        )
@@ -0,0 +1,326 @@
+import pandas as pd
+
+DATE = "datetime64[D]"
+
+# pd.read_csv dtype for each column type, dates go to parse_dates
+READ_DTYPES = {int: "int64", float: "float64", str: "str"}
+
+# postgres column type for each column type, for tables created here
+PG_TYPES = {int: "bigint", float: "double precision", str: "text", DATE: "date"}
+
+
+class TableSchema(object):
+    """
+    Columns, dtypes, rounding and natural key of one table.
+
+    columns = [(name, dtype, decimals), ...] in table order,
+    dtype None leaves the column as parsed, decimals None skips rounding
+    key = natural key columns, used to merge rows with upsert
+    replaces = columns naming the part of the table one write replaces, e.g.
+    game_id and week: upsert first deletes the stored rows of every
+    (game_id, week) in the frame. Tables without it are not upserted.
+    create = True for tables the pipeline creates itself when missing
+    """
+
+    def __init__(self, name, columns, key, replaces=None, create=False):
+        self.name = name
+        self.create = create
+        self.replaces = list(replaces or [])
+        self.columns = [col for col, _, _ in columns]
+        self.dtypes = {col: dtype for col, dtype, _ in columns}
+        self.rounding = {
+            col: decimals for col, _, decimals in columns if decimals is not None
+        }
+        self.key = list(key)
+
+    def validate(self, df):
+        """
+        Raise ValueError if df is missing any of the table's columns
+        """
+        missing = [col for col in self.columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"{self.name} is missing columns {missing}")
+
+    def coerce(self, df):
+        """
+        Select the table's columns in order and cast/round each one once,
+        columns already of the right dtype are not copied
+        """
+        self.validate(df)
+        data = {}
+        for col in self.columns:
+            column = df[col]
+            dtype = self.dtypes[col]
+            if dtype is not None:
+                column = column.astype(dtype, copy=False)
+            if col in self.rounding:
+                column = column.round(decimals=self.rounding[col])
+            data[col] = column
+        return pd.DataFrame(data, index=df.index, copy=False)
+
+    def pg_columns(self):
+        """
+        Column name -> postgres type, for DatabaseCursor.create_table
+        """
+        return {col: PG_TYPES.get(d, "text") for col, d in self.dtypes.items()}
+
+    def read_kwargs(self):
+        """
+        dtype and parse_dates for reading the whole table back with pd.read_csv
+        """
+        dtype = {
+            col: READ_DTYPES[d] for col, d in self.dtypes.items() if d in READ_DTYPES
+        }
+        parse_dates = [col for col, d in self.dtypes.items() if d == DATE]
+        return {"dtype": dtype, "parse_dates": parse_dates or None}
+
+
+SCHEMAS = {
+    schema.name: schema
+    for schema in [
+        TableSchema(
+            "raw.matchups",
+            [
+                ("game_id", int, None),
+                ("is_consolation", int, None),
+                ("is_playoffs", int, None),
+                ("is_tied", int, None),
+                ("league_id", int, None),
+                ("team_a_grade", str, None),
+                ("team_a_points", float, 2),
+                ("team_a_projected_points", float, 2),
+                ("team_a_team_key", str, None),
+                ("team_b_grade", str, None),
+                ("team_b_points", float, 2),
+                ("team_b_projected_points", float, 2),
+                ("team_b_team_key", str, None),
+                ("week", int, None),
+                ("week_start", DATE, None),
+                ("week_end", DATE, None),
+                ("winner_team_key", str, None),
+            ],
+            ["game_id", "week", "team_a_team_key"],
+            replaces=["game_id", "week"],
+        ),
+        TableSchema(
+            "raw.schedule",
+            [
+                ("game_id", int, None),
+                ("league_id", int, None),
+                ("week", int, None),
+                ("team_a_team_key", str, None),
+                ("team_b_team_key", str, None),
+            ],
+            ["game_id", "week", "team_a_team_key"],
+            replaces=["game_id", "week"],
+            create=True,
+        ),
+        TableSchema(
+            "raw.teams",
+            [
+                ("game_id", int, None),
+                ("league_id", int, None),
+                ("team_id", int, None),
+                ("team_key", str, None),
+                ("manager_id", int, None),
+                ("clinched_playoffs", int, None),
+                ("draft_grade", str, None),
+                ("faab_balance", int, None),
+                ("name", str, None),
+                ("nickname", None, None),
+                ("number_of_moves", int, None),
+                ("number_of_trades", int, None),
+                ("team_standings.playoff_seed", int, None),
+                ("team_standings.rank", int, None),
+                ("team_standings.outcome_totals.wins", int, None),
+                ("team_standings.outcome_totals.losses", int, None),
+                ("team_standings.outcome_totals.ties", int, None),
+                ("team_standings.outcome_totals.percentage", float, 4),
+                ("team_standings.points_for", float, 2),
+                ("team_standings.points_against", float, 2),
+            ],
+            ["game_id", "team_key"],
+            replaces=["game_id"],
+        ),
+        TableSchema(
+            "raw.weekly_team_pts",
+            [
+                ("game_id", int, None),
+                ("league_id", int, None),
+                ("team_id", int, None),
+                ("team_key", str, None),
+                ("week", int, None),
+                ("final_points", float, 2),
+                ("projected_points", float, 2),
+            ],
+            ["game_id", "week", "team_key"],
+            replaces=["game_id", "week"],
+        ),
+        TableSchema(
+            "prod.metadata",
+            [
+                ("game_id", int, None),
+                ("league_id", int, None),
+                ("name", str, None),
+                ("num_teams", int, None),
+                ("season", int, None),
+                ("start_date", DATE, None),
+                ("start_week", int, None),
+                ("end_date", DATE, None),
+                ("end_week", int, None),
+            ],
+            ["game_id", "league_id"],
+            replaces=["game_id"],
+        ),
+        TableSchema(
+            "prod.settings",
+            [
+                ("game_id", int, None),
+                ("league_id", int, None),
+                ("has_multiweek_championship", int, None),
+                ("max_teams", int, None),
+                ("num_playoff_teams", int, None),
+                ("has_playoff_consolation_games", int, None),
+                ("num_playoff_consolation_teams", int, None),
+                ("playoff_start_week", int, None),
+                ("trade_end_date", DATE, None),
+            ],
+            ["game_id", "league_id"],
+            replaces=["game_id"],
+        ),
+        TableSchema(
+            "prod.nfl_weeks",
+            [
+                ("week", int, None),
+                ("week_start", DATE, None),
+                ("week_end", DATE, None),
+                ("game_id", int, None),
+            ],
+            ["game_id", "week"],
+        ),
+        TableSchema(
+            "prod.game_keys",
+            [
+                ("game_id", int, None),
+                ("league_id", None, None),
+                ("season", int, None),
+                ("is_game_over", None, None),
+                ("is_offseason", None, None),
+            ],
+            ["game_id"],
+        ),
+        TableSchema(
+            "prod.reg_season_results",
+            [
+                ("game_id", int, None),
+                ("Week", int, None),
+                ("team_key", str, None),
+                ("Cur. Wk Rk", int, None),
+                ("Prev. Wk Rk", int, None),
+                ("Manager", str, None),
+                ("Team", str, None),
+                ("2pt Ttl", int, None),
+                ("2pt Ttl Rk", int, None),
+                ("Ttl Pts Win", int, None),
+                ("Ttl Pts Win Rk", int, None),
+                ("Win Ttl", int, None),
+                ("Loss Ttl", int, None),
+                ("W/L Rk", int, None),
+                ("Wk W/L", str, None),
+                ("Wk Pts W/L", int, None),
+                ("Wk Pts", float, 2),
+                ("Wk Pts Rk", int, None),
+                ("Wk Pro. Pts", float, 2),
+                ("Wk Pro. Pts Rk", int, None),
+                ("Avg Pts", float, 2),
+                ("Avg Pts Rk", int, None),
+                ("Avg Opp Pts", float, 2),
+                ("Avg Opp Pts Rk", int, None),
+                ("Ttl Pts", float, 2),
+                ("Ttl Pts Rk", int, None),
+                ("Ttl Opp Pts", float, 2),
+                ("Ttl Opp Pts Rk", int, None),
+                ("Ttl Pro. Pts", float, 2),
+                ("Ttl Pro. Pts Rk", int, None),
+                ("Ttl Opp Pro. Pts", float, 2),
+                ("Ttl Opp Pro. Pts Rk", int, None),
+                ("opp_team_key", str, None),
+                ("Opp Manager", str, None),
+                ("Opp Team", str, None),
+                ("Opp Wk Pts", float, 2),
+                ("Opp Wk Pts Rk", int, None),
+                ("Opp Wk Pro. Pts", float, 2),
+                ("Opp Wk Pro. Pts Rk", int, None),
+                ("rk_tuple", None, None),
+            ],
+            ["game_id", "Week", "team_key"],
+            replaces=["game_id", "Week"],
+        ),
+        TableSchema(
+            "prod.playoff_board",
+            [
+                ("game_id", int, None),
+                ("Week", int, None),
+                ("Bracket", str, None),
+                ("Finish", int, None),
+                ("Playoff Seed", int, None),
+                ("team_key", str, None),
+                ("Team", str, None),
+                ("Manager", str, None),
+                ("Wk W/L", str, None),
+                ("Wk Pts", float, 2),
+                ("Wk Pro. Pts", float, 2),
+                ("Ttl Pts", float, 2),
+                ("Ttl Pro. Pts", float, 2),
+                ("opp_team_key", str, None),
+                ("Opp Team", str, None),
+                ("Opp Manager", str, None),
+                ("Opp Wk Pts", float, 2),
+                ("Opp Wk Pro. Pts", float, 2),
+                ("Opp Ttl Pts", float, 2),
+                ("Opp Ttl Pro. Pts", float, 2),
+            ],
+            ["game_id", "Week", "team_key"],
+            replaces=["game_id", "Week"],
+        ),
+        TableSchema(
+            "prod.playoff_odds",
+            [
+                ("game_id", int, None),
+                ("Week", int, None),
+                ("team_key", str, None),
+                ("Team", str, None),
+                ("Manager", str, None),
+                ("Playoff Pct", float, 4),
+                ("Champ Pct", float, 4),
+                ("Avg Seed", float, 2),
+                ("Avg Win Ttl", float, 2),
+                ("Avg 2pt Ttl", float, 2),
+                ("Trials", int, None),
+            ],
+            ["game_id", "Week", "team_key"],
+            replaces=["game_id", "Week"],
+            create=True,
+        ),
+        TableSchema(
+            "prod.bracket_state",
+            [
+                ("game_id", int, None),
+                ("Bracket", str, None),
+                ("Match", int, None),
+                ("Seeds", str, None),
+                ("team_key", str, None),
+                ("Week", int, None),
+            ],
+            ["game_id", "Bracket", "Match"],
+            create=True,
+        ),
+    ]
+}
+
+
+def coerce(df, table):
+    """
+    df cut down to table's columns with the registry's dtypes and rounding
+    """
+    return SCHEMAS[table].coerce(df)
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+from Mom_WeeklyRankings_Export.metrics import timed
+from Mom_WeeklyRankings_Export.ranking import current_week_rank, rank_keys
+
+
+def rank_teams(values, ascending=True, method="min"):
+    """
+    Rank the teams of every week (column) of a teams x weeks array,
+    method = "first" (ties in team order), "min" or "max" like pandas rank
+    """
+    keys = values if ascending else -values
+    order = np.argsort(keys, axis=0, kind="stable")
+    ordered = np.take_along_axis(keys, order, axis=0)
+    teams, weeks = keys.shape
+    position = np.broadcast_to(np.arange(teams)[:, None], keys.shape)
+    edge = np.ones((1, weeks), dtype=bool)
+    changes = ordered[1:] != ordered[:-1]
+
+    if method == "first":
+        sorted_ranks = position + 1
+    elif method == "min":
+        tie_start = np.vstack([edge, changes])
+        sorted_ranks = (
+            np.maximum.accumulate(np.where(tie_start, position, 0), axis=0) + 1
+        )
+    elif method == "max":
+        tie_end = np.vstack([changes, edge])
+        sorted_ranks = (
+            np.minimum.accumulate(np.where(tie_end, position, teams)[::-1], axis=0)[
+                ::-1
+            ]
+            + 1
+        )
+    else:
+        raise ValueError(f"unknown rank method {method}")
+
+    ranks = np.empty(keys.shape, dtype=int)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=0)
+    return ranks
+
+
+@timed("stage.season_matrix")
+def season_matrix(matchups, teams, rules):
+    """
+    Regular season rows of one season computed on dense teams x weeks
+    arrays: every matchup is written into the arrays once for each side,
+    totals are cumsums along the weeks and ranks are sorts along the teams.
+    Returns the rows in the prod.reg_season_results layout, or None when
+    the matchups do not give every team exactly one game a week (the
+    pandas path handles those seasons).
+
+    matchups = raw.matchups rows of the regular season weeks
+    teams = raw.teams rows of the season, for names
+    rules = ranking eras from load_rules
+    """
+    if matchups.empty:
+        return None
+
+    weeks = np.unique(matchups["week"].to_numpy())
+    team_keys = np.unique(
+        np.concatenate(
+            [
+                matchups["team_a_team_key"].to_numpy(),
+                matchups["team_b_team_key"].to_numpy(),
+            ]
+        )
+    )
+    a = np.searchsorted(team_keys, matchups["team_a_team_key"].to_numpy())
+    b = np.searchsorted(team_keys, matchups["team_b_team_key"].to_numpy())
+    w = np.searchsorted(weeks, matchups["week"].to_numpy())
+    shape = (len(team_keys), len(weeks))
+
+    games = np.zeros(shape, dtype=int)
+    np.add.at(games, (a, w), 1)
+    np.add.at(games, (b, w), 1)
+    if not (games == 1).all():
+        return None
+
+    def grid(a_values, b_values, dtype=float):
+        values = np.empty(shape, dtype=dtype)
+        values[a, w] = a_values
+        values[b, w] = b_values
+        return values
+
+    a_pts = matchups["team_a_points"].to_numpy(dtype=float)
+    b_pts = matchups["team_b_points"].to_numpy(dtype=float)
+    a_pro = matchups["team_a_projected_points"].to_numpy(dtype=float)
+    b_pro = matchups["team_b_projected_points"].to_numpy(dtype=float)
+    pts = grid(a_pts, b_pts)
+    pro = grid(a_pro, b_pro)
+    opp_pts = grid(b_pts, a_pts)
+    opp_pro = grid(b_pro, a_pro)
+    opp = grid(b, a, dtype=int)
+    if np.isnan(pts).any():
+        return None
+
+    week_numbers = weeks[None, :]
+    win = pts > opp_pts
+    loss = pts < opp_pts
+    result = np.where(win, "W", np.where(loss, "L", "T"))
+
+    pts_rk = rank_teams(pts, ascending=False, method="first")
+    pts_win = (pts_rk <= 5).astype(int)
+
+    ttl_pts = np.cumsum(pts, axis=1).round(2)
+    ttl_pro = np.cumsum(pro, axis=1).round(2)
+    ttl_opp_pts = np.cumsum(opp_pts, axis=1).round(2)
+    ttl_opp_pro = np.cumsum(opp_pro, axis=1).round(2)
+    avg_pts = np.round(ttl_pts / week_numbers, 2)
+    avg_opp_pts = np.round(ttl_opp_pts / week_numbers, 2)
+    win_ttl = np.cumsum(win, axis=1)
+    loss_ttl = np.cumsum(loss, axis=1)
+    ttl_pts_win = np.cumsum(pts_win, axis=1)
+    two_pt = ttl_pts_win + win_ttl
+
+    names = teams.drop_duplicates("team_key").set_index("team_key").reindex(team_keys)
+    keys = pd.Series(team_keys, index=team_keys)
+    team_name = names["name"].fillna(keys).to_numpy()
+    manager = names["nickname"].fillna(keys).to_numpy()
+
+    # melt back to one row per team and week, week by week
+    team = np.tile(np.arange(shape[0]), shape[1])
+    opp_team = opp.T.ravel()
+
+    def long(values):
+        return values.T.ravel()
+
+    reg_season = pd.DataFrame(
+        {
+            "game_id": matchups["game_id"].iloc[0],
+            "Week": np.repeat(weeks, shape[0]),
+            "team_key": team_keys[team],
+            "Manager": manager[team],
+            "Team": team_name[team],
+            "2pt Ttl": long(two_pt),
+            "2pt Ttl Rk": long(rank_teams(two_pt, ascending=False)),
+            "Ttl Pts Win": long(ttl_pts_win),
+            "Ttl Pts Win Rk": long(rank_teams(ttl_pts_win, ascending=False)),
+            "Win Ttl": long(win_ttl),
+            "Loss Ttl": long(loss_ttl),
+            "W/L Rk": long(rank_teams(win_ttl, ascending=False)),
+            "Wk W/L": long(result),
+            "Wk Pts W/L": long(pts_win),
+            "Wk Pts": long(pts),
+            "Wk Pts Rk": long(pts_rk),
+            "Wk Pro. Pts": long(pro),
+            "Wk Pro. Pts Rk": long(rank_teams(pro, False, "first")),
+            "Avg Pts": long(avg_pts),
+            "Avg Pts Rk": long(rank_teams(avg_pts, ascending=False)),
+            "Avg Opp Pts": long(avg_opp_pts),
+            "Avg Opp Pts Rk": long(rank_teams(avg_opp_pts, ascending=False)),
+            "Ttl Pts": long(ttl_pts),
+            "Ttl Pts Rk": long(rank_teams(ttl_pts, ascending=False)),
+            "Ttl Opp Pts": long(ttl_opp_pts),
+            "Ttl Opp Pts Rk": long(rank_teams(ttl_opp_pts, True, "max")),
+            "Ttl Pro. Pts": long(ttl_pro),
+            "Ttl Pro. Pts Rk": long(rank_teams(ttl_pro, ascending=False)),
+            "Ttl Opp Pro. Pts": long(ttl_opp_pro),
+            "Ttl Opp Pro. Pts Rk": long(rank_teams(ttl_opp_pro, True, "max")),
+            "opp_team_key": team_keys[opp_team],
+            "Opp Manager": manager[opp_team],
+            "Opp Team": team_name[opp_team],
+            "Opp Wk Pts": long(opp_pts),
+            "Opp Wk Pts Rk": long(rank_teams(opp_pts, False, "first")),
+            "Opp Wk Pro. Pts": long(opp_pro),
+            "Opp Wk Pro. Pts Rk": long(rank_teams(opp_pro, False, "first")),
+        }
+    )
+
+    cur_rk = current_week_rank(reg_season, rules)
+    prev_rk = np.zeros(shape, dtype=int)
+    prev_rk[:, 1:] = cur_rk.reshape(shape[1], shape[0]).T[:, :-1]
+    reg_season["Cur. Wk Rk"] = cur_rk
+    reg_season["Prev. Wk Rk"] = long(prev_rk)
+    reg_season["rk_tuple"] = rank_keys(reg_season, rules)
+
+    return reg_season
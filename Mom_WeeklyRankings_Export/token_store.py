@@ -0,0 +1,95 @@
+import fcntl
+import json
+import threading
+import time
+from pathlib import Path
+
+# one lock per token file, shared by every manager in the process
+_THREAD_LOCKS = {}
+_THREAD_LOCKS_LOCK = threading.Lock()
+
+
+def _thread_lock(token_file):
+    with _THREAD_LOCKS_LOCK:
+        return _THREAD_LOCKS.setdefault(str(token_file), threading.Lock())
+
+
+class TokenManager(object):
+    """
+    Keep the Yahoo OAuth token of a YahooFantasySportsQuery fresh.
+
+    The token file under auth_dir records when the token was issued
+    (token_time), Yahoo tokens last an hour. The token is refreshed
+    refresh_margin seconds before it expires instead of waiting for a
+    token_expired error. Refreshes hold a thread lock and a file lock on
+    token_file + ".lock", and a token already refreshed by another thread
+    or process is loaded instead of being refreshed again.
+
+    yahoo_query = YahooFantasySportsQuery
+    token_file = auth_dir / "private.json"
+    """
+
+    TOKEN_LIFETIME = 3600
+
+    def __init__(self, yahoo_query, token_file, refresh_margin=120):
+        self.yahoo_query = yahoo_query
+        self.token_file = Path(token_file)
+        self.lock_file = self.token_file.with_name(self.token_file.name + ".lock")
+        self.refresh_margin = refresh_margin
+        self._lock = _thread_lock(self.token_file)
+        self._loaded_time = self._token_time()
+
+    def _token_time(self):
+        """
+        token_time in the token file, 0 if it cannot be read
+        """
+        try:
+            with open(self.token_file) as file:
+                return float(json.load(file).get("token_time", 0))
+        except (OSError, ValueError, TypeError):
+            return 0.0
+
+    def expires_at(self):
+        return self._loaded_time + self.TOKEN_LIFETIME
+
+    def needs_refresh(self):
+        return time.time() >= self.expires_at() - self.refresh_margin
+
+    def ensure_fresh(self):
+        """
+        Refresh ahead of expiry, call before every Yahoo request
+        """
+        if self.needs_refresh():
+            self.refresh()
+
+    def refresh(self, force=False):
+        """
+        Refresh the token, or load one another thread or process just refreshed.
+        force=True refreshes even if the token looks valid, e.g. after Yahoo
+        rejected it.
+        """
+        loaded = self._loaded_time
+        with self._lock, open(self.lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if self._loaded_time != loaded:
+                    # refreshed by another thread while this one waited
+                    return
+
+                on_disk = self._token_time()
+                fresh = (
+                    time.time() < on_disk + self.TOKEN_LIFETIME - self.refresh_margin
+                )
+                if on_disk > loaded and fresh and not force:
+                    # refreshed by another process, only reload it
+                    self.yahoo_query._authenticate()
+                else:
+                    oauth = getattr(self.yahoo_query, "oauth", None)
+                    if oauth is not None and hasattr(oauth, "refresh_access_token"):
+                        oauth.refresh_access_token()
+                    self.yahoo_query._authenticate()
+
+                self._loaded_time = self._token_time()
+
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -1,4 +1,6 @@
 import math
+from collections import deque
+import numpy as np
 import pandas as pd
 
 from Mom_WeeklyRankings_Export.cust_logging import log_print_tourney
@@ -53,37 +55,123 @@ def postseason_teams(
     return playoff_teams, conso_teams, toilet_teams
 
 
-def curr_playoff_picture(bracket, season_df, week, type):
+class SeasonFrame(object):
     """
-    Calculate current week playoffs if season ended on the current week.
+    season_df indexed by (team_key, Week) for the bracket functions:
+    rows are found by position in a dict and a round's fields are written
+    one column at a time instead of through two masks per match.
+    Like the masks, values are read from the first row of a (team_key, Week)
+    and written to every row of it.
+    season_df must not be re-sorted while a SeasonFrame wraps it.
     """
-    for match in bracket.get_active_matches():
-        right_comp = match.get_participants()[0].get_competitor()
-        left_comp = match.get_participants()[1].get_competitor()
-
-        right_comp_mask = (season_df["team_key"] == right_comp) & (
-            season_df["Week"] == week
-        )
-        left_comp_mask = (season_df["team_key"] == left_comp) & (
-            season_df["Week"] == week
-        )
 
-        right_team = season_df["Team"][right_comp_mask].values[0]
-        right_manager = season_df["Manager"][right_comp_mask].values[0]
+    READ_COLUMNS = ["team_key", "Team", "Manager", "Wk Pts", "Wk Pro. Pts"]
+    WRITE_COLUMNS = [
+        "opp_team_key",
+        "Opp Team",
+        "Opp Manager",
+        "Opp Wk Pts",
+        "Opp Wk Pro. Pts",
+        "Bracket",
+        "Wk W/L",
+    ]
+    TEXT_COLUMNS = ["opp_team_key", "Opp Team", "Opp Manager", "Bracket", "Wk W/L"]
+
+    def __init__(self, season_df):
+        self.df = season_df
+        for col in self.WRITE_COLUMNS:
+            if col not in season_df.columns:
+                season_df[col] = np.nan
+        for col in self.TEXT_COLUMNS:
+            if season_df[col].dtype != object:
+                season_df[col] = season_df[col].astype(object)
+
+        self.__rows = {}
+        # first row: the other rows of its (team_key, Week), only for repeats
+        self.__repeats = {}
+        keys = zip(season_df["team_key"].to_numpy(), season_df["Week"].to_numpy())
+        for row, key in enumerate(keys):
+            first = self.__rows.setdefault(key, row)
+            if first != row:
+                self.__repeats.setdefault(first, []).append(row)
+        self.__values = {col: season_df[col].to_numpy() for col in self.READ_COLUMNS}
+
+    def row(self, team, week):
+        """
+        Position of the (first) row of team in week
+        """
+        return self.__rows[(team, week)]
 
-        left_team = season_df["Team"][left_comp_mask].values[0]
-        left_manager = season_df["Manager"][left_comp_mask].values[0]
+    def take(self, col, rows):
+        """
+        Values of a read column at row positions
+        """
+        return self.__values[col][rows]
 
-        season_df.loc[right_comp_mask, "opp_team_key"] = left_comp
-        season_df.loc[right_comp_mask, "Opp Team"] = left_team
-        season_df.loc[right_comp_mask, "Opp Manager"] = left_manager
+    def assign(self, rows, values):
+        """
+        Write {column: values or scalar} to the row positions in one go,
+        and to the other rows of their (team_key, Week)
+        """
+        if len(rows) == 0:
+            return
+        repeats = [
+            (i, repeat)
+            for i, row in enumerate(rows)
+            for repeat in self.__repeats.get(row, ())
+        ]
+        if repeats:
+            source, extra = (list(pair) for pair in zip(*repeats))
+            rows = np.concatenate([rows, extra])
+            values = {
+                col: (
+                    value
+                    if np.ndim(value) == 0
+                    else np.concatenate([value, np.asarray(value)[source]])
+                )
+                for col, value in values.items()
+            }
+        for col, value in values.items():
+            self.df.iloc[rows, self.df.columns.get_loc(col)] = value
+
+
+def _season_frame(season_df):
+    if isinstance(season_df, SeasonFrame):
+        return season_df
+    return SeasonFrame(season_df)
+
+
+def _match_rows(bracket, season, week):
+    """
+    Competitors of every active match with their rows in week,
+    right then left as the participants are listed
+    """
+    matches = bracket.get_active_matches()
+    right = [match.get_participants()[0].get_competitor() for match in matches]
+    left = [match.get_participants()[1].get_competitor() for match in matches]
+    right_rows = np.array([season.row(team, week) for team in right], dtype=int)
+    left_rows = np.array([season.row(team, week) for team in left], dtype=int)
+    return matches, right, left, right_rows, left_rows
 
-        season_df.loc[left_comp_mask, "opp_team_key"] = right_comp
-        season_df.loc[left_comp_mask, "Opp Team"] = right_team
-        season_df.loc[left_comp_mask, "Opp Manager"] = right_manager
 
-        season_df.loc[right_comp_mask, "Bracket"] = type
-        season_df.loc[left_comp_mask, "Bracket"] = type
+def curr_playoff_picture(bracket, season_df, week, type):
+    """
+    Calculate current week playoffs if season ended on the current week.
+    """
+    season = _season_frame(season_df)
+    _, _, _, right_rows, left_rows = _match_rows(bracket, season, week)
+
+    rows = np.concatenate([right_rows, left_rows])
+    opp_rows = np.concatenate([left_rows, right_rows])
+    season.assign(
+        rows,
+        {
+            "opp_team_key": season.take("team_key", opp_rows),
+            "Opp Team": season.take("Team", opp_rows),
+            "Opp Manager": season.take("Manager", opp_rows),
+            "Bracket": type,
+        },
+    )
 
 
 def playoff_weeks_calc(
@@ -141,62 +229,58 @@ def playoff_weeks_calc(
 
 def competition_rounds(bracket, type, week, season_df):
     """
-    Calculate the rounds for the playoffs
+    Calculate the rounds for the playoffs,
+    returns the matches that got a winner this week
     """
-    for match in bracket.get_active_matches():
-        right_comp = match.get_participants()[0].get_competitor()
-        left_comp = match.get_participants()[1].get_competitor()
+    season = _season_frame(season_df)
+    matches, right, left, right_rows, left_rows = _match_rows(bracket, season, week)
+
+    right_scores = season.take("Wk Pts", right_rows)
+    left_scores = season.take("Wk Pts", left_rows)
+
+    rows = np.concatenate([right_rows, left_rows])
+    opp_rows = np.concatenate([left_rows, right_rows])
+    season.assign(
+        rows,
+        {
+            "opp_team_key": season.take("team_key", opp_rows),
+            "Opp Team": season.take("Team", opp_rows),
+            "Opp Manager": season.take("Manager", opp_rows),
+            "Opp Wk Pts": season.take("Wk Pts", opp_rows),
+            "Opp Wk Pro. Pts": season.take("Wk Pro. Pts", opp_rows),
+            "Bracket": f"{type}",
+        },
+    )
 
-        right_comp_mask = (season_df["team_key"] == right_comp) & (
-            season_df["Week"] == week
-        )
-        left_comp_mask = (season_df["team_key"] == left_comp) & (
-            season_df["Week"] == week
-        )
+    # ties leave the match open and Wk W/L empty
+    right_won = right_scores > left_scores
+    left_won = right_scores < left_scores
+    season.assign(
+        np.concatenate([right_rows[right_won], left_rows[left_won]]), {"Wk W/L": "W"}
+    )
+    season.assign(
+        np.concatenate([left_rows[right_won], right_rows[left_won]]), {"Wk W/L": "L"}
+    )
 
-        right_score = season_df["Wk Pts"][right_comp_mask].values[0]
-        right_pro_score = season_df["Wk Pro. Pts"][right_comp_mask].values[0]
-        right_team = season_df["Team"][right_comp_mask].values[0]
-        right_manager = season_df["Manager"][right_comp_mask].values[0]
-
-        left_score = season_df["Wk Pts"][left_comp_mask].values[0]
-        left_pro_score = season_df["Wk Pro. Pts"][left_comp_mask].values[0]
-        left_team = season_df["Team"][left_comp_mask].values[0]
-        left_manager = season_df["Manager"][left_comp_mask].values[0]
-
-        season_df.loc[right_comp_mask, "opp_team_key"] = left_comp
-        season_df.loc[right_comp_mask, "Opp Team"] = left_team
-        season_df.loc[right_comp_mask, "Opp Manager"] = left_manager
-        season_df.loc[right_comp_mask, "Opp Wk Pts"] = left_score
-        season_df.loc[right_comp_mask, "Opp Wk Pro. Pts"] = left_pro_score
-
-        season_df.loc[left_comp_mask, "opp_team_key"] = right_comp
-        season_df.loc[left_comp_mask, "Opp Team"] = right_team
-        season_df.loc[left_comp_mask, "Opp Manager"] = right_manager
-        season_df.loc[left_comp_mask, "Opp Wk Pts"] = right_score
-        season_df.loc[left_comp_mask, "Opp Wk Pro. Pts"] = right_pro_score
-
-        season_df.loc[right_comp_mask, "Bracket"] = f"{type}"
-        season_df.loc[left_comp_mask, "Bracket"] = f"{type}"
-
-        if right_score > left_score:
-            match.set_winner(right_comp)
-            season_df.loc[right_comp_mask, "Wk W/L"] = "W"
-            season_df.loc[left_comp_mask, "Wk W/L"] = "L"
-
-        elif right_score < left_score:
-            match.set_winner(left_comp)
-            season_df.loc[right_comp_mask, "Wk W/L"] = "L"
-            season_df.loc[left_comp_mask, "Wk W/L"] = "W"
+    decided = []
+    for i, match in enumerate(matches):
+        if right_won[i]:
+            match.set_winner(right[i])
+            decided.append(match)
+        elif left_won[i]:
+            match.set_winner(left[i])
+            decided.append(match)
 
         log_print_tourney(
             round_=f"{type} Week {week}",
-            right_comp=right_comp,
-            right_score=right_score,
-            left_comp=left_comp,
-            left_score=left_score,
+            right_comp=right[i],
+            right_score=right_scores[i],
+            left_comp=left[i],
+            left_score=left_scores[i],
         )
 
+    return decided
+
 
 class Participant:
     """
@@ -204,8 +288,12 @@ class Participant:
     It can be used as a placeholder until the participant is decided.
     """
 
+    __slots__ = ("competitor", "match")
+
     def __init__(self, competitor=None):
         self.competitor = competitor
+        # the Match this participant plays in, set by Match
+        self.match = None
 
     def get_competitor(self):
         """
@@ -220,6 +308,8 @@ class Participant:
         after a previous match is completed.
         """
         self.competitor = competitor
+        if self.match is not None:
+            self.match.refresh()
 
 
 class Match:
@@ -229,11 +319,25 @@ class Match:
     so they can be accessed as individual object pointers.
     """
 
+    __slots__ = (
+        "__left_participant",
+        "__right_participant",
+        "__winner",
+        "__loser",
+        "tournament",
+        "index",
+    )
+
     def __init__(self, left_participant, right_participant):
         self.__left_participant = left_participant
         self.__right_participant = right_participant
         self.__winner = Participant()
         self.__loser = Participant()
+        left_participant.match = self
+        right_participant.match = self
+        # set by the Tournament holding the match
+        self.tournament = None
+        self.index = None
 
     def set_winner(self, competitor):
         """
@@ -247,6 +351,14 @@ class Match:
             self.__loser.set_competitor(self.__left_participant.get_competitor())
         else:
             raise Exception("Invalid competitor")
+        self.refresh()
+
+    def refresh(self):
+        """
+        Let the tournament know this match's participants or winner changed
+        """
+        if self.tournament is not None:
+            self.tournament.update_match(self)
 
     def get_winner_participant(self):
         """
@@ -284,9 +396,14 @@ class Tournament:
     It takes in a list of competitors, which can be strings or any type of Python object,
     but they should be unique. They should be ordered by a seed, with the first entry being the most
     skilled and the last being the least. They can also be randomized before creating the instance.
+    Every place is played out: losers of a round play each other for the lower places.
+    The matches ready to start are kept up to date as winners are set,
+    so looking them up does not scan the bracket.
     Optional options dict fields:
     """
 
+    __slots__ = ("__matches", "__seeds", "__final", "__ready", "__competitor_matches")
+
     def __init__(self, competitors_list, options={}):
         assert len(competitors_list) > 1
         self.__matches = []
@@ -294,76 +411,83 @@ class Tournament:
             math.pow(2, math.ceil(math.log2(len(competitors_list))))
         )
         winners_number_of_byes = next_higher_power_of_two - len(competitors_list)
-        incoming_participants = list(map(Participant, competitors_list))
-        incoming_participants.extend([None] * winners_number_of_byes)
-        num_of_rounds = int(math.ceil(math.log2(len(incoming_participants))))
-
-        round_ = 1
-        while round_ <= num_of_rounds:
-            if round_ == 1:
-                half_length = int(len(incoming_participants) / 2)
-                first = incoming_participants[0:half_length]
-                last = incoming_participants[half_length:]
-                last.reverse()
-                round_1_winners = []
-                round_1_losers = []
-                for participant_pair in zip(first, last):
-                    if participant_pair[1] is None:
-                        round_1_winners.append(participant_pair[0])
-                    elif participant_pair[0] is None:
-                        round_1_winners.append(participant_pair[1])
-                    else:
-                        match = Match(participant_pair[0], participant_pair[1])
-                        round_1_winners.append(match.get_winner_participant())
-                        round_1_losers.append(match.get_loser_participant())
-                        self.__matches.append(match)
-                next_round = [round_1_winners, round_1_losers]
-                round_ += 1
-
-            elif round_ > 1:
-                while True:
-                    if len(next_round[0]) > 1:
-                        bracket = next_round[0]
-                        half_length = int(len(bracket) / 2)
-                        first = bracket[0:half_length]
-                        last = bracket[half_length:]
-                        last.reverse()
-                        next_round_winners = []
-                        next_round_losers = []
-                        for participant_pair in zip(first, last):
-                            if participant_pair[1] is None:
-                                next_round_winners.append(participant_pair[0])
-                            elif participant_pair[0] is None:
-                                next_round_winners.append(participant_pair[1])
-                            else:
-                                match = Match(participant_pair[0], participant_pair[1])
-                                next_round_winners.append(
-                                    match.get_winner_participant()
-                                )
-                                next_round_losers.append(match.get_loser_participant())
-                                self.__matches.append(match)
-
-                        if winners_number_of_byes > 0 and len(next_round[0]) > len(
-                            next_round[1]
-                        ):
-                            next_round.insert(0, next_round_losers)
-                            next_round.insert(0, next_round_winners)
-                            winners_number_of_byes = 0
-                        else:
-                            next_round.append(next_round_winners)
-                            next_round.append(next_round_losers)
-
-                        try:
-                            next_round.remove(bracket)
-                        except:
-                            continue
-
-                        next_round = [ele for ele in next_round if ele != []]
-                        if len(next_round) == len(competitors_list):
-                            break
-                    round_ += 1
-
-        self.__final = next_round
+        self.__seeds = list(map(Participant, competitors_list))
+
+        # round 1 seeds the top half against the reversed bottom half,
+        # the byes (None) falling to the top seeds
+        winners, losers = self.__pair(self.__seeds + [None] * winners_number_of_byes)
+        brackets = deque([winners, losers])
+
+        # every later group of participants with the same record is paired
+        # the same way until each place is down to one participant. The
+        # round after the byes is played first so they catch up.
+        while len(brackets) < len(competitors_list):
+            bracket = brackets.popleft()
+            if len(bracket) < 2:
+                brackets.append(bracket)
+                if all(len(group) < 2 for group in brackets):
+                    # an odd group drops its middle participant
+                    raise Exception(
+                        f"Can not place {len(competitors_list)} competitors"
+                    )
+                continue
+
+            winners, losers = self.__pair(bracket)
+            if winners_number_of_byes > 0 and len(bracket) > len(brackets[0]):
+                brackets.extendleft([group for group in [losers, winners] if group])
+                winners_number_of_byes = 0
+            else:
+                brackets.extend([group for group in [winners, losers] if group])
+
+        self.__final = list(brackets)
+
+        # match index -> its competitors, for the matches ready to start
+        self.__ready = {}
+        self.__competitor_matches = {}
+        for index, match in enumerate(self.__matches):
+            match.tournament = self
+            match.index = index
+            self.update_match(match)
+
+    def __pair(self, bracket):
+        """
+        Play the first half of bracket against its reversed second half,
+        returns the winner and loser participants of the new matches
+        """
+        half_length = int(len(bracket) / 2)
+        first = bracket[0:half_length]
+        last = bracket[half_length:]
+        last.reverse()
+        winners = []
+        losers = []
+        for participant_pair in zip(first, last):
+            if participant_pair[1] is None:
+                winners.append(participant_pair[0])
+            elif participant_pair[0] is None:
+                winners.append(participant_pair[1])
+            else:
+                match = Match(participant_pair[0], participant_pair[1])
+                winners.append(match.get_winner_participant())
+                losers.append(match.get_loser_participant())
+                self.__matches.append(match)
+        return winners, losers
+
+    def update_match(self, match):
+        """
+        Add or drop match from the ready matches after its participants
+        or winner changed.
+        """
+        index = match.index
+        for competitor in self.__ready.pop(index, ()):
+            self.__competitor_matches[competitor].discard(index)
+
+        if match.is_ready_to_start():
+            competitors = [
+                participant.get_competitor() for participant in match.get_participants()
+            ]
+            self.__ready[index] = competitors
+            for competitor in competitors:
+                self.__competitor_matches.setdefault(competitor, set()).add(index)
 
     def __iter__(self):
         return iter(self.__matches)
@@ -372,7 +496,7 @@ class Tournament:
         """
         Returns a list of all matches that are ready to be played.
         """
-        return [match for match in self.get_matches() if match.is_ready_to_start()]
+        return [self.__matches[index] for index in sorted(self.__ready)]
 
     def get_matches(self):
         """
@@ -386,21 +510,17 @@ class Tournament:
         when creating the tournament instance,
         returns a list of Matches that they are currently playing in.
         """
-        matches = []
-        for match in self.get_active_matches():
-            competitors = [
-                participant.get_competitor() for participant in match.get_participants()
-            ]
-            if competitor in competitors:
-                matches.append(match)
-        return matches
+        return [
+            self.__matches[index]
+            for index in sorted(self.__competitor_matches.get(competitor, ()))
+        ]
 
     def get_final(self):
         """
         Returns None if the winner has not been decided yet,
         and returns a list containing the single victor otherwise.
         """
-        if len(self.get_active_matches()) > 0:
+        if len(self.__ready) > 0:
             return None
 
         final_dict = {}
@@ -409,6 +529,29 @@ class Tournament:
 
         return final_dict
 
+    def get_structure(self):
+        """
+        How the bracket is wired, so it can be replayed without Participants.
+        Returns (matches, final): one (left, right) pair per match in the
+        order get_matches returns them, and the source of each final place.
+        A source is ("seed", i) for the i-th competitor (0 based),
+        ("winner", m) or ("loser", m) for the m-th match.
+        """
+        sources = {
+            id(participant): ("seed", seed)
+            for seed, participant in enumerate(self.__seeds)
+        }
+        for m, match in enumerate(self.__matches):
+            sources[id(match.get_winner_participant())] = ("winner", m)
+            sources[id(match.get_loser_participant())] = ("loser", m)
+
+        matches = [
+            tuple(sources[id(participant)] for participant in match.get_participants())
+            for match in self.__matches
+        ]
+        final = [sources[id(place[0])] for place in self.__final]
+        return matches, final
+
     def add_win(self, match, competitor):
         """
         Set the victor of a match, given the competitor string/object and match.
@@ -6,6 +6,7 @@ import calendar
 
 from Mom_WeeklyRankings_Export.db_upload import DatabaseCursor
 from Mom_WeeklyRankings_Export.tournament import (
+    SeasonFrame,
     Tournament,
     curr_playoff_picture,
     competition_rounds,
@@ -13,6 +14,14 @@ from Mom_WeeklyRankings_Export.tournament import (
     playoff_weeks_calc,
 )
 from Mom_WeeklyRankings_Export.cust_logging import log_print, log_print_tourney
+from Mom_WeeklyRankings_Export.metrics import timed
+from Mom_WeeklyRankings_Export.ranking import (
+    current_week_rank,
+    load_rules,
+    rank_keys,
+)
+from Mom_WeeklyRankings_Export.schema import SCHEMAS, coerce
+from Mom_WeeklyRankings_Export.season_matrix import season_matrix
 
 # PATH = list(Path().cwd().glob("**/private.yaml"))
 # if PATH == []:
@@ -27,6 +36,27 @@ from Mom_WeeklyRankings_Export.cust_logging import log_print, log_print_tourney
 #     TEAMS_FILE = TEAMS_FILE[0]
 
 
+RULES_FILE = "ranking_rules.yaml"
+
+# running totals reg_season carries from week to week, with their rounding
+# (None = whole numbers)
+SEASON_TOTALS = {
+    "Ttl Pts": 2,
+    "Ttl Pro. Pts": 2,
+    "Ttl Opp Pts": 2,
+    "Ttl Opp Pro. Pts": 2,
+    "Win Ttl": None,
+    "Loss Ttl": None,
+    "Ttl Pts Win": None,
+}
+
+# dtypes and date columns for pd.read_csv when reading each table back
+READ_SCHEMAS = {
+    table: SCHEMAS[table].read_kwargs()
+    for table in ["raw.matchups", "raw.weekly_team_pts", "prod.nfl_weeks"]
+}
+
+
 def get_laborday(date):
     """
     Calculates when Labor day is of the given year
@@ -44,21 +74,23 @@ def get_laborday(date):
         return cal[1][0], cal[1][0].year
 
 
+@timed("stage.nfl_weeks_pull")
 def nfl_weeks_pull(private_file):
     """
     Function to call assests files for Yahoo API Query
     """
     try:
         db_cursor = DatabaseCursor(private_file)
-        nfl_weeks = db_cursor.copy_from_psql("SELECT DISTINCT * FROM prod.nfl_weeks")
-        nfl_weeks["week_end"] = nfl_weeks["week_end"].astype("datetime64[D]")
-        nfl_weeks["week_start"] = nfl_weeks["week_start"].astype("datetime64[D]")
+        nfl_weeks = db_cursor.copy_from_psql(
+            "SELECT DISTINCT * FROM prod.nfl_weeks", **READ_SCHEMAS["prod.nfl_weeks"]
+        )
         return nfl_weeks
 
     except Exception as e:
         log_print(error=e, module_="utils.py", func="nfl_weeks_pull")
 
 
+@timed("stage.game_keys_pull")
 def game_keys_pull(private_file, teams_file):
     """
     Function to call game_keys
@@ -86,13 +118,34 @@ def game_keys_pull(private_file, teams_file):
         )
 
 
-def data_upload(df: pd.DataFrame, table_name, path, query):
+@timed("stage.data_upload")
+def data_upload(df: pd.DataFrame, table_name, path, query=None, upsert=False):
+    """
+    Write df to table_name.
+
+    upsert=False: read everything the query returns back from the table,
+    add df to it and rewrite the whole table.
+    upsert=True: replace the stored rows of df's slice of the table (the
+    schema's replaces columns) and merge df on the natural key from the
+    schema registry. Needs the key index from migrate.
+    """
 
     try:
-        psql = DatabaseCursor(path).copy_from_psql(query)
+        schema = SCHEMAS[table_name]
+        schema.validate(df)
+        db_cursor = DatabaseCursor(path)
+        if schema.create:
+            keys = schema.key if schema.replaces else None
+            db_cursor.create_table(table_name, schema.pg_columns(), keys)
+        if upsert:
+            df = df.drop_duplicates(subset=schema.key, keep="last")
+            db_cursor.upsert_to_psql(df, table_name, schema.key, schema.replaces)
+            return
+
+        psql = db_cursor.copy_from_psql(query)
         df = pd.concat([psql, df])
         df.drop_duplicates(inplace=True)
-        DatabaseCursor(path).copy_to_psql(df=df, table=table_name)
+        db_cursor.copy_to_psql(df=df, table=table_name)
 
     except Exception as e:
         log_print(
@@ -103,11 +156,244 @@ def data_upload(df: pd.DataFrame, table_name, path, query):
             query=query,
             path=path,
         )
+        raise
+
+
+def migrate(private_file):
+    """
+    One off database setup: create the tables the pipeline adds itself and
+    the natural key indexes of the upserted tables (the ones with replaces
+    columns in the schema registry). Every table is tried, then
+    RuntimeError names the ones that failed (duplicate keys are logged).
+    """
+    failed = []
+    for table_name, schema in SCHEMAS.items():
+        db_cursor = DatabaseCursor(private_file)
+        keys = schema.key if schema.replaces else None
+        if schema.create and not db_cursor.create_table(
+            table_name, schema.pg_columns(), keys
+        ):
+            failed.append(table_name)
+            continue
+        if not keys:
+            continue
+        try:
+            db_cursor.create_key_index(table_name, schema.key)
+        except Exception:
+            failed.append(table_name)
+
+    if failed:
+        raise RuntimeError(f"migrate failed for {failed}, see the log")
+
+
+@timed("stage.reg_season_frame")
+def _reg_season_frame(
+    matchups, teams, game_id, playoff_start_week, rules, week=None, previous=None
+):
+    """
+    Regular season rows of every team and week with pandas, matchups are
+    mirrored so each team has its own row every week.
+    week/previous = only week's matchups are given, running totals and
+    Prev. Wk Rk build on previous (the stored week - 1 rows by team_key)
+    """
+    matchups_a = matchups.copy()
+    matchups_b = matchups.copy()
+
+    matchups_b_cols = list(matchups_b.columns)
+
+    rename_columns = {}
+    for col in matchups_b_cols:
+        if "team_a" in col:
+            rename_columns[col] = f"team_b{col[6:]}"
+        elif "team_b" in col:
+            rename_columns[col] = f"team_a{col[6:]}"
+
+    matchups_b.rename(columns=rename_columns, inplace=True)
+
+    matchups = pd.concat([matchups_a, matchups_b])
+
+    matchups.sort_values(["week_start", "team_a_team_key"], inplace=True)
+
+    matchups.reset_index(drop=True, inplace=True)
+
+    reg_season = matchups[
+        (matchups["game_id"] == game_id) & (matchups["week"] < playoff_start_week)
+    ].copy(deep=True)
+
+    del matchups, matchups_a, matchups_b, matchups_b_cols, rename_columns
+
+    reg_season.loc[
+        (reg_season["team_a_points"] > reg_season["team_b_points"]), ["Wk W/L"]
+    ] = "W"
+    reg_season.loc[
+        (reg_season["team_a_points"] < reg_season["team_b_points"]), ["Wk W/L"]
+    ] = "L"
+    reg_season.loc[
+        (reg_season["team_a_points"] == reg_season["team_b_points"]), ["Wk W/L"]
+    ] = "T"
+
+    reg_season["Wk Pts Rk"] = (
+        reg_season.groupby(["week", "game_id"])["team_a_points"]
+        .rank("first", ascending=False)
+        .astype(int)
+    )
+    reg_season["Wk Pro. Pts Rk"] = (
+        reg_season.groupby(["week", "game_id"])["team_a_projected_points"]
+        .rank("first", ascending=False)
+        .astype(int)
+    )
+
+    reg_season.loc[(reg_season["Wk Pts Rk"] <= 5), ["Wk Pts W/L"]] = 1
+    reg_season.loc[(reg_season["Wk Pts Rk"] > 5), ["Wk Pts W/L"]] = 0
+    reg_season["Wk Pts W/L"] = reg_season["Wk Pts W/L"].astype(int)
+
+    reg_season["Opp Wk Pts Rk"] = (
+        reg_season.groupby(["week", "game_id"])["team_b_points"]
+        .rank("first", ascending=False)
+        .astype(int)
+    )
+    reg_season["Opp Wk Pro. Pts Rk"] = (
+        reg_season.groupby(["week", "game_id"])["team_b_projected_points"]
+        .rank("first", ascending=False)
+        .astype(int)
+    )
+
+    reg_season = reg_season.merge(
+        teams, how="left", left_on="team_a_team_key", right_on="team_key"
+    )
+    reg_season["team_a_name"] = reg_season["name"].fillna(reg_season["team_a_team_key"])
+    reg_season["team_a_nickname"] = reg_season["nickname"].fillna(
+        reg_season["team_a_team_key"]
+    )
+    reg_season["game_id_a"] = reg_season["game_id_x"].fillna(reg_season["game_id_y"])
+    reg_season.drop(["name", "nickname"], axis=1, inplace=True)
+
+    reg_season = reg_season.merge(
+        teams, how="left", left_on="team_b_team_key", right_on="team_key"
+    )
+    reg_season["team_b_name"] = reg_season["name"].fillna(reg_season["team_b_team_key"])
+    reg_season["team_b_nickname"] = reg_season["nickname"].fillna(
+        reg_season["team_b_team_key"]
+    )
+    reg_season.drop(["name", "nickname"], axis=1, inplace=True)
+
+    reg_season["game_id"] = reg_season["game_id_a"]
+
+    reg_season = reg_season.rename(
+        columns={
+            "team_a_team_key": "team_key",
+            "team_a_name": "Team",
+            "team_a_nickname": "Manager",
+            "team_a_points": "Wk Pts",
+            "team_a_projected_points": "Wk Pro. Pts",
+            "team_b_team_key": "opp_team_key",
+            "team_b_name": "Opp Team",
+            "team_b_nickname": "Opp Manager",
+            "team_b_points": "Opp Wk Pts",
+            "team_b_projected_points": "Opp Wk Pro. Pts",
+            "week": "Week",
+        }
+    )
+
+    # running totals per team: summed over the season, or the previous
+    # week's stored totals plus this week when only one week is rebuilt
+    weekly = {
+        "Ttl Pts": reg_season["Wk Pts"],
+        "Ttl Pro. Pts": reg_season["Wk Pro. Pts"],
+        "Ttl Opp Pts": reg_season["Opp Wk Pts"],
+        "Ttl Opp Pro. Pts": reg_season["Opp Wk Pro. Pts"],
+        "Win Ttl": reg_season["Wk W/L"].eq("W"),
+        "Loss Ttl": reg_season["Wk W/L"].eq("L"),
+        "Ttl Pts Win": reg_season["Wk Pts W/L"],
+    }
+    for col, values in weekly.items():
+        if week is None:
+            total = values.groupby(reg_season["team_key"]).cumsum()
+        else:
+            total = values + reg_season["team_key"].map(previous[col]).fillna(0)
+        decimals = SEASON_TOTALS[col]
+        reg_season[col] = (
+            total.astype(float).round(decimals=decimals)
+            if decimals is not None
+            else total.astype(int)
+        )
+
+    reg_season["Ttl Pts Rk"] = (
+        reg_season.groupby(["Week"])["Ttl Pts"]
+        .rank(method="min", ascending=False)
+        .astype(int)
+    )
+    reg_season["Avg Pts"] = round(reg_season["Ttl Pts"] / reg_season["Week"], 2)
+    reg_season["Avg Pts Rk"] = (
+        reg_season.groupby(["Week"])["Avg Pts"]
+        .rank(method="min", ascending=False)
+        .astype(int)
+    )
+    reg_season["Ttl Pro. Pts Rk"] = (
+        reg_season.groupby(["Week"])["Ttl Pro. Pts"]
+        .rank(method="min", ascending=False)
+        .astype(int)
+    )
+    reg_season["Ttl Opp Pts Rk"] = (
+        reg_season.groupby(["Week"])["Ttl Opp Pts"]
+        .rank(method="max", ascending=True)
+        .astype(int)
+    )
+    reg_season["Avg Opp Pts"] = round(reg_season["Ttl Opp Pts"] / reg_season["Week"], 2)
+    reg_season["Avg Opp Pts Rk"] = (
+        reg_season.groupby(["Week"])["Avg Opp Pts"]
+        .rank(method="min", ascending=False)
+        .astype(int)
+    )
+    reg_season["Ttl Opp Pro. Pts Rk"] = (
+        reg_season.groupby(["Week"])["Ttl Opp Pro. Pts"]
+        .rank(method="max", ascending=True)
+        .astype(int)
+    )
+    reg_season["W/L Rk"] = (
+        reg_season.groupby(["Week"])["Win Ttl"]
+        .rank(method="min", ascending=False)
+        .astype(int)
+    )
+    reg_season["Ttl Pts Win Rk"] = (
+        reg_season.groupby(["Week"])["Ttl Pts Win"]
+        .rank(method="min", ascending=False)
+        .astype(int)
+    )
+    reg_season["2pt Ttl"] = reg_season["Ttl Pts Win"] + reg_season["Win Ttl"]
+    reg_season["2pt Ttl Rk"] = (
+        reg_season.groupby(["Week"])["2pt Ttl"]
+        .rank(method="min", ascending=False)
+        .astype(int)
+    )
+
+    reg_season["Cur. Wk Rk"] = current_week_rank(reg_season, rules)
+    reg_season["rk_tuple"] = rank_keys(reg_season, rules)
+    if week is None:
+        reg_season["Prev. Wk Rk"] = (
+            reg_season.sort_values(["Week"])
+            .groupby(["team_key"])["Cur. Wk Rk"]
+            .shift(fill_value=0)
+            .astype(int)
+        )
+    else:
+        reg_season["Prev. Wk Rk"] = (
+            reg_season["team_key"].map(previous["Cur. Wk Rk"]).fillna(0).astype(int)
+        )
 
+    return reg_season
 
-def reg_season(game_id, private_file):
+
+@timed("stage.reg_season")
+def reg_season(game_id, private_file, rules_file=None, week=None, engine="pandas"):
     """
-    Fucntion to calculate regular season rankings, scores, wins/losses, and matchups
+    Fucntion to calculate regular season rankings, scores, wins/losses, and matchups.
+    Cur. Wk Rk tie-breaks come from rules_file, ranking_rules.yaml next to
+    private_file by default.
+    week = only rebuild that week on top of the previous week's stored
+    totals and upsert just its rows, None rebuilds the whole season
+    engine = "numpy" rebuilds the whole season on teams x weeks arrays
+    (season_matrix), "pandas" or a week uses the long mirrored table
     """
     try:
         matchups_query = f"SELECT DISTINCT game_id, \
@@ -127,298 +413,59 @@ FROM raw.matchups \
 WHERE game_id = {str(game_id)}"
         teams_query = f"SELECT DISTINCT * FROM raw.teams WHERE game_id = {str(game_id)}"
         settings_query = f"SELECT DISTINCT playoff_start_week, game_id FROM prod.settings WHERE game_id = {str(game_id)}"
-        matchups = (
-            DatabaseCursor(private_file)
-            .copy_from_psql(matchups_query)
-            .drop_duplicates()
-        )
-
-        teams = (
-            DatabaseCursor(private_file).copy_from_psql(teams_query).drop_duplicates()
-        )
-
-        settings = (
-            DatabaseCursor(private_file)
-            .copy_from_psql(settings_query)
-            .drop_duplicates()
-        )
-
-        matchups_a = matchups.copy()
-        matchups_b = matchups.copy()
-
-        matchups_b_cols = list(matchups_b.columns)
-
-        rename_columns = {}
-        for col in matchups_b_cols:
-            if "team_a" in col:
-                rename_columns[col] = f"team_b{col[6:]}"
-            elif "team_b" in col:
-                rename_columns[col] = f"team_a{col[6:]}"
-
-        matchups_b.rename(columns=rename_columns, inplace=True)
-
-        matchups = pd.concat([matchups_a, matchups_b])
-
-        matchups.sort_values(["week_start", "team_a_team_key"], inplace=True)
-
-        matchups.reset_index(drop=True, inplace=True)
+        db_cursor = DatabaseCursor(private_file)
+        settings = db_cursor.copy_from_psql(settings_query).drop_duplicates()
 
         # logic to help create playoff brackets
         playoff_start_week = settings["playoff_start_week"][
             settings["game_id"] == game_id
         ].values[0]
 
-        reg_season = matchups[
-            (matchups["game_id"] == game_id) & (matchups["week"] < playoff_start_week)
-        ].copy(deep=True)
-
-        del matchups, matchups_a, matchups_b, matchups_b_cols, rename_columns, settings
-
-        reg_season.loc[
-            (reg_season["team_a_points"] > reg_season["team_b_points"]), ["Wk W/L"]
-        ] = "W"
-        reg_season.loc[
-            (reg_season["team_a_points"] < reg_season["team_b_points"]), ["Wk W/L"]
-        ] = "L"
-        reg_season.loc[
-            (reg_season["team_a_points"] == reg_season["team_b_points"]), ["Wk W/L"]
-        ] = "T"
-
-        reg_season["Wk Pts Rk"] = (
-            reg_season.groupby(["week", "game_id"])["team_a_points"]
-            .rank("first", ascending=False)
-            .astype(int)
-        )
-        reg_season["Wk Pro. Pts Rk"] = (
-            reg_season.groupby(["week", "game_id"])["team_a_projected_points"]
-            .rank("first", ascending=False)
-            .astype(int)
-        )
-
-        reg_season.loc[(reg_season["Wk Pts Rk"] <= 5), ["Wk Pts W/L"]] = 1
-        reg_season.loc[(reg_season["Wk Pts Rk"] > 5), ["Wk Pts W/L"]] = 0
-        reg_season["Wk Pts W/L"] = reg_season["Wk Pts W/L"].astype(int)
-
-        reg_season["Opp Wk Pts Rk"] = (
-            reg_season.groupby(["week", "game_id"])["team_b_points"]
-            .rank("first", ascending=False)
-            .astype(int)
-        )
-        reg_season["Opp Wk Pro. Pts Rk"] = (
-            reg_season.groupby(["week", "game_id"])["team_b_projected_points"]
-            .rank("first", ascending=False)
-            .astype(int)
-        )
-
-        reg_season = reg_season.merge(
-            teams, how="left", left_on="team_a_team_key", right_on="team_key"
-        )
-        reg_season["team_a_name"] = reg_season["name"].fillna(
-            reg_season["team_a_team_key"]
-        )
-        reg_season["team_a_nickname"] = reg_season["nickname"].fillna(
-            reg_season["team_a_team_key"]
-        )
-        reg_season["game_id_a"] = reg_season["game_id_x"].fillna(
-            reg_season["game_id_y"]
-        )
-        reg_season.drop(["name", "nickname"], axis=1, inplace=True)
-
-        reg_season = reg_season.merge(
-            teams, how="left", left_on="team_b_team_key", right_on="team_key"
-        )
-        reg_season["team_b_name"] = reg_season["name"].fillna(
-            reg_season["team_b_team_key"]
-        )
-        reg_season["team_b_nickname"] = reg_season["nickname"].fillna(
-            reg_season["team_b_team_key"]
-        )
-        reg_season.drop(["name", "nickname"], axis=1, inplace=True)
-
-        reg_season["game_id"] = reg_season["game_id_a"]
-
-        reg_season = reg_season.rename(
-            columns={
-                "team_a_team_key": "team_key",
-                "team_a_name": "Team",
-                "team_a_nickname": "Manager",
-                "team_a_points": "Wk Pts",
-                "team_a_projected_points": "Wk Pro. Pts",
-                "team_b_team_key": "opp_team_key",
-                "team_b_name": "Opp Team",
-                "team_b_nickname": "Opp Manager",
-                "team_b_points": "Opp Wk Pts",
-                "team_b_projected_points": "Opp Wk Pro. Pts",
-                "week": "Week",
-            }
-        )
-
-        reg_season["Ttl Pts"] = (
-            reg_season.groupby(["team_key"])["Wk Pts"]
-            .cumsum()
-            .astype(float)
-            .round(decimals=2)
-        )
-        reg_season["Ttl Pts Rk"] = (
-            reg_season.groupby(["Week"])["Ttl Pts"]
-            .rank(method="min", ascending=False)
-            .astype(int)
-        )
-        reg_season["Avg Pts"] = round(reg_season["Ttl Pts"] / reg_season["Week"], 2)
-        reg_season["Avg Pts Rk"] = (
-            reg_season.groupby(["Week"])["Avg Pts"]
-            .rank(method="min", ascending=False)
-            .astype(int)
-        )
-
-        reg_season["Ttl Pro. Pts"] = (
-            reg_season.groupby(["team_key"])["Wk Pro. Pts"]
-            .cumsum()
-            .astype(float)
-            .round(decimals=2)
-        )
-        reg_season["Ttl Pro. Pts Rk"] = (
-            reg_season.groupby(["Week"])["Ttl Pro. Pts"]
-            .rank(method="min", ascending=False)
-            .astype(int)
-        )
-
-        reg_season["Ttl Opp Pts"] = (
-            reg_season.groupby(["team_key"])["Opp Wk Pts"]
-            .cumsum()
-            .astype(float)
-            .round(decimals=2)
-        )
-        reg_season["Ttl Opp Pts Rk"] = (
-            reg_season.groupby(["Week"])["Ttl Opp Pts"]
-            .rank(method="max", ascending=True)
-            .astype(int)
-        )
-        reg_season["Avg Opp Pts"] = round(
-            reg_season["Ttl Opp Pts"] / reg_season["Week"], 2
-        )
-        reg_season["Avg Opp Pts Rk"] = (
-            reg_season.groupby(["Week"])["Avg Opp Pts"]
-            .rank(method="min", ascending=False)
-            .astype(int)
-        )
-
-        reg_season["Ttl Opp Pro. Pts"] = (
-            reg_season.groupby(["team_key"])["Opp Wk Pro. Pts"]
-            .cumsum()
-            .astype(float)
-            .round(decimals=2)
-        )
-        reg_season["Ttl Opp Pro. Pts Rk"] = (
-            reg_season.groupby(["Week"])["Ttl Opp Pro. Pts"]
-            .rank(method="max", ascending=True)
-            .astype(int)
-        )
-
-        reg_season["Win Ttl"] = (
-            reg_season["Wk W/L"]
-            .eq("W")
-            .groupby(reg_season["team_key"])
-            .cumsum()
-            .astype(int)
-        )
-        reg_season["Loss Ttl"] = (
-            reg_season["Wk W/L"]
-            .eq("L")
-            .groupby(reg_season["team_key"])
-            .cumsum()
-            .astype(int)
-        )
-        reg_season["W/L Rk"] = (
-            reg_season.groupby(["Week"])["Win Ttl"]
-            .rank(method="min", ascending=False)
-            .astype(int)
-        )
-
-        reg_season["Ttl Pts Win"] = (
-            reg_season.groupby(["team_key"])["Wk Pts W/L"].cumsum().astype(int)
-        )
-        reg_season["Ttl Pts Win Rk"] = (
-            reg_season.groupby(["Week"])["Ttl Pts Win"]
-            .rank(method="min", ascending=False)
-            .astype(int)
-        )
-        reg_season["2pt Ttl"] = reg_season["Ttl Pts Win"] + reg_season["Win Ttl"]
-        reg_season["2pt Ttl Rk"] = (
-            reg_season.groupby(["Week"])["2pt Ttl"]
-            .rank(method="min", ascending=False)
-            .astype(int)
-        )
-
-        if game_id >= 390:
-            reg_season["rk_tuple"] = reg_season[["2pt Ttl Rk", "Ttl Pts Rk"]].apply(
-                tuple, axis=1
-            )
+        previous = pd.DataFrame(columns=["team_key", "Cur. Wk Rk", *SEASON_TOTALS])
+        if week is not None and int(week) >= 1:
+            # playoff weeks do not change the regular season, redo its last week
+            week = min(int(week), int(playoff_start_week) - 1)
+            previous_query = f'SELECT * FROM prod.reg_season_results \
+WHERE game_id = {str(game_id)} AND "Week" = {str(week - 1)}'
+            stored = db_cursor.copy_from_psql(previous_query).drop_duplicates()
+            if not stored.empty:
+                previous = stored
+            elif week > 1:
+                # nothing stored to build on, rebuild the whole season
+                week = None
         else:
-            reg_season["rk_tuple"] = reg_season[["W/L Rk", "Ttl Pts Rk"]].apply(
-                tuple, axis=1
+            week = None
+        if week is not None:
+            matchups_query = f"{matchups_query} AND week = {str(week)}"
+        previous = previous.set_index("team_key")
+
+        matchups = db_cursor.copy_from_psql(matchups_query).drop_duplicates()
+        teams = db_cursor.copy_from_psql(teams_query).drop_duplicates()
+
+        rules = load_rules(rules_file or Path(private_file).parent / RULES_FILE)
+
+        reg_season = None
+        if engine == "numpy" and week is None:
+            reg_season = season_matrix(
+                matchups[
+                    (matchups["game_id"] == game_id)
+                    & (matchups["week"] < playoff_start_week)
+                ],
+                teams,
+                rules,
+            )
+        if reg_season is None:
+            reg_season = _reg_season_frame(
+                matchups, teams, game_id, playoff_start_week, rules, week, previous
             )
 
-        reg_season["Cur. Wk Rk"] = (
-            reg_season.groupby(["Week"])["rk_tuple"]
-            .rank(method="min", ascending=True)
-            .astype(int)
-        )
-        reg_season["Prev. Wk Rk"] = (
-            reg_season.sort_values(["Week"])
-            .groupby(["team_key"])["Cur. Wk Rk"]
-            .shift(fill_value=0)
-            .astype(int)
-        )
+        del matchups, settings
 
         reg_season.sort_values(
             ["Week", "Cur. Wk Rk"], ascending=[True, True], inplace=True
         )
 
-        reg_season_final = reg_season[
-            [
-                "game_id",
-                "Week",
-                "team_key",
-                "Cur. Wk Rk",
-                "Prev. Wk Rk",
-                "Manager",
-                "Team",
-                "2pt Ttl",
-                "2pt Ttl Rk",
-                "Ttl Pts Win",
-                "Ttl Pts Win Rk",
-                "Win Ttl",
-                "Loss Ttl",
-                "W/L Rk",
-                "Wk W/L",
-                "Wk Pts W/L",
-                "Wk Pts",
-                "Wk Pts Rk",
-                "Wk Pro. Pts",
-                "Wk Pro. Pts Rk",
-                "Avg Pts",
-                "Avg Pts Rk",
-                "Avg Opp Pts",
-                "Avg Opp Pts Rk",
-                "Ttl Pts",
-                "Ttl Pts Rk",
-                "Ttl Opp Pts",
-                "Ttl Opp Pts Rk",
-                "Ttl Pro. Pts",
-                "Ttl Pro. Pts Rk",
-                "Ttl Opp Pro. Pts",
-                "Ttl Opp Pro. Pts Rk",
-                "opp_team_key",
-                "Opp Manager",
-                "Opp Team",
-                "Opp Wk Pts",
-                "Opp Wk Pts Rk",
-                "Opp Wk Pro. Pts",
-                "Opp Wk Pro. Pts Rk",
-                "rk_tuple",
-            ]
-        ].copy(deep=True)
+        reg_season_final = coerce(reg_season, "prod.reg_season_results")
 
         del reg_season
 
@@ -436,39 +483,22 @@ WHERE game_id = {str(game_id)}"
             teams["name"] = teams["Team"]
             teams["team_standings.rank"] = teams["Cur. Wk Rk"]
             teams["team_standings.playoff_seed"] = teams["Cur. Wk Rk"]
-            teams = teams[
-                [
-                    "game_id",
-                    "league_id",
-                    "team_id",
-                    "team_key",
-                    "manager_id",
-                    "clinched_playoffs",
-                    "draft_grade",
-                    "faab_balance",
-                    "name",
-                    "nickname",
-                    "number_of_moves",
-                    "number_of_trades",
-                    "team_standings.playoff_seed",
-                    "team_standings.rank",
-                    "team_standings.outcome_totals.wins",
-                    "team_standings.outcome_totals.losses",
-                    "team_standings.outcome_totals.ties",
-                    "team_standings.outcome_totals.percentage",
-                    "team_standings.points_for",
-                    "team_standings.points_against",
-                ]
-            ]
+            teams = coerce(teams, "raw.teams")
 
             query_1 = f"SELECT * FROM raw.teams WHERE game_id != {str(game_id)}"
 
-            data_upload(teams, "raw.teams", private_file, query_1)
+            data_upload(teams, "raw.teams", private_file, query_1, upsert=True)
 
         query_2 = (
             f"SELECT * FROM prod.reg_season_results WHERE game_id != {str(game_id)}"
         )
-        data_upload(reg_season_final, "prod.reg_season_results", private_file, query_2)
+        data_upload(
+            reg_season_final,
+            "prod.reg_season_results",
+            private_file,
+            query_2,
+            upsert=True,
+        )
 
         return reg_season_final
 
@@ -480,11 +510,86 @@ WHERE game_id = {str(game_id)}"
             table="prod.reg_season_results",
             game_id=game_id,
         )
+        raise
 
 
+def _resume_brackets(db_cursor, game_id, brackets, playoff_start_week, current_week):
+    """
+    Set the winners of the playoff weeks before current_week from
+    prod.bracket_state instead of playing those weeks again.
+
+    brackets = {Bracket: (Tournament, seeded team_keys)}
+    Returns the stored prod.playoff_board rows of those weeks and
+    {(Bracket, match index): week resolved}, or None, {} without touching
+    the brackets when there is no usable state: nothing stored, seeds
+    changed, or the last run did not reach the week before current_week.
+    """
+    if current_week <= playoff_start_week:
+        return None, {}
+
+    db_cursor.create_table(
+        "prod.bracket_state", SCHEMAS["prod.bracket_state"].pg_columns()
+    )
+    state = db_cursor.copy_from_psql(
+        f'SELECT * FROM prod.bracket_state WHERE game_id = {str(game_id)} \
+AND "Week" < {str(current_week)}'
+    )
+    if state is None or state.empty or state["Week"].max() != current_week - 1:
+        return None, {}
+
+    board = db_cursor.copy_from_psql(
+        f'SELECT * FROM prod.playoff_board WHERE game_id = {str(game_id)} \
+AND "Week" >= {str(playoff_start_week)} AND "Week" < {str(current_week)}'
+    )
+    if board is None or set(board["Week"]) != set(
+        range(playoff_start_week, current_week)
+    ):
+        return None, {}
+
+    for type, matches in state.groupby("Bracket"):
+        bracket, teams = brackets.get(type, (None, None))
+        if bracket is None or set(matches["Seeds"]) != {",".join(teams)}:
+            return None, {}
+
+    resolved = {}
+    for type, matches in state.groupby("Bracket"):
+        bracket = brackets[type][0]
+        for match in matches.sort_values("Match").itertuples(index=False):
+            bracket.add_win(bracket.get_matches()[match.Match], match.team_key)
+            resolved[(type, match.Match)] = match.Week
+
+    board = board.sort_values(["Week", "Playoff Seed"]).reset_index(drop=True)
+    return board, resolved
+
+
+def _bracket_state(game_id, brackets, resolved):
+    """
+    prod.bracket_state rows of every match with a winner
+    """
+    rows = []
+    for type, (bracket, teams) in brackets.items():
+        for index, match in enumerate(bracket.get_matches()):
+            winner = match.get_winner_participant().get_competitor()
+            if winner is not None:
+                rows.append(
+                    [
+                        game_id,
+                        type,
+                        index,
+                        ",".join(teams),
+                        winner,
+                        resolved[(type, index)],
+                    ]
+                )
+    return pd.DataFrame(rows, columns=SCHEMAS["prod.bracket_state"].columns)
+
+
+@timed("stage.post_season")
 def post_season(game_id, private_file):
     """
-    Function to calculate post_season winners/losers, create final rank for the season
+    Function to calculate post_season winners/losers, create final rank for the season.
+    Playoff weeks settled by an earlier run are resumed from prod.bracket_state
+    and prod.playoff_board, only the current week's rounds are played.
     """
     try:
         settings_query = f"SELECT set.game_id, \
@@ -498,11 +603,8 @@ JOIN prod.metadata met \
 on met.game_id = set.game_id \
 and met.league_id = set.league_id \
 WHERE set.game_id = {str(game_id)}"
-        settings = (
-            DatabaseCursor(private_file)
-            .copy_from_psql(settings_query)
-            .drop_duplicates()
-        )
+        db_cursor = DatabaseCursor(private_file)
+        settings = db_cursor.copy_from_psql(settings_query).drop_duplicates()
 
         one_playoff_season_query = f'SELECT pts.game_id, \
 pts.week as "Week", \
@@ -516,11 +618,9 @@ FROM raw.weekly_team_pts pts \
 JOIN raw.teams tm \
 on tm.team_key = pts.team_key \
 WHERE pts.game_id = {str(game_id)}'
-        one_playoff_season = (
-            DatabaseCursor(private_file)
-            .copy_from_psql(one_playoff_season_query)
-            .drop_duplicates()
-        )
+        one_playoff_season = db_cursor.copy_from_psql(
+            one_playoff_season_query
+        ).drop_duplicates()
 
         max_teams = settings["max_teams"][settings["game_id"] == game_id].values[0]
         num_playoff_teams = settings["num_playoff_teams"][
@@ -569,27 +669,22 @@ WHERE pts.game_id = {str(game_id)}'
             num_conso_teams,
             num_toliet_teams,
         )
+        season = SeasonFrame(one_playoff_season)
 
         playoff_bracket = Tournament(playoff_teams)
-        curr_playoff_picture(
-            playoff_bracket, one_playoff_season, current_week, "Playoff"
-        )
+        curr_playoff_picture(playoff_bracket, season, current_week, "Playoff")
 
         if conso_teams:
             conso_bracket = Tournament(conso_teams)
             if current_week < playoff_start_week:
-                curr_playoff_picture(
-                    conso_bracket, one_playoff_season, current_week, "Conso"
-                )
+                curr_playoff_picture(conso_bracket, season, current_week, "Conso")
         else:
             conso_bracket = None
 
         if toilet_teams:
             toilet_bracket = Tournament(toilet_teams)
             if current_week < playoff_start_week:
-                curr_playoff_picture(
-                    toilet_bracket, one_playoff_season, current_week, "Toilet"
-                )
+                curr_playoff_picture(toilet_bracket, season, current_week, "Toilet")
         else:
             toilet_bracket = None
 
@@ -602,19 +697,54 @@ WHERE pts.game_id = {str(game_id)}'
             toilet_teams,
         )
 
-        playoff_end_week_mask = one_playoff_season["Week"] == playoff_end_week
+        brackets = {
+            type: (bracket, teams)
+            for type, bracket, teams in [
+                ("Playoff", playoff_bracket, playoff_teams),
+                ("Conso", conso_bracket, conso_teams),
+                ("Toilet", toilet_bracket, toilet_teams),
+            ]
+            if bracket is not None
+        }
+        settled_board, resolved = _resume_brackets(
+            db_cursor, game_id, brackets, playoff_start_week, current_week
+        )
+        if settled_board is not None:
+            playoff_weeks, conso_weeks, toilet_weeks = [
+                [week for week in weeks if week == current_week] if weeks else None
+                for weeks in [playoff_weeks, conso_weeks, toilet_weeks]
+            ]
 
-        if playoff_weeks:
-            for week in playoff_weeks:
-                competition_rounds(playoff_bracket, "Playoff", week, one_playoff_season)
+        for type, weeks in [
+            ("Playoff", playoff_weeks),
+            ("Conso", conso_weeks),
+            ("Toilet", toilet_weeks),
+        ]:
+            if weeks:
+                for week in weeks:
+                    for match in competition_rounds(
+                        brackets[type][0], type, week, season
+                    ):
+                        resolved[(type, match.index)] = week
+
+        if current_week >= playoff_start_week:
+            state = coerce(
+                _bracket_state(game_id, brackets, resolved), "prod.bracket_state"
+            )
+            # rewritten whole so matches a later run left open are dropped
+            query = f"SELECT * FROM prod.bracket_state WHERE game_id != {str(game_id)}"
+            data_upload(state, "prod.bracket_state", private_file, query)
 
-        if conso_weeks:
-            for week in conso_weeks:
-                competition_rounds(conso_bracket, "Conso", week, one_playoff_season)
+        if settled_board is not None:
+            one_playoff_season = pd.concat(
+                [
+                    settled_board,
+                    one_playoff_season[one_playoff_season["Week"] == current_week],
+                ],
+                ignore_index=True,
+            )
 
-        if toilet_weeks:
-            for week in toilet_weeks:
-                competition_rounds(toilet_bracket, "Toilet", week, one_playoff_season)
+        playoff_end_week_mask = one_playoff_season["Week"] == playoff_end_week
 
         if current_week == playoff_end_week:
             try:
@@ -706,36 +836,15 @@ WHERE pts.game_id = {str(game_id)}'
             ["team_key"]
         )["Opp Wk Pro. Pts"].cumsum()
 
-        one_playoff_season = one_playoff_season[
-            [
-                "game_id",
-                "Week",
-                "Bracket",
-                "Finish",
-                "Playoff Seed",
-                "team_key",
-                "Team",
-                "Manager",
-                "Wk W/L",
-                "Wk Pts",
-                "Wk Pro. Pts",
-                "Ttl Pts",
-                "Ttl Pro. Pts",
-                "opp_team_key",
-                "Opp Team",
-                "Opp Manager",
-                "Opp Wk Pts",
-                "Opp Wk Pro. Pts",
-                "Opp Ttl Pts",
-                "Opp Ttl Pro. Pts",
-            ]
-        ]
+        one_playoff_season = coerce(one_playoff_season, "prod.playoff_board")
 
         one_playoff_season.sort_values(["Week", "Finish"], inplace=True)
 
         query = f"SELECT * FROM prod.playoff_board WHERE game_id != {str(game_id)}"
 
-        data_upload(one_playoff_season, "prod.playoff_board", private_file, query)
+        data_upload(
+            one_playoff_season, "prod.playoff_board", private_file, query, upsert=True
+        )
 
         return one_playoff_season
 
@@ -747,3 +856,4 @@ WHERE pts.game_id = {str(game_id)}'
             table="prod.playoff_board",
             game_id=game_id,
         )
+        raise
@@ -1,8 +1,8 @@
 import pandas as pd
 import numpy as np
 import logging
-import time
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from yfpy import YahooFantasySportsQuery
 from yfpy.utils import complex_json_handler, unpack_data
@@ -11,6 +11,14 @@ from yfpy import get_logger
 from Mom_WeeklyRankings_Export.db_upload import DatabaseCursor
 from Mom_WeeklyRankings_Export.utils import data_upload
 from Mom_WeeklyRankings_Export.cust_logging import log_print
+from Mom_WeeklyRankings_Export.metrics import METRICS, timed
+from Mom_WeeklyRankings_Export.parsing import RecordBuilder, flatten
+from Mom_WeeklyRankings_Export.rate_limit import TokenBucket
+from Mom_WeeklyRankings_Export.response_archive import ResponseArchive
+from Mom_WeeklyRankings_Export.response_cache import ResponseCache
+from Mom_WeeklyRankings_Export.retry import InvalidWeekError, RetryPolicy
+from Mom_WeeklyRankings_Export.schema import coerce
+from Mom_WeeklyRankings_Export.token_store import TokenManager
 
 # PATH = list(Path().cwd().glob("**/private.yaml"))
 # if PATH == []:
@@ -25,12 +33,74 @@ from Mom_WeeklyRankings_Export.cust_logging import log_print
 #     TEAMS_FILE = TEAMS_FILE[0]
 
 
+def _is_finished(league_metadata):
+    return bool(complex_json_handler(league_metadata).get("is_finished"))
+
+
+def _is_postevent(matchups_response):
+    statuses = [
+        complex_json_handler(data["matchup"]).get("status")
+        for data in matchups_response
+    ]
+    return bool(statuses) and all(status == "postevent" for status in statuses)
+
+
+# matchup fields kept from the matchups response and defaults when missing
+MATCHUP_COLUMNS = [
+    "is_consolation",
+    "is_matchup_recap_available",
+    "is_playoffs",
+    "is_tied",
+    "matchup_recap_title",
+    "matchup_recap_url",
+    "status",
+    "week",
+    "week_end",
+    "week_start",
+    "winner_team_key",
+]
+MATCHUP_DEFAULTS = {
+    "is_tied": 0,
+    "matchup_recap_title": 0,
+    "matchup_recap_url": 0,
+    "winner_team_key": 0,
+}
+
+
+def _matchup_team(matchup, i):
+    """
+    team_key, grade, points and projected_points of the i-th team of a matchup,
+    grade is blank when the matchup has no grades
+    """
+    team = complex_json_handler(matchup["teams"][i]["team"])
+    try:
+        row = flatten(
+            complex_json_handler(matchup["matchup_grades"][i]["matchup_grade"])
+        )
+    except:
+        row = {"team_key": team["team_key"], "grade": ""}
+    row["points"] = team["team_points"]["total"]
+    row["projected_points"] = team["team_projected_points"]["total"]
+    return row
+
+
 class league_season_data(object):
 
     LOGGET = get_logger(__name__)
     LOG_OUTPUT = False
     logging.getLogger("yfpy.query").setLevel(level=logging.INFO)
 
+    # every live Yahoo call takes a token: one call per second sustained
+    # (the old fixed sleep) with bursts of up to 20 calls. backfill.py swaps
+    # in a SharedTokenBucket so its worker processes share one budget
+    RATE_LIMITER = TokenBucket(rate=1, capacity=20)
+    MAX_WORKERS = 12
+
+    # network errors of a Yahoo call retry with backoff for up to 15 minutes
+    RETRY_POLICY = RetryPolicy(
+        base_delay=2, max_delay=120, max_attempts=8, max_total=900
+    )
+
     def __init__(
         self,
         auth_dir=None,
@@ -42,6 +112,13 @@ class league_season_data(object):
         consumer_key=None,
         consumer_secret=None,
         browser_callback=True,
+        token_file=None,
+        use_cache=True,
+        cache_dir=None,
+        cache_ttl=0,
+        yahoo_mode="live",
+        archive=None,
+        replay_latency=0.0,
     ):
         self._auth_dir = auth_dir
         self._private_file = auth_dir / "assests/private.yaml"
@@ -54,7 +131,16 @@ class league_season_data(object):
         self.game_id = str(game_id)
         self.game_code = str(game_code)
 
-        self.offline = offline
+        # "live" talks to Yahoo, "record" also writes every response to the
+        # archive zip and "replay" serves the archive with no network at all
+        self.yahoo_mode = yahoo_mode
+        self._archive = (
+            ResponseArchive(archive, mode=yahoo_mode, latency=replay_latency)
+            if yahoo_mode in ("record", "replay")
+            else None
+        )
+
+        self.offline = offline or yahoo_mode == "replay"
         self.all_output_as_json_str = all_output_as_json_str
 
         self.yahoo_query = YahooFantasySportsQuery(
@@ -69,81 +155,122 @@ class league_season_data(object):
             browser_callback=self._browser_callback,
         )
 
+        # token written by yahoo_oauth next to the consumer key, shared by
+        # every league_season_data and process using this auth_dir
+        self._token_manager = TokenManager(
+            self.yahoo_query, token_file or auth_dir / "private.json"
+        )
+
+        # responses of finished seasons and weeks are read from disk
+        self._cache = (
+            ResponseCache(cache_dir or auth_dir / "assests/yahoo_cache", ttl=cache_ttl)
+            if use_cache
+            else None
+        )
+        self._finished = None
+        self._matchups_responses = {}
+
+    def _refresh_token(self):
+        self._token_manager.refresh(force=True)
+
+    def _query(self, method, *args, final=False):
+        """
+        Call self.yahoo_query.<method>(*args) under RETRY_POLICY,
+        refreshing the OAuth token ahead of expiry
+
+        final = bool or function(response) -> bool, True when the response
+        can never change and is kept in the response cache for good
+        """
+        cache_args = (self.game_id, self.league_id) + args
+        if self.yahoo_mode == "replay":
+            METRICS.count("yahoo_calls", method=method, source="replay")
+            return self._archive.get(method, cache_args)
+
+        if self._cache is not None:
+            hit, response = self._cache.get(method, cache_args)
+            if hit:
+                METRICS.count("yahoo_calls", method=method, source="cache")
+                self._record(method, cache_args, response)
+                return response
+
+        METRICS.count("yahoo_calls", method=method, source="live")
+        if not self.offline:
+            self._token_manager.ensure_fresh()
+            with METRICS.span("yahoo.rate_limit_wait"):
+                self.RATE_LIMITER.acquire()
+        with METRICS.span("yahoo.call", method=method):
+            response = self.RETRY_POLICY.call(
+                getattr(self.yahoo_query, method),
+                *args,
+                reauthenticate=self._refresh_token,
+                module_="yahoo_query.py",
+                func=method,
+                game_id=self.game_id,
+                args=args,
+            )
+
+        if self._cache is not None:
+            is_final = final(response) if callable(final) else final
+            if is_final or self._cache.ttl:
+                self._cache.put(method, cache_args, response, final=is_final)
+
+        self._record(method, cache_args, response)
+        return response
+
+    def _record(self, method, cache_args, response):
+        if self.yahoo_mode == "record":
+            self._archive.put(method, cache_args, response)
+
+    def close(self):
+        """
+        Finish writing the record archive
+        """
+        if self._archive is not None:
+            self._archive.close()
+
+    def _season_finished(self):
+        """
+        True once the league's season is over, from the (cached) metadata
+        """
+        if self._finished is None:
+            try:
+                self._finished = bool(
+                    complex_json_handler(
+                        self._query("get_league_metadata", final=_is_finished)
+                    ).get("is_finished")
+                )
+            except Exception:
+                return False
+        return self._finished
+
+    def last_finished_week(self):
+        """
+        The league's last week that has been played out: end_week once the
+        season is finished, else the week before its current_week
+        """
+        response = self._query("get_league_metadata", final=_is_finished)
+        metadata = complex_json_handler(response)
+        if _is_finished(response):
+            return int(metadata["end_week"])
+        return int(metadata["current_week"]) - 1
+
+    @timed("yahoo.metadata")
     def metadata(self):
         """
         Pull League Metadata
         """
         try:
             try:
-                response = complex_json_handler(self.yahoo_query.get_league_metadata())
-            except Exception as e:
-                if "Invalid week" in str(e):
-                    return
-                elif "token_expired" in str(e):
-                    self.yahoo_query._authenticate()
-                elif "Network is unreachable" in str(e):
-                    log_print(
-                        error=e,
-                        module_="yahoo_query.py",
-                        func="metadata",
-                        game_id=self.game_id,
-                        sleep="15 min before retrying",
-                    )
-                    time.sleep(900)
-                else:
-                    log_print(
-                        error=e,
-                        module_="yahoo_query.py",
-                        func="metadata",
-                        game_id=self.game_id,
-                        sleep="1 hour before retrying",
-                    )
-                    time.sleep(3600)
-                    try:
-                        self.yahoo_query._authenticate()
-                    except Exception as e:
-                        log_print(
-                            error=e,
-                            module_="yahoo_query.py",
-                            func="metadata",
-                            game_id=self.game_id,
-                            sleep="30 min before 2nd retry",
-                        )
-                        time.sleep(1800)
-                        self.yahoo_query._authenticate()
-
-                response = complex_json_handler(self.yahoo_query.get_league_metadata())
+                response = complex_json_handler(
+                    self._query("get_league_metadata", final=_is_finished)
+                )
+            except InvalidWeekError:
+                return
 
             league_metadata = pd.json_normalize(response)
             league_metadata["game_id"] = self.game_id
             league_metadata.drop_duplicates(ignore_index=True, inplace=True)
-            league_metadata = league_metadata[
-                [
-                    "game_id",
-                    "league_id",
-                    "name",
-                    "num_teams",
-                    "season",
-                    "start_date",
-                    "start_week",
-                    "end_date",
-                    "end_week",
-                ]
-            ]
-
-            league_metadata["game_id"] = league_metadata["game_id"].astype(int)
-            league_metadata["league_id"] = league_metadata["league_id"].astype(int)
-            league_metadata["name"] = league_metadata["name"].astype(str)
-            league_metadata["num_teams"] = league_metadata["num_teams"].astype(int)
-            league_metadata["season"] = league_metadata["season"].astype(int)
-            league_metadata["start_date"] = league_metadata["start_date"].astype(
-                "datetime64[D]"
-            )
-            league_metadata["start_week"] = league_metadata["start_week"].astype(int)
-            league_metadata["end_date"] = league_metadata["end_date"].astype(
-                "datetime64[D]"
-            )
-            league_metadata["end_week"] = league_metadata["end_week"].astype(int)
+            league_metadata = coerce(league_metadata, "prod.metadata")
 
             query = f"SELECT DISTINCT game_id, \
 league_id, \
@@ -164,6 +291,7 @@ league_id"
                 table_name="prod.metadata",
                 query=query,
                 path=self._private_file,
+                upsert=True,
             )
 
             return league_metadata
@@ -172,51 +300,20 @@ league_id"
             log_print(
                 error=e, module_="yahoo_query.py", func="metadata", game_id=self.game_id
             )
+            raise
 
+    @timed("yahoo.settings")
     def settings(self):
         """
         Get Roster Positions, Stat Categories, and League Settigns
         """
         try:
             try:
-                response = complex_json_handler(self.yahoo_query.get_league_settings())
-            except Exception as e:
-                if "Invalid week" in str(e):
-                    return
-                elif "token_expired" in str(e):
-                    self.yahoo_query._authenticate()
-                elif "Network is unreachable" in str(e):
-                    log_print(
-                        error=e,
-                        module_="yahoo_query.py",
-                        func="set_roster_pos_stat_cat",
-                        game_id=self.game_id,
-                        sleep="15 min before retrying",
-                    )
-                    time.sleep(900)
-                else:
-                    log_print(
-                        error=e,
-                        module_="yahoo_query.py",
-                        func="set_roster_pos_stat_cat",
-                        game_id=self.game_id,
-                        sleep="1 hour before retrying",
-                    )
-                    time.sleep(3600)
-                    try:
-                        self.yahoo_query._authenticate()
-                    except Exception as e:
-                        log_print(
-                            error=e,
-                            module_="yahoo_query.py",
-                            func="set_roster_pos_stat_cat",
-                            game_id=self.game_id,
-                            sleep="30 min before 2nd retry",
-                        )
-                        time.sleep(1800)
-                        self.yahoo_query._authenticate()
-
-                response = complex_json_handler(self.yahoo_query.get_league_settings())
+                response = complex_json_handler(
+                    self._query("get_league_settings", final=self._season_finished())
+                )
+            except InvalidWeekError:
+                return
 
             league_settings = pd.json_normalize(response)
             league_settings.drop(
@@ -230,41 +327,7 @@ league_id"
             league_settings["has_playoff_consolation_games"].fillna(0, inplace=True)
             league_settings["has_multiweek_championship"].fillna(0, inplace=True)
             league_settings.drop_duplicates(ignore_index=True, inplace=True)
-            league_settings = league_settings[
-                [
-                    "game_id",
-                    "league_id",
-                    "has_multiweek_championship",
-                    "max_teams",
-                    "num_playoff_teams",
-                    "has_playoff_consolation_games",
-                    "num_playoff_consolation_teams",
-                    "playoff_start_week",
-                    "trade_end_date",
-                ]
-            ]
-
-            league_settings["game_id"] = league_settings["game_id"].astype(int)
-            league_settings["league_id"] = league_settings["league_id"].astype(int)
-            league_settings["has_multiweek_championship"] = league_settings[
-                "has_multiweek_championship"
-            ].astype(int)
-            league_settings["max_teams"] = league_settings["max_teams"].astype(int)
-            league_settings["num_playoff_teams"] = league_settings[
-                "num_playoff_teams"
-            ].astype(int)
-            league_settings["has_playoff_consolation_games"] = league_settings[
-                "has_playoff_consolation_games"
-            ].astype(int)
-            league_settings["num_playoff_consolation_teams"] = league_settings[
-                "num_playoff_consolation_teams"
-            ].astype(int)
-            league_settings["playoff_start_week"] = league_settings[
-                "playoff_start_week"
-            ].astype(int)
-            league_settings["trade_end_date"] = league_settings[
-                "trade_end_date"
-            ].astype("datetime64[D]")
+            league_settings = coerce(league_settings, "prod.settings")
 
             query_1 = f"SELECT DISTINCT game_id, \
 league_id, \
@@ -285,6 +348,7 @@ league_id"
                 table_name="prod.settings",
                 query=query_1,
                 path=self._private_file,
+                upsert=True,
             )
 
             return league_settings
@@ -296,7 +360,9 @@ league_id"
                 func="settings",
                 game_id=self.game_id,
             )
+            raise
 
+    @timed("yahoo.matchups")
     def matchups(self, nfl_week=None):
         """
         stuff here
@@ -308,163 +374,32 @@ league_id"
                 )
             else:
                 m = []
-                team_a = pd.DataFrame()
-                team_b = pd.DataFrame()
 
                 try:
-                    response = self.yahoo_query.get_league_matchups_by_week(nfl_week)
-                except Exception as e:
-                    if "Invalid week" in str(e):
-                        return
-                    elif "scoreboard" in str(e):
-                        return
-                    elif "token_expired" in str(e):
-                        self.yahoo_query._authenticate()
-                    elif "Network is unreachable" in str(e):
-                        log_print(
-                            error=e,
-                            module_="yahoo_query.py",
-                            func="matchups",
-                            game_id=self.game_id,
-                            nfl_week=nfl_week,
-                            sleep="15 min before retrying",
-                        )
-                        time.sleep(900)
-                    else:
-                        log_print(
-                            error=e,
-                            module_="yahoo_query.py",
-                            func="matchups",
-                            game_id=self.game_id,
-                            nfl_week=nfl_week,
-                            sleep="1 hour before retrying",
-                        )
-                        time.sleep(3600)
-                        try:
-                            self.yahoo_query._authenticate()
-                        except Exception as e:
-                            log_print(
-                                error=e,
-                                module_="yahoo_query.py",
-                                func="matchups",
-                                game_id=self.game_id,
-                                nfl_week=nfl_week,
-                                sleep="30 min before 2nd retry",
-                            )
-                            time.sleep(1800)
-                            self.yahoo_query._authenticate()
-
-                    response = self.yahoo_query.get_league_matchups_by_week(nfl_week)
+                    response = self._query(
+                        "get_league_matchups_by_week", nfl_week, final=_is_postevent
+                    )
+                except InvalidWeekError:
+                    return
+
+                # reused by weekly_points(from_matchups=True)
+                self._matchups_responses[nfl_week] = response
 
                 for data in response:
                     m.append(complex_json_handler(data["matchup"]))
 
-                matchups = pd.DataFrame()
+                matchups = RecordBuilder()
                 for r in m:
-                    matchup = pd.json_normalize(r)
-                    if "is_tied" not in matchup.columns:
-                        matchup["is_tied"] = 0
-                    if "matchup_recap_title" not in matchup.columns:
-                        matchup["matchup_recap_title"] = 0
-                    if "matchup_recap_url" not in matchup.columns:
-                        matchup["matchup_recap_url"] = 0
-                    if "winner_team_key" not in matchup.columns:
-                        matchup["winner_team_key"] = 0
-
-                    matchup = matchup[
-                        [
-                            "is_consolation",
-                            "is_matchup_recap_available",
-                            "is_playoffs",
-                            "is_tied",
-                            "matchup_recap_title",
-                            "matchup_recap_url",
-                            "status",
-                            "week",
-                            "week_end",
-                            "week_start",
-                            "winner_team_key",
-                        ]
-                    ]
-                    try:
-                        team_a = pd.json_normalize(
-                            complex_json_handler(
-                                r["matchup_grades"][0]["matchup_grade"]
-                            )
-                        )
-                        team_a["points"] = complex_json_handler(r["teams"][0]["team"])[
-                            "team_points"
-                        ]["total"]
-                        team_a["projected_points"] = complex_json_handler(
-                            r["teams"][0]["team"]
-                        )["team_projected_points"]["total"]
-
-                    except:
-                        team_a = pd.json_normalize(
-                            complex_json_handler(r["teams"][0]["team"])
-                        )
-                        team_a = team_a[
-                            [
-                                "team_key",
-                                "team_points.total",
-                                "team_projected_points.total",
-                            ]
-                        ]
-                        team_a["grade"] = ""
-                        team_a.rename(
-                            columns={
-                                "team_points.total": "points",
-                                "team_projected_points.total": "projected_points",
-                            },
-                            inplace=True,
-                        )
-
-                    team_a = team_a.add_prefix("team_a_")
-
-                    try:
-                        team_b = pd.json_normalize(
-                            complex_json_handler(
-                                r["matchup_grades"][1]["matchup_grade"]
-                            )
-                        )
-                        team_b["points"] = complex_json_handler(r["teams"][1]["team"])[
-                            "team_points"
-                        ]["total"]
-                        team_b["projected_points"] = complex_json_handler(
-                            r["teams"][1]["team"]
-                        )["team_projected_points"]["total"]
-
-                    except:
-                        team_b = pd.json_normalize(
-                            complex_json_handler(r["teams"][1]["team"])
-                        )
-                        team_b = team_b[
-                            [
-                                "team_key",
-                                "team_points.total",
-                                "team_projected_points.total",
-                            ]
-                        ]
-                        team_b["grade"] = ""
-                        team_b.rename(
-                            columns={
-                                "team_points.total": "points",
-                                "team_projected_points.total": "projected_points",
-                            },
-                            inplace=True,
-                        )
-
-                    team_b = team_b.add_prefix("team_b_")
-
-                    matchup = pd.concat([matchup, team_a, team_b], axis=1)
-
-                    matchups = pd.concat([matchups, matchup])
-
-                try:
-                    matchups.drop(["teams", "matchup_grades"], axis=1, inplace=True)
+                    matchup = {
+                        col: r.get(col, MATCHUP_DEFAULTS.get(col))
+                        for col in MATCHUP_COLUMNS
+                    }
+                    for prefix, team in (("team_a_", 0), ("team_b_", 1)):
+                        for col, value in _matchup_team(r, team).items():
+                            matchup[f"{prefix}{col}"] = value
+                    matchups.append(matchup)
 
-                except:
-                    pass
+                matchups = matchups.to_frame()
 
                 matchups["game_id"] = self.game_id
                 matchups["league_id"] = self.league_id
@@ -472,53 +407,7 @@ league_id"
                 matchups["is_consolation"].fillna(0, inplace=True)
                 matchups["is_tied"].fillna(0, inplace=True)
 
-            matchups = matchups[
-                [
-                    "game_id",
-                    "is_consolation",
-                    "is_playoffs",
-                    "is_tied",
-                    "league_id",
-                    "team_a_grade",
-                    "team_a_points",
-                    "team_a_projected_points",
-                    "team_a_team_key",
-                    "team_b_grade",
-                    "team_b_points",
-                    "team_b_projected_points",
-                    "team_b_team_key",
-                    "week",
-                    "week_start",
-                    "week_end",
-                    "winner_team_key",
-                ]
-            ]
-
-            matchups["game_id"] = matchups["game_id"].astype(int)
-            matchups["league_id"] = matchups["league_id"].astype(int)
-            matchups["week"] = matchups["week"].astype(int)
-            matchups["week_start"] = matchups["week_start"].astype("datetime64[D]")
-            matchups["week_end"] = matchups["week_end"].astype("datetime64[D]")
-            matchups["is_playoffs"] = matchups["is_playoffs"].astype(int)
-            matchups["is_consolation"] = matchups["is_consolation"].astype(int)
-            matchups["is_tied"] = matchups["is_tied"].astype(int)
-            matchups["team_a_team_key"] = matchups["team_a_team_key"].astype(str)
-            matchups["team_a_points"] = (
-                matchups["team_a_points"].astype(float).round(decimals=2)
-            )
-            matchups["team_a_projected_points"] = (
-                matchups["team_a_projected_points"].astype(float).round(decimals=2)
-            )
-            matchups["team_b_team_key"] = matchups["team_b_team_key"].astype(str)
-            matchups["team_b_points"] = (
-                matchups["team_b_points"].astype(float).round(decimals=2)
-            )
-            matchups["team_b_projected_points"] = (
-                matchups["team_b_projected_points"].astype(float).round(decimals=2)
-            )
-            matchups["winner_team_key"] = matchups["winner_team_key"].astype(str)
-            matchups["team_a_grade"] = matchups["team_a_grade"].astype(str)
-            matchups["team_b_grade"] = matchups["team_b_grade"].astype(str)
+            matchups = coerce(matchups, "raw.matchups")
 
             query = f"SELECT DISTINCT game_id, \
 league_id, \
@@ -549,6 +438,7 @@ team_a_team_key"
                 table_name="raw.matchups",
                 query=query,
                 path=self._private_file,
+                upsert=True,
             )
 
             return matchups
@@ -561,65 +451,99 @@ team_a_team_key"
                 game_id=self.game_id,
                 nfl_week=nfl_week,
             )
+            raise
+
+    @timed("yahoo.schedule")
+    def schedule(self, first_week, last_week=None):
+        """
+        Pairings of weeks first_week..last_week to raw.schedule, from the
+        scoreboards Yahoo has for weeks not yet played (preevent), for the
+        playoff odds simulation. last_week defaults to the last regular
+        season week in prod.settings.
+        """
+        try:
+            if last_week is None:
+                sql_query = f"SELECT DISTINCT playoff_start_week FROM prod.settings \
+WHERE game_id = {str(self.game_id)}"
+                settings = DatabaseCursor(self._private_file).copy_from_psql(sql_query)
+                last_week = int(settings["playoff_start_week"].values[0]) - 1
+
+            schedule = RecordBuilder()
+            for nfl_week in range(int(first_week), int(last_week) + 1):
+                response = self._query(
+                    "get_league_matchups_by_week", nfl_week, final=_is_postevent
+                )
+                for data in response:
+                    matchup = complex_json_handler(data["matchup"])
+                    teams = [
+                        complex_json_handler(team["team"])["team_key"]
+                        for team in matchup["teams"]
+                    ]
+                    schedule.append(
+                        {
+                            "week": nfl_week,
+                            "team_a_team_key": teams[0],
+                            "team_b_team_key": teams[1],
+                        }
+                    )
+
+            schedule = schedule.to_frame()
+            if schedule.empty:
+                return schedule
+            schedule["game_id"] = self.game_id
+            schedule["league_id"] = self.league_id
+            schedule = coerce(schedule, "raw.schedule")
+
+            query = f"SELECT * FROM raw.schedule \
+WHERE NOT (game_id = {str(self.game_id)} \
+AND week BETWEEN {str(first_week)} AND {str(last_week)})"
+
+            data_upload(
+                df=schedule,
+                table_name="raw.schedule",
+                query=query,
+                path=self._private_file,
+                upsert=True,
+            )
+
+            return schedule
 
+        except Exception as e:
+            log_print(
+                error=e,
+                module_="yahoo_query.py",
+                func="schedule",
+                game_id=self.game_id,
+                first_week=first_week,
+                last_week=last_week,
+            )
+            raise
+
+    @timed("yahoo.teams")
     def teams(self):
         """
         stuff here
         """
         try:
             try:
-                response = self.yahoo_query.get_league_standings()
-            except Exception as e:
-                if "Invalid week" in str(e):
-                    return
-                elif "token_expired" in str(e):
-                    self.yahoo_query._authenticate()
-                elif "Network is unreachable" in str(e):
-                    log_print(
-                        error=e,
-                        module_="yahoo_query.py",
-                        func="teams",
-                        game_id=self.game_id,
-                        sleep="15 min before retrying",
-                    )
-                    time.sleep(900)
-                else:
-                    log_print(
-                        error=e,
-                        module_="yahoo_query.py",
-                        func="teams",
-                        game_id=self.game_id,
-                        sleep="1 hour before retrying",
-                    )
-                    time.sleep(3600)
-                    try:
-                        self.yahoo_query._authenticate()
-                    except Exception as e:
-                        log_print(
-                            error=e,
-                            module_="yahoo_query.py",
-                            func="teams",
-                            game_id=self.game_id,
-                            sleep="30 min before 2nd retry",
-                        )
-                        time.sleep(1800)
-                        self.yahoo_query._authenticate()
-                response = self.yahoo_query.get_league_standings()
+                response = self._query(
+                    "get_league_standings", final=self._season_finished()
+                )
+            except InvalidWeekError:
+                return
 
             teams = complex_json_handler(response)
-            teams_standings = pd.DataFrame()
+            teams_standings = RecordBuilder()
             for t in teams["teams"]:
-                row = pd.json_normalize(complex_json_handler(t["team"]))
-                if "managers.manager" not in row.columns:
-                    manager = pd.json_normalize(
-                        complex_json_handler(row["managers"][0][0]["manager"])
-                    )
+                row = flatten(complex_json_handler(t["team"]))
+                if "managers.manager" not in row:
+                    manager = complex_json_handler(row["managers"][0]["manager"])
                 else:
-                    manager = pd.json_normalize(
-                        complex_json_handler(row["managers.manager"][0])
-                    )
-                row = pd.concat([row, manager], axis=1)
-                teams_standings = pd.concat([teams_standings, row])
+                    manager = complex_json_handler(row["managers.manager"])
+                row.update(flatten(manager))
+                teams_standings.append(row)
+
+            teams_standings = teams_standings.to_frame()
 
             teams_standings["name"] = teams_standings["name"].str.decode("utf-8")
 
@@ -676,82 +600,8 @@ team_a_team_key"
                 subset=["game_id", "league_id", "manager_id", "team_key"], inplace=True
             )
 
-            teams_standings = teams_standings[
-                [
-                    "game_id",
-                    "league_id",
-                    "team_id",
-                    "team_key",
-                    "manager_id",
-                    "clinched_playoffs",
-                    "draft_grade",
-                    "faab_balance",
-                    "name",
-                    "nickname",
-                    "number_of_moves",
-                    "number_of_trades",
-                    "team_standings.playoff_seed",
-                    "team_standings.rank",
-                    "team_standings.outcome_totals.wins",
-                    "team_standings.outcome_totals.losses",
-                    "team_standings.outcome_totals.ties",
-                    "team_standings.outcome_totals.percentage",
-                    "team_standings.points_for",
-                    "team_standings.points_against",
-                ]
-            ]
-
             teams_standings.fillna(0, inplace=True)
-
-            teams_standings["game_id"] = teams_standings["game_id"].astype(int)
-            teams_standings["league_id"] = teams_standings["league_id"].astype(int)
-            teams_standings["team_id"] = teams_standings["team_id"].astype(int)
-            teams_standings["team_key"] = teams_standings["team_key"].astype(str)
-            teams_standings["manager_id"] = teams_standings["manager_id"].astype(int)
-            teams_standings["clinched_playoffs"] = teams_standings[
-                "clinched_playoffs"
-            ].astype(int)
-            teams_standings["draft_grade"] = teams_standings["draft_grade"].astype(str)
-            teams_standings["faab_balance"] = teams_standings["faab_balance"].astype(
-                int
-            )
-            teams_standings["name"] = teams_standings["name"].astype(str)
-            teams_standings["number_of_moves"] = teams_standings[
-                "number_of_moves"
-            ].astype(int)
-            teams_standings["number_of_trades"] = teams_standings[
-                "number_of_trades"
-            ].astype(int)
-            teams_standings["team_standings.playoff_seed"] = teams_standings[
-                "team_standings.playoff_seed"
-            ].astype(int)
-            teams_standings["team_standings.rank"] = teams_standings[
-                "team_standings.rank"
-            ].astype(int)
-            teams_standings["team_standings.outcome_totals.wins"] = teams_standings[
-                "team_standings.outcome_totals.wins"
-            ].astype(int)
-            teams_standings["team_standings.outcome_totals.losses"] = teams_standings[
-                "team_standings.outcome_totals.losses"
-            ].astype(int)
-            teams_standings["team_standings.outcome_totals.ties"] = teams_standings[
-                "team_standings.outcome_totals.ties"
-            ].astype(int)
-            teams_standings["team_standings.outcome_totals.percentage"] = (
-                teams_standings["team_standings.outcome_totals.percentage"]
-                .astype(float)
-                .round(decimals=4)
-            )
-            teams_standings["team_standings.points_for"] = (
-                teams_standings["team_standings.points_for"]
-                .astype(float)
-                .round(decimals=2)
-            )
-            teams_standings["team_standings.points_against"] = (
-                teams_standings["team_standings.points_against"]
-                .astype(float)
-                .round(decimals=2)
-            )
+            teams_standings = coerce(teams_standings, "raw.teams")
 
             query = f'SELECT DISTINCT game_id, \
 league_id, \
@@ -784,6 +634,7 @@ team_id'
                 table_name="raw.teams",
                 query=query,
                 path=self._private_file,
+                upsert=True,
             )
 
             return teams_standings
@@ -795,95 +646,118 @@ team_id'
                 func="teams",
                 game_id=self.game_id,
             )
+            raise
 
-    def weekly_points(self, nfl_week=None):
+    def _team_points(self, team, nfl_week):
         """
-        stuff here
+        Final and projected points record of one team for nfl_week,
+        None if the week is not valid
+        """
+        try:
+            response = self._query(
+                "get_team_stats_by_week",
+                str(team),
+                nfl_week,
+                final=self._season_finished(),
+            )
+        except InvalidWeekError:
+            return None
+
+        try:
+            ttl_pts = flatten(complex_json_handler(response["team_points"]))
+        except:
+            ttl_pts = flatten(response["team_points"])
+
+        try:
+            pro_pts = flatten(complex_json_handler(response["team_projected_points"]))
+        except:
+            pro_pts = flatten(response["team_projected_points"])
+
+        return {
+            "final_points": ttl_pts["total"],
+            "week": ttl_pts["week"],
+            "projected_points": pro_pts["total"],
+            "team_id": team,
+        }
+
+    def _matchup_points(self, nfl_week):
+        """
+        Final and projected points records of every team with a matchup in nfl_week,
+        read from the week's matchups response (the one matchups() already
+        pulled when there is one). None if the week is not valid
+        """
+        response = self._matchups_responses.get(nfl_week)
+        if response is None:
+            try:
+                response = self._query(
+                    "get_league_matchups_by_week", nfl_week, final=_is_postevent
+                )
+            except InvalidWeekError:
+                return None
+
+        team_pts = []
+        for data in response:
+            matchup = complex_json_handler(data["matchup"])
+            for i in range(len(matchup["teams"])):
+                team = _matchup_team(matchup, i)
+                team_pts.append(
+                    {
+                        "final_points": team["points"],
+                        "week": matchup["week"],
+                        "projected_points": team["projected_points"],
+                        "team_id": int(str(team["team_key"]).split(".t.")[-1]),
+                    }
+                )
+        return team_pts
+
+    @timed("yahoo.weekly_points")
+    def weekly_points(
+        self, nfl_week=None, concurrent=False, max_workers=None, from_matchups=False
+    ):
+        """
+        Pull final and projected points of every team for nfl_week.
+        concurrent=True fetches the teams on a pool of up to max_workers
+        threads instead of one team at a time, both paced by RATE_LIMITER.
+        from_matchups=True takes the points from the week's matchups and only
+        calls Yahoo per team for teams without a matchup (byes).
         """
         try:
             sql_query = f"SELECT DISTINCT max_teams FROM prod.settings WHERE game_id = {str(self.game_id)}"
             teams = DatabaseCursor(self._private_file).copy_from_psql(sql_query)
             teams = teams["max_teams"].values[0]
 
-            team_points_weekly = pd.DataFrame()
-            for team in range(1, teams + 1):
-                try:
-                    response = self.yahoo_query.get_team_stats_by_week(
-                        str(team), nfl_week
-                    )
+            if from_matchups:
+                team_pts = self._matchup_points(nfl_week)
+                if team_pts is None:
+                    return
+                playing = {pts["team_id"] for pts in team_pts}
+                for team in range(1, teams + 1):
+                    if team not in playing:
+                        team_pts.append(self._team_points(team, nfl_week))
+                team_pts.sort(key=lambda pts: 0 if pts is None else pts["team_id"])
 
-                except Exception as e:
-                    if "Invalid week" in str(e):
-                        return
-                    elif "token_expired" in str(e):
-                        self.yahoo_query._authenticate()
-                    elif "Network is unreachable" in str(e):
-                        log_print(
-                            error=e,
-                            module_="yahoo_query.py",
-                            func="weekly_points",
-                            game_id=self.game_id,
-                            nfl_week=nfl_week,
-                            sleep="15 min before retrying",
-                        )
-                        time.sleep(900)
-                    else:
-                        log_print(
-                            error=e,
-                            module_="yahoo_query.py",
-                            func="weekly_points",
-                            game_id=self.game_id,
-                            nfl_week=nfl_week,
-                            sleep="1 hour before retrying",
-                        )
-                        time.sleep(3600)
-                        try:
-                            self.yahoo_query._authenticate()
-                        except Exception as e:
-                            log_print(
-                                error=e,
-                                module_="yahoo_query.py",
-                                func="weekly_points",
-                                game_id=self.game_id,
-                                nfl_week=nfl_week,
-                                sleep="30 min before 2nd retry",
-                            )
-                            time.sleep(1800)
-                            self.yahoo_query._authenticate()
-                    try:
-                        response = complex_json_handler(
-                            self.yahoo_query.get_team_stats_by_week(str(team), nfl_week)
-                        )
-                    except:
-                        response = self.yahoo_query.get_team_stats_by_week(
-                            str(team), nfl_week
-                        )
-
-                time.sleep(1)
-
-                team_pts = pd.DataFrame()
-                try:
-                    ttl_pts = pd.json_normalize(
-                        complex_json_handler(response["team_points"])
-                    )
-                except:
-                    ttl_pts = pd.json_normalize(response["team_points"])
-                ttl_pts = ttl_pts[["total", "week"]]
-                ttl_pts.rename(columns={"total": "final_points"}, inplace=True)
+            elif concurrent:
 
-                try:
-                    pro_pts = pd.json_normalize(
-                        complex_json_handler(response["team_projected_points"])
-                    )
-                except:
-                    pro_pts = pd.json_normalize(response["team_projected_points"])
+                def fetch(team):
+                    return self._team_points(team, nfl_week)
 
-                pro_pts = pro_pts[["total"]]
-                pro_pts.rename(columns={"total": "projected_points"}, inplace=True)
-                team_pts = pd.concat([ttl_pts, pro_pts], axis=1)
-                team_pts["team_id"] = team
+                workers = min(max_workers or self.MAX_WORKERS, teams)
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    team_pts = list(pool.map(fetch, range(1, teams + 1)))
 
-                team_points_weekly = pd.concat([team_points_weekly, team_pts])
+            else:
+                team_pts = []
+                for team in range(1, teams + 1):
+                    team_pts.append(self._team_points(team, nfl_week))
+                    if team_pts[-1] is None:
+                        break
+
+            if any(pts is None for pts in team_pts):
+                return
+
+            team_points_weekly = RecordBuilder()
+            team_points_weekly.extend(team_pts)
+            team_points_weekly = team_points_weekly.to_frame()
 
             team_points_weekly["game_id"] = self.game_id
             team_points_weekly["league_id"] = self.league_id
@@ -895,31 +769,7 @@ team_id'
                 + team_points_weekly["team_id"].astype(str)
             )
 
-            team_points_weekly = team_points_weekly[
-                [
-                    "game_id",
-                    "league_id",
-                    "team_id",
-                    "team_key",
-                    "week",
-                    "final_points",
-                    "projected_points",
-                ]
-            ]
-
-            team_points_weekly["game_id"] = team_points_weekly["game_id"].astype(int)
-            team_points_weekly["league_id"] = team_points_weekly["league_id"].astype(
-                int
-            )
-            team_points_weekly["team_id"] = team_points_weekly["team_id"].astype(int)
-            team_points_weekly["team_key"] = team_points_weekly["team_key"].astype(str)
-            team_points_weekly["week"] = team_points_weekly["week"].astype(int)
-            team_points_weekly["final_points"] = (
-                team_points_weekly["final_points"].astype(float).round(decimals=2)
-            )
-            team_points_weekly["projected_points"] = (
-                team_points_weekly["projected_points"].astype(float).round(decimals=2)
-            )
+            team_points_weekly = coerce(team_points_weekly, "raw.weekly_team_pts")
 
             query = f"SELECT DISTINCT game_id, \
 league_id, \
@@ -940,6 +790,7 @@ team_id"
                 table_name="raw.weekly_team_pts",
                 query=query,
                 path=self._private_file,
+                upsert=True,
             )
 
             return team_points_weekly
@@ -952,13 +803,15 @@ team_id"
                 game_id=self.game_id,
                 nfl_week=nfl_week,
             )
+            raise
 
+    @timed("yahoo.all_game_keys")
     def all_game_keys(self):
         """
         stuff here
         """
         try:
-            response = unpack_data(self.yahoo_query.get_all_yahoo_fantasy_game_keys())
+            response = unpack_data(self._query("get_all_yahoo_fantasy_game_keys"))
             try:
                 with open(self._teams_file, "r") as file:
                     c_teams = yaml.load(file, Loader=yaml.SafeLoader)
@@ -973,12 +826,11 @@ team_id"
                     {"game_id": np.nan, "season": np.nan}, index=0
                 )
 
-            game_keys = pd.DataFrame()
+            game_keys = RecordBuilder()
             for r in response:
-                row = pd.DataFrame(complex_json_handler(r["game"]), index=[0])
-                game_keys = pd.concat([game_keys, row])
+                game_keys.append(flatten(complex_json_handler(r["game"])))
 
-            game_keys.reset_index(drop=True, inplace=True)
+            game_keys = game_keys.to_frame()
             game_keys = game_keys[game_keys["season"] >= 2012]
             game_keys = game_keys.merge(
                 league_keys,
@@ -986,9 +838,7 @@ team_id"
                 left_on=["game_id", "season"],
                 right_on=["game_id", "season"],
             )
-            game_keys = game_keys[
-                ["game_id", "league_id", "season", "is_game_over", "is_offseason"]
-            ]
+            game_keys = coerce(game_keys, "prod.game_keys")
             game_keys.drop_duplicates(ignore_index=True, inplace=True)
 
             query = "SELECT DISTINCT * FROM prod.game_keys"
@@ -1009,7 +859,9 @@ team_id"
                 func="all_game_keys",
                 game_id=self.game_id,
             )
+            raise
 
+    @timed("yahoo.all_nfl_weeks")
     def all_nfl_weeks(self):
         """
         stuff here
@@ -1019,14 +871,19 @@ team_id"
                 "SELECT DISTINCT game_id FROM prod.game_keys"
             )
             game_id = list(game_keys["game_id"])
-            weeks = pd.DataFrame()
+            weeks = RecordBuilder()
             for g in game_id:
-                response = self.yahoo_query.get_game_weeks_by_game_id(str(g))
+                response = self._query(
+                    "get_game_weeks_by_game_id",
+                    str(g),
+                    final=int(g) < int(self.game_id),
+                )
                 for r in response:
-                    row = pd.json_normalize(complex_json_handler(r["game_week"]))
+                    row = flatten(complex_json_handler(r["game_week"]))
                     row["game_id"] = g
-                    weeks = pd.concat([weeks, row])
+                    weeks.append(row)
 
+            weeks = weeks.to_frame()
             weeks.rename(
                 columns={
                     "display_name": "week",
@@ -1036,9 +893,7 @@ team_id"
                 inplace=True,
             )
             weeks = weeks[["week", "week_start", "week_end", "game_id"]]
-            weeks = weeks.iloc[:, 1:]
-            weeks["week_start"] = weeks["week_start"].astype("datetime64[D]")
-            weeks["week_end"] = weeks["week_end"].astype("datetime64[D]")
+            weeks = coerce(weeks.iloc[:, 1:], "prod.nfl_weeks")
             weeks.drop_duplicates(ignore_index=True, inplace=True)
 
             query = "SELECT DISTINCT * FROM prod.nfl_weeks"
@@ -1059,3 +914,4 @@ team_id"
                 func="all_nfl_weeks",
                 game_id=self.game_id,
             )
+            raise
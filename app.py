@@ -1,5 +1,5 @@
 import numpy as np
-from pandas import DataFrame
+from argparse import ArgumentParser
 import yaml
 from pathlib import Path
 from time import time
@@ -12,12 +12,163 @@ from Mom_WeeklyRankings_Export.utils import (
     post_season,
 )
 from Mom_WeeklyRankings_Export.cust_logging import log_print
+from Mom_WeeklyRankings_Export.db_upload import close_pools
+from Mom_WeeklyRankings_Export.metrics import METRICS
+from Mom_WeeklyRankings_Export.pipeline import Pipeline
+from Mom_WeeklyRankings_Export.playoff_odds import playoff_odds
+from Mom_WeeklyRankings_Export.profiling import profile_run
 from Mom_WeeklyRankings_Export.yahoo_data import league_season_data
 from assests.assests import PRIVATE, TEAMS
 
+# stage: (tables read, tables written). Stages touching the same table keep
+# the order they are added in, the others run side by side.
+STAGE_TABLES = {
+    "all_game_keys": ((), ("prod.game_keys",)),
+    "all_nfl_weeks": (("prod.game_keys",), ("prod.nfl_weeks",)),
+    "metadata": (("prod.metadata",), ("prod.metadata",)),
+    "settings": (("prod.settings",), ("prod.settings",)),
+    "teams": (("raw.teams",), ("raw.teams",)),
+    "matchups": (("raw.matchups",), ("raw.matchups",)),
+    # from_matchups takes the points from the matchups stage's responses
+    "weekly_points": (
+        ("prod.settings", "raw.matchups", "raw.weekly_team_pts"),
+        ("raw.weekly_team_pts",),
+    ),
+    "reg_season": (
+        ("prod.settings", "raw.matchups", "raw.teams", "prod.reg_season_results"),
+        ("prod.reg_season_results", "raw.teams"),
+    ),
+    "post_season": (
+        (
+            "prod.settings",
+            "prod.metadata",
+            "raw.teams",
+            "raw.weekly_team_pts",
+            "prod.playoff_board",
+            "prod.bracket_state",
+        ),
+        ("prod.playoff_board", "prod.bracket_state"),
+    ),
+    "schedule": (("prod.settings", "raw.schedule"), ("raw.schedule",)),
+    "playoff_odds": (
+        ("prod.settings", "raw.schedule", "prod.reg_season_results"),
+        ("prod.playoff_odds",),
+    ),
+}
 
-def data_pipeline():
-    date = np.datetime64("today", "D")
+# stages run at once by data_pipeline
+WORKERS = 4
+
+
+def season_calendar(date, nfl_weeks, game_keys):
+    """
+    Where date falls in its season, from prod.nfl_weeks and prod.game_keys:
+    season, game_id, league_id, start_of_season, end_of_season and week,
+    the NFL week's row (week, week_start, week_end) or None between weeks
+    """
+    date = np.datetime64(date, "D")
+    start_of_season, season = get_laborday(date)
+
+    game_key = game_keys[game_keys["season"] == season]
+    league_id = game_key["league_id"].values[0]
+    game_id = game_key["game_id"].values[0]
+    nfl_weeks = nfl_weeks[nfl_weeks["game_id"] == game_id]
+
+    max_week = nfl_weeks["week"].max() - 1
+    end_of_season = nfl_weeks["week_end"][nfl_weeks["week"] == max_week].values[0]
+
+    nfl_week = nfl_weeks[["week", "week_start", "week_end"]][
+        (nfl_weeks["week_end"] >= date) & (nfl_weeks["week_start"] <= date)
+    ]
+    return {
+        "season": season,
+        "game_id": game_id,
+        "league_id": league_id,
+        "start_of_season": start_of_season,
+        "end_of_season": end_of_season,
+        "week": (
+            None
+            if nfl_week.empty
+            else {col: nfl_week[col].values[0] for col in nfl_week.columns}
+        ),
+    }
+
+
+def due_jobs(date, calendar):
+    """
+    Jobs of date: start_of_season or end_of_season on those days, and
+    week_final on the day an NFL week starts or mid_week on its other days
+    """
+    date = np.datetime64(date, "D")
+    jobs = []
+    if date == calendar["start_of_season"]:
+        jobs.append("start_of_season")
+    elif date == calendar["end_of_season"]:
+        jobs.append("end_of_season")
+
+    week = calendar["week"]
+    if week is not None:
+        if date == week["week_start"]:
+            jobs.append("week_final")
+        elif date > week["week_start"] and date <= week["week_end"]:
+            jobs.append("mid_week")
+    return jobs
+
+
+def add_stages(pipeline, league, jobs, calendar, private_file=PRIVATE):
+    """
+    Add the stages of jobs (see due_jobs) to pipeline
+    """
+
+    def add(name, func, *args, **kwargs):
+        if name not in pipeline:
+            inputs, outputs = STAGE_TABLES[name]
+            pipeline.add(name, func, *args, inputs=inputs, outputs=outputs, **kwargs)
+
+    game_id = calendar["game_id"]
+
+    if "start_of_season" in jobs or "end_of_season" in jobs:
+        add("all_game_keys", league.all_game_keys)
+        add("all_nfl_weeks", league.all_nfl_weeks)
+        add("metadata", league.metadata)
+        add("settings", league.settings)
+        if "start_of_season" in jobs:
+            add("teams", league.teams)
+
+    # the week whose matchups are pulled, reg_season only rebuilds it
+    if "week_final" in jobs:
+        changed_week = calendar["week"]["week"] - 1
+        add("teams", league.teams)
+    elif "mid_week" in jobs:
+        changed_week = calendar["week"]["week"]
+    else:
+        return pipeline
+
+    add("matchups", league.matchups, nfl_week=changed_week)
+    add(
+        "weekly_points", league.weekly_points, nfl_week=changed_week, from_matchups=True
+    )
+    add("reg_season", reg_season, game_id, private_file, week=changed_week)
+    add("post_season", post_season, game_id, private_file)
+
+    if "week_final" in jobs:
+        add("schedule", league.schedule, changed_week + 1)
+        add("playoff_odds", playoff_odds, game_id, private_file, week=changed_week)
+
+    return pipeline
+
+
+def data_pipeline(
+    date=None, yahoo_mode="live", archive=None, replay_latency=0.0, workers=WORKERS
+):
+    """
+    Daily run. date defaults to today; yahoo_mode="record" saves every
+    Yahoo response to the archive zip and "replay" runs from it offline.
+    The day's stages run on a Pipeline of workers threads (workers=1 runs
+    them one by one). Timings and counters of the run are collected in METRICS.
+    """
+    METRICS.reset()
+    date = np.datetime64(date or "today", "D")
 
     # PATH = list(Path().cwd().glob("**/private.yaml"))
     # if PATH == []:
@@ -34,27 +185,9 @@ def data_pipeline():
         DATE = np.datetime64(date, "D")
 
         NFL_WEEKS = nfl_weeks_pull(PRIVATE)
-        START_OF_SEASON, SEASON = get_laborday(DATE)
         GAME_KEYS = game_keys_pull(PRIVATE, TEAMS)
-
-        LEAGUE_ID = GAME_KEYS[GAME_KEYS["season"] == SEASON]["league_id"].values[0]
-        GAME_ID = GAME_KEYS[GAME_KEYS["season"] == SEASON]["game_id"].values[0]
-        NFL_WEEKS = NFL_WEEKS[NFL_WEEKS["game_id"] == GAME_ID]
-
-        MAX_WEEK = NFL_WEEKS["week"].max() - 1
-        END_OF_SEASON = NFL_WEEKS["week_end"][NFL_WEEKS["week"] == MAX_WEEK].values[0]
-
-        try:
-            NFL_WEEK = NFL_WEEKS[["week", "week_start", "week_end"]][
-                (NFL_WEEKS["week_end"] >= DATE) & (NFL_WEEKS["week_start"] <= DATE)
-            ]
-            CURRENT_WEEK = NFL_WEEK["week"].values[0]
-            PREVIOUS_WEEK = CURRENT_WEEK - 1
-            WEEK_START = NFL_WEEK["week_start"].values[0]
-            WEEK_END = NFL_WEEK["week_end"].values[0]
-
-        except:
-            NFL_WEEK = DataFrame()
+        CALENDAR = season_calendar(DATE, NFL_WEEKS, GAME_KEYS)
+        JOBS = due_jobs(DATE, CALENDAR)
 
     except Exception as e:
         log_print(
@@ -64,85 +197,83 @@ def data_pipeline():
             credentials="Credential File",
             at_line="16",
         )
+        raise
 
     league = league_season_data(
         auth_dir=PRIVATE.parents[1],
-        league_id=LEAGUE_ID,
-        game_id=GAME_ID,
+        league_id=CALENDAR["league_id"],
+        game_id=CALENDAR["game_id"],
         game_code="nfl",
         offline=False,
         all_output_as_json_str=False,
         consumer_key=CONSUMER_KEY,
         consumer_secret=CONSUMER_SECRET,
         browser_callback=True,
+        yahoo_mode=yahoo_mode,
+        archive=archive,
+        replay_latency=replay_latency,
     )
 
-    if DATE == START_OF_SEASON:
-        start = time()
-        league.all_game_keys()
-        league.all_nfl_weeks()
-        league.metadata()
-        league.settings()
-        league.teams()
-        end = time()
-        log_print(
-            success="Start Of Season",
-            module_="app.py",
-            date=DATE,
-            start_of_season=START_OF_SEASON,
-            end_of_season=END_OF_SEASON,
-            time_to_complete=(end - start) / 60,
-        )
-
-    elif DATE == END_OF_SEASON:
-        start = time()
-        league.all_game_keys()
-        league.all_nfl_weeks()
-        league.metadata()
-        league.settings()
-        end = time()
-        log_print(
-            success="End Of Season",
-            module_="app.py",
-            date=DATE,
-            start_of_season=START_OF_SEASON,
-            end_of_season=END_OF_SEASON,
-            time_to_complete=(end - start) / 60,
-        )
+    start = time()
+    pipeline = add_stages(Pipeline(workers), league, JOBS, CALENDAR)
+    results = pipeline.run()
+    log_print(
+        success="Data pipeline",
+        module_="app.py",
+        date=DATE,
+        jobs=JOBS,
+        start_of_season=CALENDAR["start_of_season"],
+        end_of_season=CALENDAR["end_of_season"],
+        stages={name: result.status for name, result in results.items()},
+        time_to_complete=(time() - start) / 60,
+    )
 
-    if not NFL_WEEK.empty:
-
-        if DATE == WEEK_START:
-            start = time()
-            league.teams()
-            league.matchups(nfl_week=PREVIOUS_WEEK)
-            league.weekly_points(nfl_week=PREVIOUS_WEEK)
-            end = time()
-            log_print(
-                success="Week finals",
-                module_="app.py",
-                date=DATE,
-                week_start=WEEK_START,
-                time_to_complete=(end - start) / 60,
-            )
-
-        elif DATE > WEEK_START and DATE <= WEEK_END:
-            start = time()
-            league.matchups(nfl_week=CURRENT_WEEK)
-            league.weekly_points(nfl_week=CURRENT_WEEK)
-            end = time()
-            log_print(
-                success="Mid-Week Pull",
-                module_="app.py",
-                date=DATE,
-                week_start=WEEK_START,
-                week_end=WEEK_END,
-                time_to_complete=(end - start) / 60,
-            )
-
-        reg_season(GAME_ID, PRIVATE)
-        post_season(GAME_ID, PRIVATE)
+    league.close()
 
 
 if __name__ == "__main__":
-    data_pipeline()
+    parser = ArgumentParser(description="MoM weekly rankings export")
+    parser.add_argument("--date", default=None, help="run as of YYYY-MM-DD")
+    parser.add_argument(
+        "--yahoo-mode", default="live", choices=["live", "record", "replay"]
+    )
+    parser.add_argument("--archive", default=None, help="record/replay zip file")
+    parser.add_argument(
+        "--replay-latency", default=0.0, type=float, help="seconds per replayed call"
+    )
+    parser.add_argument(
+        "--metrics-dir",
+        default=None,
+        help="where the run's .prom and .json metrics go (default MOM_METRICS_DIR)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="run under cProfile and tracemalloc and write a per stage report",
+    )
+    parser.add_argument(
+        "--profile-dir", default=None, help="report directory (default MOM_PROFILE_DIR)"
+    )
+    parser.add_argument(
+        "--workers",
+        default=WORKERS,
+        type=int,
+        help="stages run at once (1 under --profile, which follows one thread)",
+    )
+    args = parser.parse_args()
+
+    pipeline_kwargs = dict(
+        date=args.date,
+        yahoo_mode=args.yahoo_mode,
+        archive=args.archive,
+        replay_latency=args.replay_latency,
+        workers=1 if args.profile else args.workers,
+    )
+    try:
+        if args.profile:
+            profile_run(data_pipeline, report_dir=args.profile_dir, **pipeline_kwargs)
+        else:
+            data_pipeline(**pipeline_kwargs)
+    finally:
+        METRICS.export(args.metrics_dir)
+        close_pools()
@@ -0,0 +1,199 @@
+import multiprocessing
+import yaml
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pandas import DataFrame
+from time import time
+
+from Mom_WeeklyRankings_Export.utils import reg_season, post_season
+from Mom_WeeklyRankings_Export.cust_logging import log_print
+from Mom_WeeklyRankings_Export.db_upload import close_pools
+from Mom_WeeklyRankings_Export.rate_limit import SharedTokenBucket
+from Mom_WeeklyRankings_Export.yahoo_data import league_season_data
+from assests.assests import PRIVATE, TEAMS
+
+
+def _init_worker(rate_limiter):
+    """
+    Every worker process draws its Yahoo calls from the parent's bucket
+    """
+    league_season_data.RATE_LIMITER = rate_limiter
+
+
+def _league(game_id, league_id, credentials):
+    return league_season_data(
+        auth_dir=PRIVATE.parents[1],
+        league_id=league_id,
+        game_id=game_id,
+        game_code="nfl",
+        offline=False,
+        all_output_as_json_str=False,
+        consumer_key=credentials["YFPY_CONSUMER_KEY"],
+        consumer_secret=credentials["YFPY_CONSUMER_SECRET"],
+        browser_callback=True,
+    )
+
+
+def backfill_season(game_id, league_id, credentials, first_week=None, last_week=None):
+    """
+    Pull one season from Yahoo and rebuild its rankings and playoff board.
+    Weeks default to the season's start_week..end_week from its metadata,
+    never past its last played out week so a season still going gets no
+    preevent 0-0 matchups.
+    """
+    start = time()
+    league = _league(game_id, league_id, credentials)
+    try:
+        metadata = league.metadata()
+        league.settings()
+        league.teams()
+
+        weeks = range(
+            max(first_week or 1, int(metadata["start_week"].values[0])),
+            min(
+                last_week or 99,
+                int(metadata["end_week"].values[0]),
+                league.last_finished_week(),
+            )
+            + 1,
+        )
+        for week in weeks:
+            league.matchups(nfl_week=week)
+            league.weekly_points(nfl_week=week, from_matchups=True)
+
+        reg_season(int(game_id), PRIVATE, engine="numpy")
+        post_season(int(game_id), PRIVATE)
+
+    finally:
+        league.close()
+        close_pools()
+
+    return game_id, len(weeks), (time() - start) / 60
+
+
+def seasons(first_season=None, last_season=None):
+    """
+    season, game_id and league_id of every season in teams.yaml,
+    cut down to first_season..last_season
+    """
+    with open(TEAMS, "r") as file:
+        c_teams = yaml.load(file, Loader=yaml.SafeLoader)
+
+    keys = DataFrame.from_dict(c_teams["teams"])[["season", "game_id", "league_id"]]
+    if first_season:
+        keys = keys[keys["season"] >= first_season]
+    if last_season:
+        keys = keys[keys["season"] <= last_season]
+    return keys.sort_values("season")
+
+
+def backfill(
+    first_season=None,
+    last_season=None,
+    first_week=None,
+    last_week=None,
+    workers=4,
+    rate=1,
+    capacity=20,
+    game_keys=False,
+):
+    """
+    Backfill every season in range, one season per worker process.
+    All workers share one Yahoo rate limit of rate calls per second
+    with bursts up to capacity.
+    game_keys=True also refreshes prod.game_keys and prod.nfl_weeks first.
+    """
+    with open(PRIVATE) as file:
+        credentials = yaml.load(file, Loader=yaml.SafeLoader)
+
+    keys = seasons(first_season, last_season)
+
+    # workers are spawned so none of them inherits the parent's threads,
+    # connection pools or token lock
+    context = multiprocessing.get_context("spawn")
+    rate_limiter = SharedTokenBucket(rate=rate, capacity=capacity, context=context)
+    league_season_data.RATE_LIMITER = rate_limiter
+
+    if game_keys:
+        latest = keys.iloc[-1]
+        league = _league(latest["game_id"], latest["league_id"], credentials)
+        league.all_game_keys()
+        league.all_nfl_weeks()
+        league.close()
+
+    start = time()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(rate_limiter,),
+    ) as pool:
+        futures = {
+            pool.submit(
+                backfill_season,
+                row["game_id"],
+                row["league_id"],
+                credentials,
+                first_week,
+                last_week,
+            ): row["season"]
+            for _, row in keys.iterrows()
+        }
+        for future in as_completed(futures):
+            try:
+                game_id, weeks, minutes = future.result()
+                log_print(
+                    success="Backfill season",
+                    module_="backfill.py",
+                    season=futures[future],
+                    game_id=game_id,
+                    weeks=weeks,
+                    time_to_complete=minutes,
+                )
+            except Exception as e:
+                log_print(
+                    error=e,
+                    module_="backfill.py",
+                    func="backfill_season",
+                    season=futures[future],
+                )
+
+    log_print(
+        success="Backfill",
+        module_="backfill.py",
+        seasons=len(keys),
+        time_to_complete=(time() - start) / 60,
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Rebuild past MoM seasons in parallel")
+    parser.add_argument("--first-season", type=int, default=None)
+    parser.add_argument("--last-season", type=int, default=None)
+    parser.add_argument("--first-week", type=int, default=None)
+    parser.add_argument("--last-week", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=4, help="seasons at once")
+    parser.add_argument(
+        "--rate", type=float, default=1, help="Yahoo calls per second, all workers"
+    )
+    parser.add_argument("--capacity", type=int, default=20, help="Yahoo call burst")
+    parser.add_argument(
+        "--game-keys",
+        action="store_true",
+        help="refresh prod.game_keys and prod.nfl_weeks first",
+    )
+    args = parser.parse_args()
+
+    try:
+        backfill(
+            first_season=args.first_season,
+            last_season=args.last_season,
+            first_week=args.first_week,
+            last_week=args.last_week,
+            workers=args.workers,
+            rate=args.rate,
+            capacity=args.capacity,
+            game_keys=args.game_keys,
+        )
+    finally:
+        close_pools()
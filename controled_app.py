@@ -1,4 +1,5 @@
 import numpy as np
+from argparse import ArgumentParser
 from pandas import DataFrame
 import yaml
 
@@ -9,6 +10,8 @@ from Mom_WeeklyRankings_Export.utils import (
     reg_season,
     post_season,
 )
+from Mom_WeeklyRankings_Export.db_upload import close_pools
+from Mom_WeeklyRankings_Export.profiling import profile_run
 from Mom_WeeklyRankings_Export.yahoo_data import league_season_data
 from assests.assests import PRIVATE, TEAMS
 
@@ -69,4 +72,21 @@ def data_pipeline():
 
 
 if __name__ == "__main__":
-    data_pipeline()
+    parser = ArgumentParser(description="MoM weekly rankings export, fixed date")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="run under cProfile and tracemalloc and write a per stage report",
+    )
+    parser.add_argument(
+        "--profile-dir", default=None, help="report directory (default MOM_PROFILE_DIR)"
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.profile:
+            profile_run(data_pipeline, report_dir=args.profile_dir)
+        else:
+            data_pipeline()
+    finally:
+        close_pools()
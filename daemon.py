@@ -0,0 +1,268 @@
+import signal
+import threading
+import yaml
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import time
+
+from app import WORKERS, add_stages, due_jobs, season_calendar
+from Mom_WeeklyRankings_Export.utils import nfl_weeks_pull, game_keys_pull
+from Mom_WeeklyRankings_Export.cust_logging import log_print
+from Mom_WeeklyRankings_Export.db_upload import close_pools
+from Mom_WeeklyRankings_Export.metrics import METRICS
+from Mom_WeeklyRankings_Export.pipeline import Pipeline
+from Mom_WeeklyRankings_Export.yahoo_data import league_season_data
+from assests.assests import PRIVATE, TEAMS
+
+CADENCE_FILE = Path(__file__).resolve().parent / "assests" / "daemon.yaml"
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+# jobs that rewrite prod.game_keys and prod.nfl_weeks
+SEASON_JOBS = ("start_of_season", "end_of_season")
+
+
+def _minutes(text):
+    hours, minutes = str(text).split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def load_cadence(cadence_file=CADENCE_FILE):
+    """
+    Read the cadence file, see assests/daemon.yaml
+    """
+    with open(cadence_file) as file:
+        cadence = yaml.load(file, Loader=yaml.SafeLoader)
+
+    for job, rules in cadence["jobs"].items():
+        for rule in rules:
+            days = [str(day).lower()[:3] for day in rule.get("days", DAYS)]
+            unknown = set(days) - set(DAYS)
+            if unknown:
+                raise ValueError(f"{cadence_file}: {job} has unknown days {unknown}")
+            rule["days"] = days
+
+    cadence.setdefault("calendar_refresh", 1440)
+    cadence.setdefault("poll", 60)
+    return cadence
+
+
+def job_slots(rules, day):
+    """
+    Sorted datetimes on day (a date) a job runs at under its rules
+    """
+    midnight = datetime.combine(day, datetime.min.time())
+    minutes = set()
+    for rule in rules:
+        if DAYS[day.weekday()] not in rule["days"]:
+            continue
+        minutes.update(_minutes(at) for at in rule.get("at", []))
+        if rule.get("every"):
+            minutes.update(
+                range(
+                    _minutes(rule.get("from", "00:00")),
+                    _minutes(rule.get("until", "23:59")) + 1,
+                    int(rule["every"]),
+                )
+            )
+    return [midnight + timedelta(minutes=minute) for minute in sorted(minutes)]
+
+
+class Daemon(object):
+    """
+    Runs the data_pipeline jobs in one long-lived process on the cadence
+    of cadence_file.
+
+    The credentials, the Yahoo session, the database pool and the season
+    calendar (prod.nfl_weeks, prod.game_keys) are loaded once and kept.
+    The calendar is re-read every calendar_refresh minutes and after the
+    start and end of season jobs. A job runs once per slot; on start the
+    latest slot already passed today runs straight away, and slots missed
+    while a run was going are run once, not once each. Nothing is due
+    while there is no calendar, e.g. in the off-season.
+    """
+
+    def __init__(self, cadence_file=CADENCE_FILE, workers=WORKERS, metrics_dir=None):
+        self.cadence = load_cadence(cadence_file)
+        self.workers = workers
+        self.metrics_dir = metrics_dir
+
+        with open(PRIVATE) as file:
+            self.__credentials = yaml.load(file, Loader=yaml.SafeLoader)
+
+        self.__stopped = threading.Event()
+        self.__nfl_weeks = None
+        self.__game_keys = None
+        self.__loaded = None
+        self.__calendar = None
+        self.__league = None
+        self.__last_slots = {}
+
+    def stop(self, *_):
+        self.__stopped.set()
+
+    def refresh_calendar(self):
+        self.__nfl_weeks = nfl_weeks_pull(PRIVATE)
+        self.__game_keys = game_keys_pull(PRIVATE, TEAMS)
+        self.__loaded = time()
+        self.__calendar = None
+
+    def calendar(self, date):
+        """
+        season_calendar of date from the kept prod.nfl_weeks and prod.game_keys,
+        None when it can not be worked out, e.g. in the off-season before
+        prod.game_keys has the next season. A failed read or calendar is
+        logged once and not tried again for calendar_refresh minutes.
+        """
+        stale = (
+            self.__loaded is None
+            or time() - self.__loaded > self.cadence["calendar_refresh"] * 60
+        )
+        if stale or self.__calendar is None or self.__calendar[0] != date:
+            try:
+                if stale:
+                    self.refresh_calendar()
+                calendar = season_calendar(date, self.__nfl_weeks, self.__game_keys)
+            except Exception as e:
+                log_print(
+                    error=e,
+                    module_="daemon.py",
+                    func="calendar",
+                    date=date,
+                    retry_in=self.cadence["calendar_refresh"],
+                )
+                self.__loaded = time()
+                calendar = None
+            self.__calendar = (date, calendar)
+        return self.__calendar[1]
+
+    def league(self, calendar):
+        """
+        The Yahoo session of calendar's season, a new one once the season changes
+        """
+        game_id = str(calendar["game_id"])
+        if self.__league is None or self.__league.game_id != game_id:
+            if self.__league is not None:
+                self.__league.close()
+            self.__league = league_season_data(
+                auth_dir=PRIVATE.parents[1],
+                league_id=calendar["league_id"],
+                game_id=calendar["game_id"],
+                game_code="nfl",
+                offline=False,
+                all_output_as_json_str=False,
+                consumer_key=self.__credentials["YFPY_CONSUMER_KEY"],
+                consumer_secret=self.__credentials["YFPY_CONSUMER_SECRET"],
+                browser_callback=True,
+            )
+        return self.__league
+
+    def pending(self, now):
+        """
+        {job: slot} of the jobs due today whose latest slot up to now has not
+        run, none without a season calendar
+        """
+        calendar = self.calendar(now.date())
+        if calendar is None:
+            return {}
+
+        jobs = {}
+        for job in due_jobs(now.date(), calendar):
+            slots = [
+                slot
+                for slot in job_slots(self.cadence["jobs"].get(job, []), now.date())
+                if slot <= now
+            ]
+            if slots and self.__last_slots.get(job) != slots[-1]:
+                jobs[job] = slots[-1]
+        return jobs
+
+    def next_wake(self, now):
+        """
+        Seconds until the next slot of any job, at most poll
+        """
+        wake = now + timedelta(seconds=self.cadence["poll"])
+        for day in (now.date(), now.date() + timedelta(days=1)):
+            for rules in self.cadence["jobs"].values():
+                for slot in job_slots(rules, day):
+                    if now < slot < wake:
+                        wake = slot
+        return max((wake - now).total_seconds(), 1)
+
+    def run_jobs(self, jobs, now):
+        """
+        Run the stages of jobs ({job: slot}) as one Pipeline
+        """
+        METRICS.reset()
+        calendar = self.calendar(now.date())
+        start = time()
+        try:
+            pipeline = Pipeline(self.workers)
+            add_stages(pipeline, self.league(calendar), list(jobs), calendar)
+            results = pipeline.run()
+            log_print(
+                success="Daemon jobs",
+                module_="daemon.py",
+                func="run_jobs",
+                jobs=list(jobs),
+                slot=max(jobs.values()),
+                stages={name: result.status for name, result in results.items()},
+                time_to_complete=(time() - start) / 60,
+            )
+        finally:
+            self.__last_slots.update(jobs)
+            if any(job in SEASON_JOBS for job in jobs):
+                self.__loaded = None
+            METRICS.export(self.metrics_dir, job="daemon")
+
+    def run(self):
+        """
+        Run the jobs as they fall due until stop() (SIGTERM, SIGINT)
+        """
+        log_print(success="Daemon started", module_="daemon.py", workers=self.workers)
+        try:
+            calendar = self.calendar(datetime.now().date())
+            if calendar is not None:
+                self.league(calendar)
+        except Exception as e:
+            log_print(error=e, module_="daemon.py", func="run", at="warm up")
+
+        while not self.__stopped.is_set():
+            now = datetime.now()
+            try:
+                jobs = self.pending(now)
+                if jobs:
+                    self.run_jobs(jobs, now)
+                    continue
+            except Exception as e:
+                log_print(error=e, module_="daemon.py", func="run", now=now)
+            self.__stopped.wait(self.next_wake(datetime.now()))
+        log_print(success="Daemon stopped", module_="daemon.py")
+
+    def close(self):
+        if self.__league is not None:
+            self.__league.close()
+        close_pools()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="MoM weekly rankings export, as a daemon")
+    parser.add_argument(
+        "--cadence", default=CADENCE_FILE, help="job cadence file (assests/daemon.yaml)"
+    )
+    parser.add_argument("--workers", default=WORKERS, type=int, help="stages at once")
+    parser.add_argument(
+        "--metrics-dir",
+        default=None,
+        help="where each run's .prom and .json metrics go (default MOM_METRICS_DIR)",
+    )
+    args = parser.parse_args()
+
+    daemon = Daemon(args.cadence, workers=args.workers, metrics_dir=args.metrics_dir)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        daemon.run()
+    finally:
+        daemon.close()
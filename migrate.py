@@ -0,0 +1,10 @@
+from Mom_WeeklyRankings_Export.utils import migrate
+from Mom_WeeklyRankings_Export.db_upload import close_pools
+from assests.assests import PRIVATE
+
+if __name__ == "__main__":
+    # run once before the first upsert, and after adding a table to the schema
+    try:
+        migrate(PRIVATE)
+    finally:
+        close_pools()
@@ -0,0 +1,28 @@
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+from Mom_WeeklyRankings_Export import cust_logging
+
+# assests/assests.py holds the local paths of the credentials, it is not in git
+if "assests.assests" not in sys.modules:
+    try:
+        import assests.assests  # noqa: F401
+    except ImportError:
+        assests = types.ModuleType("assests.assests")
+        assests.PRIVATE = Path("private.yaml")
+        assests.TEAMS = Path("teams.yaml")
+        assests.CHANGES = Path("data_changes.yaml")
+        sys.modules["assests.assests"] = assests
+
+
+@pytest.fixture(autouse=True)
+def log_dir(tmp_path):
+    """
+    Every test logs to its own directory instead of assests/
+    """
+    cust_logging.configure(log_dir=tmp_path / "logs")
+    yield tmp_path / "logs"
+    cust_logging.close_logs()
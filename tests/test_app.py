@@ -0,0 +1,36 @@
+import pytest
+
+import app
+from tests.test_daemon import game_keys, nfl_weeks
+
+
+@pytest.fixture
+def no_yahoo(monkeypatch, tmp_path):
+    """
+    data_pipeline without a database, records whether Yahoo was reached
+    """
+    private = tmp_path / "private.yaml"
+    private.write_text("YFPY_CONSUMER_KEY: key\nYFPY_CONSUMER_SECRET: secret\n")
+    leagues = []
+
+    monkeypatch.setattr(app, "PRIVATE", private)
+    monkeypatch.setattr(app, "nfl_weeks_pull", lambda *_: nfl_weeks())
+    monkeypatch.setattr(app, "game_keys_pull", lambda *_: game_keys())
+    monkeypatch.setattr(app, "league_season_data", lambda **kwargs: leagues.append(1))
+    return leagues
+
+
+def test_no_season_stops_before_the_pipeline(no_yahoo):
+    # prod.game_keys has no 2024 row yet
+    with pytest.raises(IndexError):
+        app.data_pipeline(date="2024-09-10")
+    assert no_yahoo == []
+
+
+def test_failed_calendar_read_stops_before_the_pipeline(no_yahoo, monkeypatch):
+    # nfl_weeks_pull logs and returns None when the database is down
+    monkeypatch.setattr(app, "nfl_weeks_pull", lambda *_: None)
+
+    with pytest.raises(TypeError):
+        app.data_pipeline(date="2023-09-14")
+    assert no_yahoo == []
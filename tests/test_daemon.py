@@ -0,0 +1,225 @@
+import types
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import daemon
+from app import due_jobs, season_calendar
+
+THU = date(2023, 9, 14)
+
+
+def nfl_weeks(game_id=423, weeks=17):
+    """
+    Yahoo's 2023 weeks: week 1 Thursday to Monday, then Tuesday to Monday
+    """
+    rows = [(1, "2023-09-07", "2023-09-11")]
+    for week in range(2, weeks + 1):
+        start = date(2023, 9, 12) + timedelta(days=7 * (week - 2))
+        rows.append((week, start.isoformat(), (start + timedelta(days=6)).isoformat()))
+    frame = pd.DataFrame(rows, columns=["week", "week_start", "week_end"])
+    frame["week_start"] = pd.to_datetime(frame["week_start"])
+    frame["week_end"] = pd.to_datetime(frame["week_end"])
+    frame["game_id"] = game_id
+    return frame
+
+
+def game_keys(seasons=(2023,)):
+    return pd.DataFrame(
+        {
+            "game_id": [423 for _ in seasons],
+            "league_id": [1234 for _ in seasons],
+            "season": list(seasons),
+        }
+    )
+
+
+def jobs_of(day):
+    return due_jobs(day, season_calendar(day, nfl_weeks(), game_keys()))
+
+
+def test_job_slots_every_from_until():
+    rules = daemon.load_cadence()["jobs"]["mid_week"]
+
+    slots = daemon.job_slots(rules, THU)
+
+    assert slots[0] == datetime(2023, 9, 14, 12)
+    assert slots[-1] == datetime(2023, 9, 14, 23)
+    assert len(slots) == 12
+
+
+def test_job_slots_days():
+    rules = daemon.load_cadence()["jobs"]["mid_week"]
+
+    assert daemon.job_slots(rules, date(2023, 9, 13)) == [datetime(2023, 9, 13, 6)]
+    assert daemon.job_slots(rules, date(2023, 9, 12)) == []
+
+
+def test_job_slots_merges_rules_in_order():
+    rules = [
+        {"days": daemon.DAYS, "every": 180, "from": "12:00", "until": "18:00"},
+        {"days": ["thu"], "at": ["12:00", "06:00"]},
+        {"days": ["fri"], "at": ["07:00"]},
+    ]
+
+    assert [slot.hour for slot in daemon.job_slots(rules, THU)] == [6, 12, 15, 18]
+
+
+def test_load_cadence_rejects_unknown_days(tmp_path):
+    cadence_file = tmp_path / "daemon.yaml"
+    cadence_file.write_text("jobs:\n  mid_week:\n    - days: [thurs, funday]\n")
+
+    with pytest.raises(ValueError, match="fun"):
+        daemon.load_cadence(cadence_file)
+
+
+@pytest.mark.parametrize(
+    "day, jobs",
+    [
+        (date(2023, 9, 4), ["start_of_season"]),
+        (date(2023, 9, 7), ["week_final"]),
+        (date(2023, 9, 12), ["week_final"]),
+        (THU, ["mid_week"]),
+        (date(2023, 12, 25), ["end_of_season", "mid_week"]),
+        (date(2024, 2, 1), []),
+    ],
+)
+def test_due_jobs(day, jobs):
+    assert jobs_of(day) == jobs
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeLeague(object):
+    def __init__(self, game_id, **_):
+        self.game_id = str(game_id)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def calendar_db(monkeypatch, tmp_path):
+    """
+    Daemon without a database or Yahoo: counts the calendar reads and
+    keeps the errors it logs
+    """
+    private = tmp_path / "private.yaml"
+    private.write_text("YFPY_CONSUMER_KEY: key\nYFPY_CONSUMER_SECRET: secret\n")
+
+    db = types.SimpleNamespace(
+        nfl_weeks=nfl_weeks(), game_keys=game_keys(), reads=0, errors=[], stages=[]
+    )
+
+    def nfl_weeks_pull(_):
+        db.reads += 1
+        return db.nfl_weeks
+
+    def log_print(error=None, **kwargs):
+        if error is not None:
+            db.errors.append(kwargs.get("func"))
+
+    def add_stages(pipeline, league, jobs, calendar):
+        pipeline.add("jobs", db.stages.append, jobs)
+        return pipeline
+
+    clock = FakeClock()
+    db.clock = clock
+    monkeypatch.setattr(daemon, "PRIVATE", private)
+    monkeypatch.setattr(daemon, "time", clock)
+    monkeypatch.setattr(daemon, "nfl_weeks_pull", nfl_weeks_pull)
+    monkeypatch.setattr(daemon, "game_keys_pull", lambda *_: db.game_keys)
+    monkeypatch.setattr(daemon, "log_print", log_print)
+    monkeypatch.setattr(daemon, "league_season_data", FakeLeague)
+    monkeypatch.setattr(daemon, "add_stages", add_stages)
+    monkeypatch.setattr(daemon.METRICS, "export", lambda *_, **__: None)
+    db.daemon = daemon.Daemon(workers=1)
+    return db
+
+
+def test_pending_runs_only_the_latest_passed_slot(calendar_db):
+    pending = calendar_db.daemon.pending
+
+    assert pending(datetime(2023, 9, 14, 11, 59)) == {}
+    # 12:00 to 15:00 all passed while the daemon was down, 15:00 runs once
+    assert pending(datetime(2023, 9, 14, 15, 30)) == {
+        "mid_week": datetime(2023, 9, 14, 15)
+    }
+
+
+def test_pending_does_not_rerun_a_slot(calendar_db):
+    run = calendar_db.daemon
+    now = datetime(2023, 9, 14, 15, 30)
+
+    run.run_jobs(run.pending(now), now)
+
+    assert calendar_db.stages == [["mid_week"]]
+    assert run.pending(datetime(2023, 9, 14, 15, 59)) == {}
+    assert run.pending(datetime(2023, 9, 14, 16)) == {
+        "mid_week": datetime(2023, 9, 14, 16)
+    }
+
+
+def test_pending_week_final_once_on_the_week_start(calendar_db):
+    run = calendar_db.daemon
+    now = datetime(2023, 9, 12, 9)
+
+    assert run.pending(datetime(2023, 9, 12, 5)) == {}
+    assert run.pending(now) == {"week_final": datetime(2023, 9, 12, 6)}
+    run.run_jobs(run.pending(now), now)
+    assert run.pending(datetime(2023, 9, 12, 23)) == {}
+
+
+def test_no_season_means_no_jobs_and_no_retry_until_refresh(calendar_db):
+    # the off-season: prod.game_keys has no row yet for the 2024 season
+    run = calendar_db.daemon
+    now = datetime(2024, 9, 10, 12)
+
+    for minute in range(120):
+        calendar_db.clock.now += 60
+        assert run.pending(now + timedelta(minutes=minute)) == {}
+
+    assert calendar_db.reads == 1
+    assert calendar_db.errors == ["calendar"]
+
+    calendar_db.game_keys = game_keys(seasons=(2023, 2024))
+    calendar_db.clock.now += run.cadence["calendar_refresh"] * 60
+    assert run.pending(now + timedelta(minutes=120)) == {}
+    assert calendar_db.reads == 2
+    assert calendar_db.errors == ["calendar"]
+
+
+def test_failed_calendar_read_backs_off(calendar_db):
+    # nfl_weeks_pull logs and returns None when the database is down
+    calendar_db.nfl_weeks = None
+    run = calendar_db.daemon
+    now = datetime(2023, 9, 14, 15, 30)
+
+    assert run.pending(now) == {}
+    calendar_db.clock.now += run.cadence["poll"]
+    assert run.pending(now) == {}
+    assert calendar_db.reads == 1
+    assert calendar_db.errors == ["calendar"]
+
+    calendar_db.nfl_weeks = nfl_weeks()
+    calendar_db.clock.now += run.cadence["calendar_refresh"] * 60
+    assert run.pending(now) == {"mid_week": datetime(2023, 9, 14, 15)}
+    assert calendar_db.reads == 2
+
+
+def test_season_jobs_reload_the_calendar(calendar_db):
+    run = calendar_db.daemon
+    now = datetime(2023, 9, 4, 7)
+
+    jobs = run.pending(now)
+    assert jobs == {"start_of_season": datetime(2023, 9, 4, 6)}
+    run.run_jobs(jobs, now)
+    assert run.pending(now) == {}
+    assert calendar_db.reads == 2
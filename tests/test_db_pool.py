@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+from psycopg2.pool import PoolError
+
+from Mom_WeeklyRankings_Export import db_upload
+from Mom_WeeklyRankings_Export.db_upload import ConnectionPool
+
+
+class FakeConnection(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(object):
+    """
+    ThreadedConnectionPool without a database, raises PoolError when
+    more than maxconn connections are out like psycopg2 does
+    """
+
+    def __init__(self, minconn, maxconn, *_, **__):
+        self.maxconn = maxconn
+        self.out = 0
+        self.closed = False
+
+    def getconn(self):
+        if self.out >= self.maxconn:
+            raise PoolError("connection pool exhausted")
+        self.out += 1
+        return FakeConnection()
+
+    def putconn(self, conn, close=False):
+        self.out -= 1
+
+    def closeall(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_pool(monkeypatch):
+    monkeypatch.setattr(db_upload, "ThreadedConnectionPool", FakePool)
+
+
+def test_getconn_waits_for_a_free_connection():
+    pool = ConnectionPool("postgres://", maxconn=2, wait=5)
+    held = [pool.getconn(), pool.getconn()]
+    borrowed = []
+
+    waiter = threading.Thread(target=lambda: borrowed.append(pool.getconn()))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()
+
+    pool.putconn(held.pop())
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert len(borrowed) == 1
+
+
+def test_getconn_raises_pool_error_after_wait():
+    pool = ConnectionPool("postgres://", maxconn=1, wait=0.1)
+    pool.getconn()
+
+    with pytest.raises(PoolError, match="no free connection of 1"):
+        pool.getconn()
+
+
+def test_many_threads_share_a_small_pool():
+    pool = ConnectionPool("postgres://", maxconn=3, wait=5)
+    errors = []
+
+    def stage():
+        try:
+            for _ in range(20):
+                pool.putconn(pool.getconn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=stage) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert pool._get_pool().out == 0
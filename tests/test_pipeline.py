@@ -0,0 +1,99 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from Mom_WeeklyRankings_Export.pipeline import FAILED, OK, SKIPPED, Pipeline
+from Mom_WeeklyRankings_Export.utils import data_upload
+
+
+def ok(value=None):
+    return value
+
+
+def fail():
+    raise RuntimeError("Yahoo is down")
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_failed_stage_skips_its_dependents(workers):
+    pipeline = Pipeline(workers)
+    pipeline.add("matchups", fail, outputs=["raw.matchups"])
+    pipeline.add(
+        "weekly_points",
+        ok,
+        inputs=["raw.matchups"],
+        outputs=["raw.weekly_team_pts"],
+    )
+    pipeline.add("post_season", ok, inputs=["raw.weekly_team_pts"])
+    pipeline.add("metadata", ok, "metadata", outputs=["prod.metadata"])
+
+    results = pipeline.run()
+
+    assert list(results) == ["matchups", "weekly_points", "post_season", "metadata"]
+    assert results["matchups"].status == FAILED
+    assert str(results["matchups"].error) == "Yahoo is down"
+    assert results["weekly_points"].status == SKIPPED
+    assert results["post_season"].status == SKIPPED
+    assert results["metadata"].status == OK
+    assert results["metadata"].value == "metadata"
+
+
+def test_stage_fails_when_the_wrapped_function_logs_an_error():
+    # data_upload logs its errors and raises them again for the pipeline
+    pipeline = Pipeline(2)
+    pipeline.add(
+        "upload",
+        data_upload,
+        pd.DataFrame({"game_id": [423]}),
+        "raw.matchups",
+        "private.yaml",
+        outputs=["raw.matchups"],
+    )
+    pipeline.add("reg_season", ok, inputs=["raw.matchups"])
+
+    results = pipeline.run()
+
+    assert results["upload"].status == FAILED
+    assert isinstance(results["upload"].error, ValueError)
+    assert results["reg_season"].status == SKIPPED
+
+
+def test_dependencies_from_inputs_and_outputs():
+    pipeline = Pipeline()
+    pipeline.add("teams", ok, inputs=["raw.teams"], outputs=["raw.teams"])
+    pipeline.add("settings", ok, outputs=["prod.settings"])
+    reg = pipeline.add(
+        "reg_season",
+        ok,
+        inputs=["raw.teams", "prod.settings"],
+        outputs=["prod.reg_season_results", "raw.teams"],
+    )
+    odds = pipeline.add("playoff_odds", ok, inputs=["prod.reg_season_results"])
+    post = pipeline.add("post_season", ok, inputs=["raw.teams"])
+
+    assert reg.depends_on == ["teams", "settings"]
+    assert odds.depends_on == ["reg_season"]
+    assert post.depends_on == ["teams", "reg_season"]
+    assert pipeline.critical_path() == ["teams", "reg_season", "playoff_odds"]
+
+
+def test_independent_stages_run_at_once():
+    started = threading.Barrier(3, timeout=5)
+
+    def wait_for_the_others():
+        started.wait()
+
+    pipeline = Pipeline(3)
+    for name in ["metadata", "settings", "teams"]:
+        pipeline.add(name, wait_for_the_others, outputs=[name])
+
+    results = pipeline.run()
+    assert {result.status for result in results.values()} == {OK}
+
+
+def test_stage_names_are_unique():
+    pipeline = Pipeline()
+    pipeline.add("teams", ok)
+    with pytest.raises(ValueError):
+        pipeline.add("teams", ok)
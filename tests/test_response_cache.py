@@ -0,0 +1,22 @@
+import threading
+
+from Mom_WeeklyRankings_Export.response_cache import ResponseCache
+
+
+def test_threads_storing_one_key_leave_a_whole_entry(tmp_path):
+    cache = ResponseCache(tmp_path)
+    responses = [{"team": team, "points": [team] * 50000} for team in range(8)]
+
+    threads = [
+        threading.Thread(target=cache.put, args=("matchups", (423, 5), response, True))
+        for response in responses
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    hit, response = cache.get("matchups", (423, 5))
+    assert hit
+    assert response in responses
+    assert list(tmp_path.glob("*/*.tmp")) == []
@@ -0,0 +1,164 @@
+import pytest
+import requests
+from yfpy.exceptions import YahooFantasySportsDataNotFound
+
+from Mom_WeeklyRankings_Export.retry import (
+    AUTH,
+    INVALID_WEEK,
+    NETWORK,
+    OTHER,
+    InvalidWeekError,
+    RetryPolicy,
+    classify_error,
+)
+
+SCOREBOARD_URL = (
+    "https://fantasysports.yahooapis.com/fantasy/v2/league/423.l.401502"
+    "/scoreboard;week=19?format=json"
+)
+
+
+def yahoo_error(description, url=SCOREBOARD_URL):
+    """
+    A YahooFantasySportsDataNotFound the way yfpy's get_response words it
+    """
+    message = (
+        f'Attempt to retrieve data at URL {url} failed with error: "{description}"'
+    )
+    return YahooFantasySportsDataNotFound(message, url=url)
+
+
+def http_error(status, url=SCOREBOARD_URL):
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    return requests.HTTPError(
+        f"{status} Server Error for url: {url}", response=response
+    )
+
+
+@pytest.mark.parametrize(
+    "description",
+    ["Invalid week", "Week 19 is not a valid week.", "week 0 is not valid"],
+)
+def test_invalid_week(description):
+    assert classify_error(yahoo_error(description)) == INVALID_WEEK
+
+
+def test_scoreboard_url_is_not_an_invalid_week():
+    no_data = YahooFantasySportsDataNotFound(
+        f"No data found at URL {SCOREBOARD_URL} when attempting extraction "
+        'from field: "fantasy_content"',
+        url=SCOREBOARD_URL,
+    )
+    assert classify_error(no_data) == OTHER
+    assert classify_error(yahoo_error("Internal server error")) == OTHER
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504, 999])
+def test_retryable_status(status):
+    assert classify_error(http_error(status)) == NETWORK
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        requests.ConnectionError(
+            f"HTTPSConnectionPool: Max retries exceeded with url: {SCOREBOARD_URL}"
+        ),
+        requests.ReadTimeout("Read timed out. (read timeout=30)"),
+        ConnectionResetError("Connection reset by peer"),
+        requests.HTTPError(
+            "Yahoo data unavailable due to rate limiting. Please try again later."
+        ),
+    ],
+)
+def test_network(error):
+    assert classify_error(error) == NETWORK
+
+
+def test_auth():
+    assert classify_error(http_error(401)) == AUTH
+    assert classify_error(Exception("oauth_problem=token_expired")) == AUTH
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://fantasysports.yahooapis.com/fantasy/v2/league/401.l.502/teams",
+        "https://fantasysports.yahooapis.com/fantasy/v2/league/4015.l.1401/settings",
+    ],
+)
+def test_numbers_in_the_url_do_not_classify(url):
+    error = yahoo_error("League not found", url=url)
+    assert classify_error(error) == OTHER
+    assert classify_error(http_error(404, url=url)) == OTHER
+
+
+def test_policy_retries_a_failed_matchups_call():
+    calls = []
+
+    def matchups(week):
+        calls.append(week)
+        if len(calls) < 3:
+            raise http_error(502)
+        return "scoreboard"
+
+    policy = RetryPolicy(base_delay=0, max_delay=0)
+    assert policy.call(matchups, 5) == "scoreboard"
+    assert calls == [5, 5, 5]
+
+
+def test_policy_gives_up_on_an_invalid_week_at_once():
+    calls = []
+
+    def matchups(week):
+        calls.append(week)
+        raise yahoo_error("Invalid week")
+
+    with pytest.raises(InvalidWeekError):
+        RetryPolicy(base_delay=0, max_delay=0).call(matchups, 19)
+    assert calls == [19]
+
+
+@pytest.mark.parametrize(
+    "error",
+    [KeyError("fantasy_content"), yahoo_error("League not found"), http_error(404)],
+)
+def test_policy_raises_other_errors_at_once(error):
+    calls = []
+
+    def league(week):
+        calls.append(week)
+        raise error
+
+    with pytest.raises(type(error)):
+        RetryPolicy(base_delay=0, max_delay=0).call(league, 5)
+    assert calls == [5]
+
+
+def test_policy_reauthenticates_once_then_raises():
+    calls = []
+    reauthenticated = []
+
+    def matchups(week):
+        calls.append(week)
+        raise http_error(401)
+
+    policy = RetryPolicy(base_delay=0, max_delay=0)
+    with pytest.raises(requests.HTTPError):
+        policy.call(matchups, 5, reauthenticate=lambda: reauthenticated.append(1))
+    assert calls == [5, 5]
+    assert reauthenticated == [1]
+
+
+def test_policy_stops_network_retries_at_max_attempts():
+    calls = []
+
+    def matchups(week):
+        calls.append(week)
+        raise http_error(503)
+
+    with pytest.raises(requests.HTTPError):
+        RetryPolicy(base_delay=0, max_delay=0, max_attempts=3).call(matchups, 5)
+    assert calls == [5, 5, 5]
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Mom_WeeklyRankings_Export.ranking import DEFAULT_RULES
+from Mom_WeeklyRankings_Export.schema import coerce
+from Mom_WeeklyRankings_Export.season_matrix import season_matrix
+from Mom_WeeklyRankings_Export.utils import _reg_season_frame
+
+GAME_ID = 423
+PLAYOFF_START_WEEK = 6
+
+
+def synthetic_season(teams=10, weeks=5, seed=7):
+    """
+    raw.matchups and raw.teams rows of a made up season: a different
+    random pairing every week, scores on a half point grid so teams tie
+    within matchups and across the league, and team 1 always tying
+    """
+    rng = np.random.default_rng(seed)
+    keys = [f"{GAME_ID}.l.1.t.{team}" for team in range(1, teams + 1)]
+    rows = []
+    for week in range(1, weeks + 1):
+        order = rng.permutation(teams)
+        for a, b in zip(order[::2], order[1::2]):
+            a_pts, b_pts = rng.integers(160, 200, size=2) / 2
+            if 0 in (a, b):
+                b_pts = a_pts
+            rows.append(
+                {
+                    "game_id": GAME_ID,
+                    "week": week,
+                    "week_start": np.datetime64("2023-09-05") + 7 * (week - 1),
+                    "week_end": np.datetime64("2023-09-11") + 7 * (week - 1),
+                    "is_playoffs": 0,
+                    "is_consolation": 0,
+                    "team_a_team_key": keys[a],
+                    "team_a_points": a_pts,
+                    "team_a_projected_points": rng.integers(160, 200) / 2,
+                    "team_b_team_key": keys[b],
+                    "team_b_points": b_pts,
+                    "team_b_projected_points": rng.integers(160, 200) / 2,
+                    "winner_team_key": (
+                        keys[a] if a_pts > b_pts else keys[b] if b_pts > a_pts else 0
+                    ),
+                }
+            )
+    matchups = pd.DataFrame(rows)
+    teams = pd.DataFrame(
+        {
+            "game_id": GAME_ID,
+            "league_id": 1,
+            "team_id": range(1, teams + 1),
+            "team_key": keys,
+            "name": [f"Team {i}" for i in range(1, teams + 1)],
+            "nickname": [f"Manager {i}" for i in range(1, teams + 1)],
+        }
+    )
+    return matchups, teams
+
+
+def rows(df):
+    return (
+        coerce(df, "prod.reg_season_results")
+        .sort_values(["Week", "team_key"])
+        .reset_index(drop=True)
+    )
+
+
+@pytest.mark.parametrize("seed", [7, 11, 2023])
+def test_numpy_engine_matches_pandas(seed):
+    matchups, teams = synthetic_season(seed=seed)
+    pandas_rows = rows(
+        _reg_season_frame(matchups, teams, GAME_ID, PLAYOFF_START_WEEK, DEFAULT_RULES)
+    )
+    numpy_rows = rows(season_matrix(matchups, teams, DEFAULT_RULES))
+
+    assert list(numpy_rows.columns) == list(pandas_rows.columns)
+    assert (pandas_rows["Wk W/L"] == "T").any()
+    for col in pandas_rows.columns:
+        pd.testing.assert_series_equal(numpy_rows[col], pandas_rows[col], obj=col)
+
+
+def test_falls_back_when_teams_play_a_different_number_of_games():
+    matchups, teams = synthetic_season()
+    bye = matchups.drop(index=matchups.index[matchups["week"] == 3][0])
+    assert season_matrix(bye, teams, DEFAULT_RULES) is None
+
+    double = pd.concat([matchups, matchups[matchups["week"] == 2].head(1)])
+    assert season_matrix(double, teams, DEFAULT_RULES) is None
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from Mom_WeeklyRankings_Export.tournament import SeasonFrame, competition_rounds
+
+
+class Participant(object):
+    def __init__(self, competitor):
+        self.competitor = competitor
+
+    def get_competitor(self):
+        return self.competitor
+
+
+class Match(object):
+    def __init__(self, right, left):
+        self.participants = [Participant(right), Participant(left)]
+        self.winner = None
+
+    def get_participants(self):
+        return self.participants
+
+    def set_winner(self, competitor):
+        self.winner = competitor
+
+
+class Bracket(object):
+    def __init__(self, *matches):
+        self.matches = list(matches)
+
+    def get_active_matches(self):
+        return self.matches
+
+
+def season(rows):
+    return pd.DataFrame(
+        rows, columns=["team_key", "Week", "Team", "Manager", "Wk Pts", "Wk Pro. Pts"]
+    )
+
+
+def test_round_writes_every_row_of_a_repeated_matchup():
+    season_df = season(
+        [
+            ("t.1", 15, "One", "Ann", 120.5, 110.0),
+            ("t.2", 15, "Two", "Bo", 98.0, 105.0),
+            ("t.3", 15, "Three", "Cy", 101.0, 99.0),
+            ("t.4", 15, "Four", "Di", 87.5, 92.0),
+            # the same matchup row pulled twice
+            ("t.2", 15, "Two", "Bo", 98.0, 105.0),
+        ]
+    )
+    bracket = Bracket(Match("t.1", "t.2"), Match("t.3", "t.4"))
+
+    decided = competition_rounds(bracket, "Playoffs", 15, SeasonFrame(season_df))
+
+    assert [match.winner for match in decided] == ["t.1", "t.3"]
+    repeated = season_df[season_df["team_key"] == "t.2"]
+    assert len(repeated) == 2
+    assert list(repeated["opp_team_key"]) == ["t.1", "t.1"]
+    assert list(repeated["Opp Wk Pts"]) == [120.5, 120.5]
+    assert list(repeated["Bracket"]) == ["Playoffs", "Playoffs"]
+    assert list(repeated["Wk W/L"]) == ["L", "L"]
+    assert season_df.loc[0, "opp_team_key"] == "t.2"
+    assert season_df.loc[3, "Wk W/L"] == "L"